@@ -1,9 +1,86 @@
 
 """Handles Shoonya API authentication and requests."""
 
+import json
+import os
+import threading
+import time
+from datetime import date
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
 from api_helper import ShoonyaApiPy
 import pyotp
 import config
+from rest_scheduler import RestScheduler
+
+TOKEN_CACHE_FILE: str = getattr(config, "TOKEN_CACHE_FILE", os.path.join("cache", "tokens.json"))
+FEED_MAX_AGE: float = getattr(config, "FEED_MAX_AGE", 5.0)  # Seconds a feed tick is trusted for LTP
+SESSION_FILE: str = getattr(config, "SESSION_FILE", os.path.join("cache", "session.json"))
+# Exchanges whose tokens never change; derivative tokens are reused by later contracts after expiry
+PERSISTENT_EXCHANGES: Tuple[str, ...] = getattr(config, "PERSISTENT_EXCHANGES", ("NSE", "BSE"))
+
+
+class TokenResolver:
+    """(exchange, symbol) -> token cache in front of searchscrip.
+
+    Only tokens of PERSISTENT_EXCHANGES are written to disk. NFO tokens are
+    recycled by new contracts after expiry, so they are kept for this process
+    only (and re-seeded from the day's symbol master at startup).
+    """
+
+    def __init__(self, path: str = TOKEN_CACHE_FILE,
+                 persistent: Iterable[str] = PERSISTENT_EXCHANGES) -> None:
+        """Loads previously resolved tokens from `path` if it exists.
+
+        Args:
+            path (str): JSON file the cache is persisted to.
+            persistent (Iterable[str]): Exchanges whose tokens are persisted.
+        """
+        self.path = path
+        self.persistent = tuple(persistent)
+        self._lock = threading.Lock()
+        self._tokens: Dict[str, str] = {}
+        try:
+            with open(path) as f:
+                # Older caches also held NFO entries; those may now name another contract
+                self._tokens = {k: v for k, v in json.load(f).items() if self._persisted(k)}
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    @staticmethod
+    def _key(exchange: str, symbol: str) -> str:
+        return f"{exchange}|{symbol}"
+
+    def _persisted(self, key: str) -> bool:
+        return key.split("|", 1)[0] in self.persistent
+
+    def seed(self, exchange: str, tokens: Mapping[str, str]) -> None:
+        """Adds symbol -> token pairs, e.g. from the symbol master, without persisting them.
+
+        Args:
+            exchange (str): Exchange the symbols belong to.
+            tokens (Mapping[str, str]): Trading symbol -> token.
+        """
+        with self._lock:
+            self._tokens.update((self._key(exchange, s), str(t)) for s, t in tokens.items())
+
+    def get(self, exchange: str, symbol: str) -> Optional[str]:
+        """Returns the cached token, or None."""
+        return self._tokens.get(self._key(exchange, symbol))
+
+    def put(self, exchange: str, symbol: str, token: str) -> None:
+        """Caches a resolved token, persisting the cache if the exchange's tokens are stable."""
+        with self._lock:
+            self._tokens[self._key(exchange, symbol)] = token
+            if exchange not in self.persistent:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp = f"{self.path}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump({k: v for k, v in self._tokens.items() if self._persisted(k)}, f)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                print(f"Could not persist token cache: {e}")
 
 
 class APIClient:
@@ -20,34 +97,153 @@ class APIClient:
         if cls._instance is None:
             cls._instance = super().__new__(cls)
             cls._instance.api = ShoonyaApiPy()
-            cls._instance.login()
+            # Rate-limited, coalescing front for every REST call; use .api only for the websocket
+            cls._instance.rest = RestScheduler(cls._instance.api)
+            cls._instance.tokens = TokenResolver()
+            cls._instance.logged_in = False
+            cls._instance.feed = None  # TickStore of the live feed, set by websocket_handler
+            cls._instance._login_lock = threading.Lock()
         return cls._instance
 
     def login(self) -> None:
-        """Logs into the Shoonya API."""
-        self.api.login(
-            userid=config.UID,
-            password=config.PWD,
-            twoFA=pyotp.TOTP(config.TOKEN).now(),
-            vendor_code=config.VC,
-            api_secret=config.APP_KEY,
-            imei=config.IMEI,
-        )
+        """Logs into the Shoonya API once; later calls return immediately.
+
+        Importing this module no longer logs in: startup.Startup calls this
+        explicitly, and the helpers below call it on first use. A session token
+        saved earlier the same day is reused if the broker still accepts it, so a
+        restart skips the TOTP login.
+
+        Raises:
+            RuntimeError: If the broker rejects the login (or does not answer); the
+                next call tries again.
+        """
+        with self._login_lock:
+            if self.logged_in:
+                return
+            if self._resume_session():
+                self.logged_in = True
+                print("✅ Resumed saved Shoonya session.")
+                return
+            ret = self.api.login(
+                userid=config.UID,
+                password=config.PWD,
+                twoFA=pyotp.TOTP(config.TOKEN).now(),
+                vendor_code=config.VC,
+                api_secret=config.APP_KEY,
+                imei=config.IMEI,
+            )
+            if not ret or ret.get("stat") != "Ok":
+                raise RuntimeError(f"Shoonya login failed: {ret.get('emsg', ret) if ret else 'no response'}")
+            if ret.get("susertoken"):
+                self._save_session(ret["susertoken"])
+            self.logged_in = True
         print("✅ Logged into Shoonya API successfully.")
 
-    def get_ltp(self, stockname: str) -> float:
+    def _resume_session(self, path: str = SESSION_FILE) -> bool:
+        """Sets the session from today's saved token and checks it with one cheap call."""
+        try:
+            with open(path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if saved.get("uid") != config.UID or saved.get("day") != date.today().isoformat():
+            return False
+        self.api.set_session(userid=config.UID, password=config.PWD, usertoken=saved["token"])
+        try:
+            ret = self.rest.get_limits()
+        except Exception as e:
+            print(f"Saved session check failed: {e}")
+            return False
+        return bool(ret) and ret.get("stat") == "Ok"
+
+    def _save_session(self, token: str, path: str = SESSION_FILE) -> None:
+        """Persists the session token atomically, readable by the owner only."""
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp = f"{path}.tmp"
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump({"uid": config.UID, "day": date.today().isoformat(), "token": token}, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Could not persist session: {e}")
+
+    def resolve_token(self, stockname: str, exchange: str = "NSE") -> str:
+        """Returns the token for a symbol, calling searchscrip only on a cache miss.
+
+        Args:
+            stockname (str): Symbol or search text, e.g. 'NIFTY INDEX'.
+            exchange (str): Exchange to search on.
+
+        Returns:
+            str: The broker token.
+        """
+        token = self.tokens.get(exchange, stockname)
+        if token is None:
+            self.login()
+            ret = self.rest.searchscrip(exchange=exchange, searchtext=stockname)
+            token = ret["values"][0]["token"]
+            self.tokens.put(exchange, stockname, token)
+        return token
+
+    def _feed_ltp(self, token: str, max_age: float) -> Optional[float]:
+        """Returns the streamed LTP if its tick is newer than `max_age` seconds."""
+        tick = None if self.feed is None else self.feed.get(token)
+        if tick is None:
+            return None
+        ltp, ts_ns = tick
+        if time.time_ns() - ts_ns > max_age * 1_000_000_000:
+            return None
+        return ltp
+
+    def get_ltp(self, stockname: str, exchange: str = "NSE", max_age: float = FEED_MAX_AGE) -> float:
         """Fetches Last Traded Price (LTP) for a stock.
-        
+
+        Answers from the live feed (once websocket_handler has attached it as `feed`)
+        when the token's last tick is fresher than `max_age` seconds, otherwise asks
+        the broker with get_quotes.
+
         Args:
             stockname (str): The name of the stock to fetch the LTP for.
-        
+            exchange (str): Exchange of the symbol.
+            max_age (float): Maximum age in seconds of a feed tick to use.
+
         Returns:
             float: The last traded price of the stock.
         """
-        ret = self.api.searchscrip(exchange="NSE", searchtext=stockname)
-        token: str = ret["values"][0]["token"]
-        res = self.api.get_quotes(exchange="NSE", token=token)
-        return float(res["lp"])
+        return self.get_ltps([stockname], exchange, max_age)[stockname]
+
+    def get_ltps(self, stocknames: Iterable[str], exchange: str = "NSE",
+                 max_age: float = FEED_MAX_AGE) -> Dict[str, float]:
+        """Fetches LTPs for several symbols, feed first.
+
+        Symbols whose feed tick is missing or stale are quoted from the broker in one
+        concurrent batch on the REST scheduler, so the fallback costs one round-trip of
+        wall time.
+
+        Args:
+            stocknames (Iterable[str]): Symbols to fetch.
+            exchange (str): Exchange of the symbols.
+            max_age (float): Maximum age in seconds of a feed tick to use.
+
+        Returns:
+            Dict[str, float]: Symbol -> last traded price.
+        """
+        result: Dict[str, float] = {}
+        stale: List[Tuple[str, str]] = []
+        for name in stocknames:
+            token = self.resolve_token(name, exchange)
+            ltp = self._feed_ltp(token, max_age)
+            if ltp is None:
+                stale.append((name, token))
+            else:
+                result[name] = ltp
+        if stale:
+            self.login()
+        quotes = [self.rest.submit('get_quotes', exchange=exchange, token=token) for _, token in stale]
+        for (name, _), quote in zip(stale, quotes):
+            result[name] = float(quote.result()["lp"])
+        return result
 
 
 # Singleton instance
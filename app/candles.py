@@ -0,0 +1,283 @@
+"""
+candles.py - Streaming tick-to-candle aggregation.
+
+CandleBuilder keeps rolling 1-minute and 5-minute OHLC bars per token in
+preallocated NumPy arrays. It is seeded once from broker history at startup and
+then fed by the websocket ticks, so the current 5-minute frame is available
+without a REST round-trip or a pandas resample.
+
+All bar times are local wall-clock epoch nanoseconds (the same clock as the
+naive 'Datetime' column produced from get_time_series).
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+NS_PER_MIN = 60 * 1_000_000_000
+LOCAL_OFFSET_NS = int(datetime.now().astimezone().utcoffset().total_seconds() * 1_000_000_000)
+INTERVALS = (1, 5)
+
+
+def aggregate_bars(t: np.ndarray, o: np.ndarray, h: np.ndarray, l: np.ndarray, c: np.ndarray,
+                   minutes: int) -> Tuple[np.ndarray, ...]:
+    """Aggregates time-sorted bars into `minutes`-wide buckets.
+
+    Args:
+        t (np.ndarray): Bar start times (int64 ns), ascending.
+        o, h, l, c (np.ndarray): Open/High/Low/Close columns aligned with `t`.
+        minutes (int): Target bucket width in minutes.
+
+    Returns:
+        Tuple[np.ndarray, ...]: (t, o, h, l, c) of the aggregated bars.
+    """
+    if len(t) == 0:
+        return t, o, h, l, c
+    interval = minutes * NS_PER_MIN
+    bucket = t - t % interval
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(t)] - 1
+    return (bucket[starts], o[starts], np.maximum.reduceat(h, starts),
+            np.minimum.reduceat(l, starts), c[ends])
+
+
+class CandleSeries:
+    """Rolling OHLC bars for one token at one interval."""
+
+    __slots__ = ('interval', 'max_bars', 'n', 't', 'o', 'h', 'l', 'c',
+                 'cur_t', 'cur_o', 'cur_h', 'cur_l', 'cur_c')
+
+    def __init__(self, minutes: int, max_bars: int) -> None:
+        self.interval = minutes * NS_PER_MIN
+        self.max_bars = max_bars
+        self.n = 0
+        self.t = np.zeros(2 * max_bars, dtype=np.int64)
+        self.o = np.zeros(2 * max_bars, dtype=np.float64)
+        self.h = np.zeros(2 * max_bars, dtype=np.float64)
+        self.l = np.zeros(2 * max_bars, dtype=np.float64)
+        self.c = np.zeros(2 * max_bars, dtype=np.float64)
+        self.cur_t = -1
+        self.cur_o = self.cur_h = self.cur_l = self.cur_c = 0.0
+
+    def _append(self, t: int, o: float, h: float, l: float, c: float) -> None:
+        if self.n == len(self.t):
+            # Keep the newest max_bars; amortised O(1) per append
+            keep = self.max_bars
+            for col in (self.t, self.o, self.h, self.l, self.c):
+                col[:keep] = col[self.n - keep:self.n]
+            self.n = keep
+        i = self.n
+        self.t[i], self.o[i], self.h[i], self.l[i], self.c[i] = t, o, h, l, c
+        self.n += 1
+
+    def update(self, t_ns: int, o: float, h: float, l: float, c: float) -> bool:
+        """Merges a tick or sub-bar starting at `t_ns` into the series.
+
+        Returns:
+            bool: True if the update closed the previous bar.
+        """
+        bucket = t_ns - t_ns % self.interval
+        if bucket == self.cur_t:
+            if h > self.cur_h:
+                self.cur_h = h
+            if l < self.cur_l:
+                self.cur_l = l
+            self.cur_c = c
+            return False
+        if bucket < self.cur_t:
+            # Late tick for an already closed bar; ignore it
+            return False
+        closed = self.cur_t >= 0
+        if closed:
+            self._append(self.cur_t, self.cur_o, self.cur_h, self.cur_l, self.cur_c)
+        self.cur_t, self.cur_o, self.cur_h, self.cur_l, self.cur_c = bucket, o, h, l, c
+        return closed
+
+    def seed(self, t: np.ndarray, o: np.ndarray, h: np.ndarray, l: np.ndarray, c: np.ndarray) -> None:
+        """Replaces the series with already-aggregated bars; the last one stays open."""
+        self.n = 0
+        self.cur_t = -1
+        if len(t) == 0:
+            return
+        k = min(len(t) - 1, self.max_bars)
+        s = len(t) - 1 - k
+        self.t[:k], self.o[:k], self.h[:k], self.l[:k], self.c[:k] = t[s:-1], o[s:-1], h[s:-1], l[s:-1], c[s:-1]
+        self.n = k
+        self.cur_t = int(t[-1])
+        self.cur_o, self.cur_h, self.cur_l, self.cur_c = float(o[-1]), float(h[-1]), float(l[-1]), float(c[-1])
+
+    def arrays(self, include_current: bool = True) -> Tuple[np.ndarray, ...]:
+        """Copies the bars out as (t, o, h, l, c) arrays, oldest first."""
+        n = self.n
+        if not include_current or self.cur_t < 0:
+            return self.t[:n].copy(), self.o[:n].copy(), self.h[:n].copy(), self.l[:n].copy(), self.c[:n].copy()
+        return (np.append(self.t[:n], self.cur_t), np.append(self.o[:n], self.cur_o),
+                np.append(self.h[:n], self.cur_h), np.append(self.l[:n], self.cur_l),
+                np.append(self.c[:n], self.cur_c))
+
+
+class CandleBuilder:
+    """Per-token rolling 1m/5m candles fed by ticks."""
+
+    def __init__(self, max_bars: int = 1500) -> None:
+        """Initializes an empty builder.
+
+        Args:
+            max_bars (int): Closed bars kept per token and interval (1500 ≈ four
+                sessions of 1-minute bars).
+        """
+        self.max_bars = max_bars
+        self._lock = threading.Lock()
+        self._series: Dict[str, Dict[int, CandleSeries]] = {}
+
+    def _get(self, token: str) -> Dict[int, CandleSeries]:
+        series = self._series.get(token)
+        if series is None:
+            series = {m: CandleSeries(m, self.max_bars) for m in INTERVALS}
+            self._series[token] = series
+        return series
+
+    def __contains__(self, token: str) -> bool:
+        return token in self._series
+
+    def on_tick(self, token: str, ltp: float, ts_ns: int) -> bool:
+        """Feeds one tick into the token's candles.
+
+        Args:
+            token (str): Broker token.
+            ltp (float): Last traded price.
+            ts_ns (int): Exchange timestamp in UTC epoch nanoseconds.
+
+        Returns:
+            bool: True if the tick closed a 5-minute bar.
+        """
+        t = ts_ns + LOCAL_OFFSET_NS
+        with self._lock:
+            series = self._series.get(token)
+            if series is None:
+                return False
+            series[1].update(t, ltp, ltp, ltp, ltp)
+            return series[5].update(t, ltp, ltp, ltp, ltp)
+
+    def seed(self, token: str, df: pd.DataFrame) -> None:
+        """Seeds a token's candles from 1-minute history.
+
+        Args:
+            token (str): Broker token.
+            df (pd.DataFrame): 1-minute bars with 'Datetime', 'Open', 'High', 'Low'
+                and 'Close' columns, as prepared from get_time_series.
+        """
+        df = df.sort_values('Datetime')
+        t = df['Datetime'].values.astype('datetime64[ns]').astype(np.int64)
+        cols = [df[k].to_numpy(dtype=np.float64) for k in ('Open', 'High', 'Low', 'Close')]
+        with self._lock:
+            series = self._get(token)
+            for minutes, s in series.items():
+                s.seed(*aggregate_bars(t, *cols, minutes))
+
+    def export(self, bars: int) -> Dict[str, Tuple[np.ndarray, ...]]:
+        """Copies out the newest 1-minute bars of every token, for snapshotting.
+
+        The copy starts on a 5-minute boundary so restore() rebuilds whole 5-minute bars.
+
+        Args:
+            bars (int): Maximum 1-minute bars per token, including the in-progress one.
+
+        Returns:
+            Dict[str, Tuple[np.ndarray, ...]]: Token -> (t, o, h, l, c) 1-minute arrays.
+        """
+        five = 5 * NS_PER_MIN
+        with self._lock:
+            series = {token: s[1].arrays() for token, s in self._series.items()}
+        out = {}
+        for token, (t, o, h, l, c) in series.items():
+            start = max(0, len(t) - bars)
+            while start < len(t) and start > 0 and t[start] % five:
+                start += 1
+            out[token] = (t[start:], o[start:], h[start:], l[start:], c[start:])
+        return out
+
+    def restore(self, bars: Dict[str, Tuple[np.ndarray, ...]]) -> None:
+        """Seeds tokens from export() output; the last bar of each stays open."""
+        with self._lock:
+            for token, cols in bars.items():
+                for minutes, s in self._get(token).items():
+                    s.seed(*aggregate_bars(*cols, minutes))
+
+    def track(self, tokens: Sequence[str]) -> None:
+        """Starts building candles from ticks for tokens that have no history seed."""
+        with self._lock:
+            for token in tokens:
+                self._get(str(token))
+
+    def arrays(self, token: str, minutes: int = 5) -> Optional[Tuple[np.ndarray, ...]]:
+        """Returns (t, o, h, l, c) arrays including the in-progress bar, or None if untracked."""
+        with self._lock:
+            series = self._series.get(token)
+            if series is None:
+                return None
+            return series[minutes].arrays()
+
+    def matrix(self, tokens: Sequence[str], depth: int, minutes: int = 5,
+               now_ns: Optional[int] = None) -> Tuple[np.ndarray, ...]:
+        """Returns the last `depth` closed bars of several tokens as 2-D (token x bar) arrays.
+
+        A bar counts as closed once its interval has ended by `now_ns`, even if the
+        token has not ticked since, so every row ends at the same bar boundary.
+
+        Args:
+            tokens (Sequence[str]): Row order.
+            depth (int): Bars per row, oldest first.
+            minutes (int): 1 or 5.
+            now_ns (Optional[int]): UTC epoch ns; the current time if omitted.
+
+        Returns:
+            Tuple[np.ndarray, ...]: (t, o, h, l, c), each shaped (len(tokens), depth). Rows
+            with fewer bars are left-padded with t = 0 and NaN prices.
+        """
+        now = (time.time_ns() if now_ns is None else now_ns) + LOCAL_OFFSET_NS
+        interval = minutes * NS_PER_MIN
+        n = len(tokens)
+        t = np.zeros((n, depth), dtype=np.int64)
+        o, h, l, c = (np.full((n, depth), np.nan) for _ in range(4))
+        with self._lock:
+            for row, token in enumerate(tokens):
+                series = self._series.get(str(token))
+                if series is None:
+                    continue
+                s = series[minutes]
+                k = min(s.n, depth)
+                current = s.cur_t >= 0 and s.cur_t + interval <= now
+                if current:
+                    k = min(s.n, depth - 1)
+                start = depth - k - current
+                t[row, start:start + k] = s.t[s.n - k:s.n]
+                o[row, start:start + k] = s.o[s.n - k:s.n]
+                h[row, start:start + k] = s.h[s.n - k:s.n]
+                l[row, start:start + k] = s.l[s.n - k:s.n]
+                c[row, start:start + k] = s.c[s.n - k:s.n]
+                if current:
+                    t[row, -1], o[row, -1], h[row, -1], l[row, -1], c[row, -1] = (
+                        s.cur_t, s.cur_o, s.cur_h, s.cur_l, s.cur_c)
+        return t, o, h, l, c
+
+    def frame(self, token: str, minutes: int = 5) -> Optional[pd.DataFrame]:
+        """Returns the token's candles in the same layout as dt_update.
+
+        Args:
+            token (str): Broker token.
+            minutes (int): 1 or 5.
+
+        Returns:
+            Optional[pd.DataFrame]: Columns Datetime, Open, High, Low, Close, oldest first
+            and including the in-progress bar, or None if the token is not tracked.
+        """
+        bars = self.arrays(token, minutes)
+        if bars is None:
+            return None
+        t, o, h, l, c = bars
+        return pd.DataFrame({'Datetime': t.astype('datetime64[ns]'), 'Open': o, 'High': h, 'Low': l, 'Close': c})
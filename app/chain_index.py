@@ -0,0 +1,158 @@
+"""
+chain_index.py - Precomputed option-chain index for premium-based strike selection.
+
+For each option type the index holds an immutable Chain of aligned NumPy
+arrays (token, strike, trading symbol, tick_store slot), plus a token ->
+(option, row) map. Selecting the strike nearest to a target premium is one
+vectorized argmin over the live LTP column instead of a Python loop over the
+chain.
+
+The subscription manager re-centres the index from a worker thread while
+strategy threads read it, so set_chain() builds the new Chain and row map first
+and publishes each with a single assignment. Readers that use more than one
+array take chain(option) once and index that, never mixing two generations.
+"""
+
+from typing import Dict, Iterable, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from tick_store import TickStore
+
+
+class Chain(NamedTuple):
+    """One option type's rows, sorted by strike; the arrays are never modified in place."""
+    tokens: np.ndarray
+    strikes: np.ndarray
+    symbols: np.ndarray
+    slots: np.ndarray
+
+
+class ChainIndex:
+    """Aligned token/strike/symbol arrays per option type over a TickStore."""
+
+    def __init__(self, chains: Dict[str, pd.DataFrame], store: TickStore) -> None:
+        """Builds the index.
+
+        Args:
+            chains (Dict[str, pd.DataFrame]): Option type ("CE"/"PE") -> symbol master rows
+                with 'Token', 'StrikePrice' and 'TradingSymbol' columns.
+            store (TickStore): Live tick store that supplies the LTP column.
+        """
+        self.store = store
+        self.chains: Dict[str, Chain] = {}
+        self.rows: Dict[str, Tuple[str, int]] = {}
+        for option, info in chains.items():
+            self.set_chain(option, info)
+
+    def set_chain(self, option: str, info: pd.DataFrame) -> None:
+        """(Re)builds the arrays for one option type and publishes them in one step.
+
+        Args:
+            option (str): "CE" or "PE".
+            info (pd.DataFrame): Symbol master rows for that option type.
+        """
+        info = info.sort_values('StrikePrice')
+        tokens = info['Token'].astype(str).to_numpy()
+        chain = Chain(tokens, info['StrikePrice'].to_numpy(dtype=np.float64),
+                      info['TradingSymbol'].to_numpy(dtype=object), self.store.slots(tokens))
+        rows = {token: loc for token, loc in self.rows.items() if loc[0] != option}
+        rows.update((token, (option, row)) for row, token in enumerate(tokens))
+        self.chains = {**self.chains, option: chain}
+        self.rows = rows
+
+    def chain(self, option: str) -> Chain:
+        """Returns the current Chain of one option type (a consistent set of arrays)."""
+        return self.chains[option]
+
+    @property
+    def tokens(self) -> Dict[str, np.ndarray]:
+        """Option type -> tokens. Use chain() when reading more than one array."""
+        return {option: chain.tokens for option, chain in self.chains.items()}
+
+    @property
+    def strikes(self) -> Dict[str, np.ndarray]:
+        """Option type -> strikes. Use chain() when reading more than one array."""
+        return {option: chain.strikes for option, chain in self.chains.items()}
+
+    @property
+    def symbols(self) -> Dict[str, np.ndarray]:
+        """Option type -> trading symbols. Use chain() when reading more than one array."""
+        return {option: chain.symbols for option, chain in self.chains.items()}
+
+    @property
+    def slots(self) -> Dict[str, np.ndarray]:
+        """Option type -> tick_store slots. Use chain() when reading more than one array."""
+        return {option: chain.slots for option, chain in self.chains.items()}
+
+    def lookup(self, token: str) -> Optional[Tuple[str, int]]:
+        """Returns (option, row) for a token, or None if it is not in the chain."""
+        return self.rows.get(token)
+
+    def ltps(self, option: str, chain: Optional[Chain] = None) -> np.ndarray:
+        """Returns a consistent copy of the live LTPs for one option type (NaN if not ticked).
+
+        Args:
+            option (str): "CE" or "PE".
+            chain (Optional[Chain]): Chain the LTPs must align with; the current one if omitted.
+        """
+        chain = self.chains[option] if chain is None else chain
+        return self.store.ltps(chain.slots)
+
+    def nearest(self, premium: float, option: str) -> Optional[int]:
+        """Finds the row whose live LTP is closest to `premium`.
+
+        Args:
+            premium (float): Target premium.
+            option (str): "CE" or "PE".
+
+        Returns:
+            Optional[int]: Row index, or None if no strike has ticked yet.
+        """
+        rows = self.nearest_many([premium], option)
+        return None if rows[0] < 0 else int(rows[0])
+
+    def nearest_many(self, premiums: Sequence[float], option: str,
+                     ltps: Optional[np.ndarray] = None) -> np.ndarray:
+        """Vectorized nearest-premium lookup for several targets.
+
+        Args:
+            premiums (Sequence[float]): Target premiums.
+            option (str): "CE" or "PE".
+            ltps (Optional[np.ndarray]): LTP snapshot from ltps(); taken now if omitted.
+
+        Returns:
+            np.ndarray: Row index per premium, -1 where no strike has ticked.
+        """
+        if ltps is None:
+            ltps = self.ltps(option)
+        targets = np.asarray(premiums, dtype=np.float64)
+        diff = np.abs(ltps[None, :] - targets[:, None])
+        if diff.shape[1] == 0:
+            return np.full(len(targets), -1, dtype=np.int64)
+        diff[np.isnan(diff)] = np.inf
+        rows = diff.argmin(axis=1)
+        rows[np.isinf(diff[np.arange(len(targets)), rows])] = -1
+        return rows
+
+    def select(self, premiums: Sequence[float], options: Iterable[str] = ("CE", "PE")) -> Dict[str, list]:
+        """Batch strike selection for several premiums and option types at once.
+
+        Args:
+            premiums (Sequence[float]): Target premiums.
+            options (Iterable[str]): Option types to search.
+
+        Returns:
+            Dict[str, list]: Option type -> list of (symbol, strike, ltp) per premium,
+            with None where no strike has ticked.
+        """
+        result = {}
+        for option in options:
+            chain = self.chains[option]
+            ltps = self.ltps(option, chain)
+            rows = self.nearest_many(premiums, option, ltps)
+            result[option] = [None if row < 0 else
+                              (chain.symbols[row], float(chain.strikes[row]), float(ltps[row]))
+                              for row in rows]
+        return result
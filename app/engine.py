@@ -0,0 +1,402 @@
+"""
+engine.py - Multi-underlying, multi-expiry engine sharded across processes.
+
+Every Instrument of the universe (see universe.py) runs in its own worker
+process with its own option chain window, TickStore, CandleBuilder,
+IndicatorEngine, ChainIndex, position/trigger stores, OrderBook and
+TickDispatcher, so shards do not share a GIL or any `glb` state. The Coordinator in the parent process is given the
+broker client (the REST scheduler) and the webhook dispatcher, and runs the
+websocket:
+
+* websocket ticks are queued on a TickRing and routed in batches to the
+  shards that hold the token (the index token goes to every shard of its
+  underlying), one queue put per shard per batch;
+* shards send back webhook events and order requests; the coordinator sends
+  the orders through its own OrderGateway on the shared session (exits first,
+  idempotency keys, retries) and returns each result to the shard;
+* order updates go into the coordinator's OrderBook, which the gateway checks
+  before a retry, and are routed to the shard that owns the trading symbol,
+  where the shard's OrderBook and PositionFills update its positions.
+
+Strategies are plugged in per shard via config.SHARD_STRATEGY ("module:function"),
+called once in each worker with the shard's ShardContext. The default,
+strategy:attach, runs the NIFTY trigger-candle strategy (per-candle scan,
+breakout entry, target/SL exit) on every shard.
+
+Usage:
+    python app/engine.py
+"""
+
+import importlib
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+import config
+
+from candles import CandleBuilder
+from chain_index import ChainIndex
+from history_cache import BarCache
+from indicators import IndicatorEngine
+from metrics import registry
+from order import OrderGateway
+from order_book import OrderBook, PositionFills
+from stores import PositionStore, TriggerStore
+from strategy_dispatch import TickDispatcher
+from tick_ring import TickConsumer, TickRing
+from tick_store import NS_PER_SEC, TickStore
+from universe import Instrument, load_universe
+
+SHARD_STRATEGY: Optional[str] = getattr(config, "SHARD_STRATEGY", "strategy:attach")  # None runs no strategy
+SEED_DAYS: int = getattr(config, "SHARD_SEED_DAYS", 4)
+
+Tick = tuple  # (token, ltp, ts_ns, recv_wall_ns)
+
+
+class ShardSpec(NamedTuple):
+    """Everything a worker needs to build its shard; pickled to the worker once."""
+    instrument: Instrument
+    expiry: date
+    chain: pd.DataFrame               # Symbol master rows inside the strike window
+    seed: Dict[str, np.ndarray]       # Token -> 1-minute history_cache.BAR_DTYPE bars
+
+
+def _seed_frame(bars: np.ndarray) -> pd.DataFrame:
+    """Converts BAR_DTYPE bars to the Datetime/Open/High/Low/Close layout CandleBuilder.seed takes."""
+    return pd.DataFrame({'Datetime': bars['t'].astype('datetime64[s]').astype('datetime64[ns]'),
+                         'Open': bars['o'], 'High': bars['h'], 'Low': bars['l'], 'Close': bars['c']})
+
+
+class ShardContext:
+    """Per-shard state and the shard's channel back to the coordinator (worker process side)."""
+
+    def __init__(self, spec: ShardSpec, outbox) -> None:
+        self.instrument = spec.instrument
+        self.name = spec.instrument.name
+        self.expiry = spec.expiry
+        self.tick_store = TickStore()
+        self.candles = CandleBuilder()
+        self.indicators = IndicatorEngine(self.candles)
+        chain = spec.chain
+        self.chain_index = ChainIndex({"CE": chain[chain["OptionType"] == "CE"],
+                                       "PE": chain[chain["OptionType"] == "PE"]}, self.tick_store)
+        self.positions = PositionStore()
+        self.triggers = TriggerStore()
+        self.dispatcher = TickDispatcher()
+        symbols = dict(zip(chain["TradingSymbol"].astype(str), chain["Token"].astype(str)))
+        self.order_book = OrderBook(resolve=lambda exchange, symbol: symbols.get(symbol))
+        self.position_fills = PositionFills(self.positions)
+        self.order_book.add_listener(self.position_fills)
+        self.order_handlers: List[Callable[[dict], None]] = [self.order_book.on_update]
+        self._outbox = outbox
+        self._placing: Dict[str, Future] = {}  # Idempotency key -> Future awaiting the coordinator
+        tokens = chain["Token"].astype(str).tolist()
+        for token in tokens:
+            bars = spec.seed.get(token)
+            if bars is not None and len(bars):
+                self.candles.seed(token, _seed_frame(bars))
+        self.candles.track(tokens)
+
+    def emit_webhook(self, event_name: str) -> None:
+        """Asks the coordinator to fire an event's webhooks (e.g. "CE_Buy")."""
+        self._outbox.put(('webhook', self.name, event_name))
+
+    def submit(self, key: str, is_exit: bool, recheck: bool = False, **params: Any) -> Future:
+        """Asks the coordinator's OrderGateway to place an order (the OrderGateway.submit interface).
+
+        Strategies pass the shard context as their gateway, e.g. place_buy_order(..., via=ctx).
+        Fills and rejections come back through the on_order handlers (the shard's OrderBook).
+
+        Returns:
+            Future: Resolves to the broker response once the coordinator placed the order,
+            or raises RuntimeError if it failed.
+        """
+        future = self._placing.get(key)
+        if future is not None:
+            return future
+        future = self._placing[key] = Future()
+        self._outbox.put(('order', self.name, (key, is_exit, recheck, params)))
+        return future
+
+    def on_placed(self, key: str, response: Optional[dict], error: Optional[str]) -> None:
+        """Resolves the Future of an order the coordinator placed or failed to place."""
+        future = self._placing.pop(key, None)
+        if future is None:
+            return
+        if error is not None:
+            future.set_exception(RuntimeError(error))
+        else:
+            future.set_result(response)
+
+    def on_order(self, handler: Callable[[dict], None]) -> None:
+        """Registers a handler for this shard's order updates."""
+        self.order_handlers.append(handler)
+
+    def log(self, msg: str) -> None:
+        """Prints in the coordinator's output, prefixed with the shard name."""
+        self._outbox.put(('log', self.name, msg))
+
+    def on_ticks(self, ticks: List[Tick]) -> None:
+        """Applies a routed batch: candles see every tick, store/strategies only each token's latest."""
+        latest = {}
+        closed_ns = None
+        for token, ltp, ts_ns, recv_ns in ticks:
+            if self.candles.on_tick(token, ltp, ts_ns):
+                closed_ns = ts_ns
+            latest[token] = (ltp, ts_ns)
+        if closed_ns is not None:
+            self.indicators.on_candle_close(closed_ns)
+        for token, (ltp, ts_ns) in latest.items():
+            self.tick_store.update(token, ltp, ts_ns)
+            self.dispatcher.on_tick(token, ltp, ts_ns)
+
+
+def _load_strategy(path: str) -> Callable[[ShardContext], None]:
+    module, _, func = path.partition(':')
+    return getattr(importlib.import_module(module), func)
+
+
+def run_shard(spec: ShardSpec, inbox, outbox, strategy: Optional[str]) -> None:
+    """Worker process entry point: builds the shard and applies messages until None.
+
+    Args:
+        spec (ShardSpec): Shard definition.
+        inbox: Queue of ('ticks', [Tick]) / ('order', update) / ('placed', (key, response, error))
+            messages, None to stop.
+        outbox: Shared queue of (kind, shard name, payload) messages to the coordinator.
+        strategy (Optional[str]): "module:function" called once with the ShardContext.
+    """
+    name = spec.instrument.name
+    try:
+        ctx = ShardContext(spec, outbox)
+        if strategy:
+            _load_strategy(strategy)(ctx)
+    except Exception as e:
+        outbox.put(('error', name, f"startup failed: {e}"))
+        return
+    outbox.put(('ready', name, len(spec.chain)))
+    while True:
+        msg = inbox.get()
+        if msg is None:
+            break
+        kind, payload = msg
+        try:
+            if kind == 'ticks':
+                ctx.on_ticks(payload)
+            elif kind == 'order':
+                for handler in ctx.order_handlers:
+                    handler(payload)
+            elif kind == 'placed':
+                ctx.on_placed(*payload)
+        except Exception as e:
+            outbox.put(('error', name, f"{kind} handling failed: {e}"))
+    ctx.indicators.shutdown()
+    ctx.dispatcher.shutdown()
+
+
+class Coordinator:
+    """Runs the websocket on a given broker client and routes ticks to shard processes."""
+
+    def __init__(self, api, webhooks, universe: Optional[List[Instrument]] = None,
+                 strategy: Optional[str] = SHARD_STRATEGY, seed_days: int = SEED_DAYS) -> None:
+        """
+        Args:
+            api: Logged-in broker client, e.g. api_client.rest (the REST scheduler); it also
+                runs the websocket.
+            webhooks: Webhook dispatcher shard events are submitted to, e.g. trigger_handler.dispatcher.
+            universe (Optional[List[Instrument]]): Shards to run; config.UNIVERSE by default.
+            strategy (Optional[str]): "module:function" run in every shard.
+            seed_days (int): Days of 1-minute history each shard's candles are seeded with.
+        """
+        self.universe = load_universe() if universe is None else universe
+        self.strategy = strategy
+        self.seed_days = seed_days
+        self.specs: List[ShardSpec] = []
+        self.ready: Dict[str, threading.Event] = {i.name: threading.Event() for i in self.universe}
+        self._mp = multiprocessing.get_context('spawn')
+        self._inboxes = []
+        self._outbox = self._mp.Queue()
+        self._procs = []
+        self._routes: Dict[str, List[int]] = {}  # Token -> shard indexes
+        self._symbols: Dict[str, int] = {}       # Trading symbol -> shard index
+        self._tokens: Dict[str, str] = {}        # Trading symbol -> token
+        self._shards: Dict[str, int] = {}        # Shard name -> shard index
+        self._routed = []
+        self._ring = TickRing()
+        self._consumer = TickConsumer(self._ring, self._route)
+        self._api = api
+        # Shard orders share one gateway and one order book, fed by the order-update stream
+        self._book = OrderBook(resolve=lambda exchange, symbol: self._tokens.get(symbol))
+        self._gateway = OrderGateway(api, book=self._book)
+        self._webhooks = webhooks
+
+    def _plan(self, master, instrument: Instrument, bar_cache: BarCache) -> ShardSpec:
+        """Picks the shard's expiry and strike window and loads its candle seed."""
+        expiries = master.expiries(instrument.symbol)
+        if instrument.expiry >= len(expiries):
+            raise ValueError(f"{instrument.name}: only {len(expiries)} unexpired expiries listed")
+        expiry = expiries[instrument.expiry]
+        quote = self._api.get_quotes('NSE', instrument.index_token)
+        center = round(float(quote['lp']) / instrument.step) * instrument.step
+        chain = master.load_slice(instrument.symbol, expiry)
+        chain = chain[(chain["StrikePrice"] - center).abs() <= instrument.window].reset_index(drop=True)
+        start = (datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+                 - timedelta(days=self.seed_days)).timestamp()
+        seed = {}
+        for token in chain["Token"].astype(str):
+            try:
+                seed[token] = bar_cache.bars('NFO', token, start, 1)
+            except Exception as e:
+                print(f"{instrument.name}: no candle seed for {token}: {e}")
+        print(f"{instrument.name}: expiry {expiry}, {len(chain)} contracts around {center}")
+        return ShardSpec(instrument, expiry, chain, seed)
+
+    def start(self, timeout: float = 60.0) -> None:
+        """Plans and spawns every shard, then starts routing the websocket feed to them.
+
+        Raises:
+            TimeoutError: If a shard does not report ready within `timeout` seconds.
+        """
+        from symbol_master import load_master
+
+        self._webhooks.start()
+        master = load_master()
+        bar_cache = BarCache(self._api.get_time_price_series)
+        self.specs = [self._plan(master, i, bar_cache) for i in self.universe]
+
+        for index, spec in enumerate(self.specs):
+            inbox = self._mp.Queue()
+            proc = self._mp.Process(target=run_shard, name=f"shard-{spec.instrument.name}",
+                                    args=(spec, inbox, self._outbox, self.strategy), daemon=True)
+            proc.start()
+            self._inboxes.append(inbox)
+            self._procs.append(proc)
+            self._routed.append(registry.counter('shard_ticks_routed_total', "Ticks routed to a shard",
+                                                 shard=spec.instrument.name))
+            for token in [spec.instrument.index_token] + spec.chain["Token"].astype(str).tolist():
+                self._routes.setdefault(token, []).append(index)
+            self._shards[spec.instrument.name] = index
+            for symbol, token in zip(spec.chain["TradingSymbol"].astype(str), spec.chain["Token"].astype(str)):
+                self._symbols[symbol] = index
+                self._tokens[symbol] = token
+        threading.Thread(target=self._events, name="shard-events", daemon=True).start()
+        deadline = time.monotonic() + timeout
+        for name, event in self.ready.items():
+            if not event.wait(max(0.0, deadline - time.monotonic())):
+                raise TimeoutError(f"Shard {name} did not start within {timeout}s")
+
+        self._consumer.start()
+        self._api.start_websocket(order_update_callback=self._on_order_update,
+                                  subscribe_callback=self._ring.push,
+                                  socket_open_callback=self._subscribe)
+
+    def _subscribe(self) -> None:
+        """(Re)subscribes every shard's index and chain tokens; called on socket open."""
+        instruments = []
+        for spec in self.specs:
+            instruments.append(f"NSE|{spec.instrument.index_token}")
+            instruments += [f"NFO|{token}" for token in spec.chain["Token"].astype(str)]
+        self._api.subscribe(list(dict.fromkeys(instruments)))
+        print(f"Subscribed {len(instruments)} instruments for {len(self.specs)} shards")
+
+    def _route(self, batch: list) -> None:
+        """TickConsumer handler: splits a raw tick batch by shard, one queue put per shard."""
+        wall_offset = time.time_ns() - time.perf_counter_ns()
+        out: List[List[Tick]] = [[] for _ in self._inboxes]
+        for recv_ns, tick in batch:
+            routes = self._routes.get(tick.get('tk'))
+            if not routes or 'lp' not in tick:
+                continue
+            try:
+                ltp = float(tick['lp'])
+            except (ValueError, TypeError):
+                continue
+            try:
+                ts_ns = int(tick['ft']) * NS_PER_SEC
+            except (KeyError, ValueError, TypeError):
+                ts_ns = recv_ns + wall_offset
+            item = (tick['tk'], ltp, ts_ns, recv_ns + wall_offset)
+            for index in routes:
+                out[index].append(item)
+        for index, ticks in enumerate(out):
+            if ticks:
+                self._inboxes[index].put(('ticks', ticks))
+                self._routed[index].inc(len(ticks))
+
+    def _on_order_update(self, update: dict) -> None:
+        self._book.on_update(update)
+        index = self._symbols.get(update.get('tsym'))
+        if index is None:
+            print(f"Order update for unknown symbol {update}")
+            return
+        self._inboxes[index].put(('order', update))
+
+    def _place_order(self, shard: str, order: tuple) -> None:
+        """Queues a shard's order on the gateway; the result goes back to the shard as 'placed'."""
+        key, is_exit, recheck, params = order
+        inbox = self._inboxes[self._shards[shard]]
+
+        def placed(future: Future) -> None:
+            error = future.exception()
+            if error is not None:
+                print(f"{shard}: order {key} failed: {error}")
+                inbox.put(('placed', (key, None, str(error))))
+            else:
+                print(f"{shard}: order {key} placed: {future.result()}")
+                inbox.put(('placed', (key, future.result(), None)))
+
+        self._gateway.submit(key, is_exit, recheck, **params).add_done_callback(placed)
+
+    def _events(self) -> None:
+        """Executes what shards ask for: webhooks, orders, logs."""
+        while True:
+            msg = self._outbox.get()
+            if msg is None:
+                return
+            kind, shard, payload = msg
+            if kind == 'webhook':
+                self._webhooks.submit(payload)
+            elif kind == 'order':
+                self._place_order(shard, payload)
+            elif kind == 'ready':
+                print(f"Shard {shard} ready with {payload} contracts")
+                self.ready[shard].set()
+            elif kind == 'error':
+                print(f"Shard {shard} error: {payload}")
+            else:
+                print(f"[{shard}] {payload}")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Drains the feed, stops the shards and the coordinator's threads."""
+        self._consumer.stop()
+        for inbox in self._inboxes:
+            inbox.put(None)
+        for proc in self._procs:
+            proc.join(timeout)
+        self._outbox.put(None)
+        self._gateway.stop()
+        self._webhooks.stop()
+
+
+def main() -> None:
+    from api_client import api_client
+    import trigger_handler
+
+    api_client.login()
+    # REST calls are rate limited; websocket methods pass through
+    coordinator = Coordinator(api_client.rest, trigger_handler.dispatcher)
+    coordinator.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        coordinator.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,113 @@
-import time
+import hashlib
+import json
+import os
+import threading
 import pandas as pd
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
 
-# Modify the load_users_config function to cache the results
+USERS_FILE: str = 'users.csv'
+EVENT_COLUMNS: Dict[str, str] = {
+    'CE_Buy': 'ce_buy',
+    'CE_Exit': 'ce_exit',
+    'PE_Buy': 'pe_buy',
+    'PE_Exit': 'pe_exit'
+}
+
+
+class FanoutEntry(NamedTuple):
+    """One subscriber's precompiled webhook for an event."""
+    user_name: str
+    url: str
+    body: bytes  # Pre-serialized JSON payload
+
+
+# Cached registry, rebuilt only when users.csv changes
 _users_config_cache: Optional[Dict[str, Any]] = None
-_last_cache_time: float = 0
-CACHE_DURATION: int = 300  # Cache duration in seconds (5 minutes)
+_fanout_cache: Dict[str, Tuple[FanoutEntry, ...]] = {}
+_file_mtime: Optional[int] = None
+_file_hash: Optional[str] = None
+_reload_lock = threading.Lock()
+
+
+def _is_url(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith(('http://', 'https://'))
+
+
+def _compile(users_df: pd.DataFrame) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Tuple[FanoutEntry, ...]]]:
+    """Validates users.csv rows once and compiles the config dict and per-event fan-out tables.
+
+    Rows with a missing name or access token are skipped; empty webhook columns and ones that
+    are not http(s) URLs are left out of that event's fan-out table. Each problem is printed once.
+
+    Args:
+        users_df (pd.DataFrame): Contents of users.csv.
+
+    Returns:
+        Tuple[Dict[str, Dict[str, Any]], Dict[str, Tuple[FanoutEntry, ...]]]: The
+        load_users_config() dictionary and event name -> fan-out table.
+    """
+    missing = {'name', 'access_token', *EVENT_COLUMNS.values()} - set(users_df.columns)
+    if missing:
+        raise ValueError(f"users.csv is missing columns: {sorted(missing)}")
+
+    users_config: Dict[str, Dict[str, Any]] = {}
+    fanout: Dict[str, List[FanoutEntry]] = {event: [] for event in EVENT_COLUMNS}
+    columns = ['name', 'access_token', *EVENT_COLUMNS.values()]
+    for name, access_token, *urls in zip(*(users_df[c] for c in columns)):
+        if pd.isna(name) or pd.isna(access_token):
+            print(f"Skipping users.csv row without name/access_token: {name}")
+            continue
+        # A frame not read as text may hold all-digit names or tokens as numbers
+        name, access_token = str(name), str(access_token)
+        if name in users_config:
+            print(f"Duplicate user {name} in users.csv, keeping the last row")
+            for event in fanout:
+                fanout[event] = [entry for entry in fanout[event] if entry.user_name != name]
+        webhooks = dict(zip(EVENT_COLUMNS, urls))
+        users_config[name] = {
+            'access_token': access_token,
+            'webhooks': webhooks
+        }
+        for event, url in webhooks.items():
+            if pd.isna(url) or url == '':
+                continue  # User not subscribed to this event
+            if not _is_url(url):
+                print(f"Invalid {event} webhook for {name}: {url}")
+                continue
+            body = json.dumps({'access_token': access_token, 'alert_name': event}).encode()
+            fanout[event].append(FanoutEntry(name, url, body))
+
+    return users_config, {event: tuple(entries) for event, entries in fanout.items()}
+
+
+def _refresh() -> None:
+    """Reloads users.csv if its mtime and content hash changed since the last load."""
+    global _users_config_cache, _fanout_cache, _file_mtime, _file_hash
+    mtime: int = os.stat(USERS_FILE).st_mtime_ns
+    if mtime == _file_mtime:
+        return
+    with _reload_lock:
+        if mtime == _file_mtime:
+            return
+        with open(USERS_FILE, 'rb') as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        if digest != _file_hash:
+            # As text, so all-digit names and tokens keep their exact spelling (e.g. leading zeros)
+            users_df: pd.DataFrame = pd.read_csv(USERS_FILE, dtype=str)
+            _users_config_cache, _fanout_cache = _compile(users_df)
+            _file_hash = digest
+            print(f"Loaded {len(_users_config_cache)} users from {USERS_FILE}")
+        _file_mtime = mtime
+
 
 def load_users_config() -> Dict[str, Dict[str, Any]]:
     """Loads user configuration from 'users.csv' and caches the results.
-    
-    The function reads a CSV file named 'users.csv', extracts user credentials and webhook URLs, and 
-    returns a structured dictionary. The dictionary follows this structure:
-    
+
+    The function reads a CSV file named 'users.csv', extracts user credentials and webhook URLs, and
+    returns a structured dictionary. The file is re-read only when its modification time and
+    content hash change. The dictionary follows this structure:
+
     ```python
     {
         "username1": {
@@ -28,36 +123,34 @@ def load_users_config() -> Dict[str, Dict[str, Any]]:
         ...
     }
     ```
-    
+
     Returns:
-        Dict[str, Dict[str, Any]]: A dictionary where keys are usernames (str), and values are 
+        Dict[str, Dict[str, Any]]: A dictionary where keys are usernames (str), and values are
         dictionaries containing an 'access_token' (str) and a nested 'webhooks' dictionary with event-action mappings.
     """
-    global _users_config_cache, _last_cache_time
-    current_time: float = time.time()
-    
-    # Return cached config if it's still valid
-    if _users_config_cache and (current_time - _last_cache_time) < CACHE_DURATION:
-        return _users_config_cache
-    
     try:
-        users_df: pd.DataFrame = pd.read_csv('users.csv')
-        users_config: Dict[str, Dict[str, Any]] = {}
-        
-        for _, row in users_df.iterrows():
-            users_config[row['name']] = {
-                'access_token': row['access_token'],
-                'webhooks': {
-                    'CE_Buy': row['ce_buy'],
-                    'CE_Exit': row['ce_exit'],
-                    'PE_Buy': row['pe_buy'],
-                    'PE_Exit': row['pe_exit']
-                }
-            }
-        
-        _users_config_cache = users_config
-        _last_cache_time = current_time
-        return users_config
+        _refresh()
+        return _users_config_cache or {}
+    except Exception as e:
+        print(f"Error loading users config: {e}")
+        return _users_config_cache or {}
+
+
+def load_fanout_table(event_name: str) -> Tuple[FanoutEntry, ...]:
+    """Returns the precompiled fan-out table for an event.
+
+    Each entry carries the user name, webhook URL and the already serialized JSON body,
+    so dispatching needs no per-user payload building.
+
+    Args:
+        event_name (str): Event such as "CE_Buy" or "PE_Exit".
+
+    Returns:
+        Tuple[FanoutEntry, ...]: One entry per subscriber with a valid webhook for the
+        event; empty if the event is unknown or users.csv could not be loaded.
+    """
+    try:
+        _refresh()
     except Exception as e:
         print(f"Error loading users config: {e}")
-        return {}
+    return _fanout_cache.get(event_name, ())
@@ -1,9 +1,22 @@
+import threading
 import pandas as pd
+from tick_store import TickStore
+from candles import CandleBuilder
+from indicators import IndicatorEngine
+from stores import PositionStore, TriggerStore
+from order_book import OrderBook, PositionFills
+from strategy_dispatch import TickDispatcher
+from tick_recorder import TickRecorder
+from tick_ring import TickRing
+from startup import FeedReadiness
+import atexit
 
 
 # market_data.py || websocket_handler.py
-feedJson = {}
+tick_store = TickStore()
+feedJson = tick_store.view()
 """
+feedJson is a read view over tick_store; ticks are written via tick_store.update().
 feedjson={
     token = {
         'ltp' : last updated price,
@@ -11,7 +24,20 @@ feedjson={
         }
 }
 """
+# Rolling 1m/5m candles per token, seeded from history and fed by ticks
+candle_builder = CandleBuilder()
+# Vectorized slope/trigger-candle scan over candle_builder, run once per closed 5m interval
+indicator_engine = IndicatorEngine(candle_builder)
+# Per-token strategy handlers (watch_position / watch_trigger), run off the websocket thread
+tick_dispatcher = TickDispatcher()
+# Raw ticks queued by the websocket callback, drained in batches by websocket_handler.tick_consumer
+tick_ring = TickRing()
+# Raw tick log for replay (recordings/ticks_<date>.bin)
+tick_recorder = TickRecorder()
+atexit.register(tick_recorder.close)
 # websocket_handler.py
+# Socket-open and first-tick-per-token events used by startup.Startup
+feed_ready = FeedReadiness(lambda token: tick_store.get(token) is not None)
 feed_opened = False  
 websocket_connected = False 
 
@@ -27,49 +53,11 @@ HEADERS = {
 }
 TIMEOUT = 10
 
-
-
-# market_data.py
-
-#--------------------------------------------------------------
-from utils import get_ltp, round_to_multiple
-
-nifty_ltp = get_ltp('NIFTY INDEX')
-nifty_ltp_rounded = round_to_multiple(nifty_ltp, 50)
-print(f"Nifty LTP: {nifty_ltp}, Rounded: {nifty_ltp_rounded}")
-
-# Replace the existing CE/PE array creation with this:
-upper_strike = nifty_ltp_rounded + 600
-lower_strike = nifty_ltp_rounded - 600
-
-# Filter CE strikes within range
-ce_strikes = ce_info[
-    (ce_info['StrikePrice'] >= lower_strike) &
-    (ce_info['StrikePrice'] <= upper_strike)
-]
-result_array_CE = ce_strikes.apply(lambda row: f"{row['Exchange']}|{row['Token']}", axis=1).to_list()
-
-# Filter PE strikes within range
-pe_strikes = pe_info[
-    (pe_info['StrikePrice'] >= lower_strike) &
-    (pe_info['StrikePrice'] <= upper_strike)
-]
-result_array_PE = pe_strikes.apply(lambda row: f"{row['Exchange']}|{row['Token']}", axis=1).to_list()
-
-print(f"Monitoring CE strikes from {lower_strike} to {upper_strike}")
-print(f"Total CE strikes: {len(result_array_CE)}")
-print(f"Total PE strikes: {len(result_array_PE)}")
-
-
-
-
-
-
+# The NIFTY strike window is no longer computed here at import time (it needed a REST
+# quote and the symbol master); market_data.subscriptions builds and follows it.
 
 
 # Add these near the top with other global variables
-position_lock = threading.Lock()
-trigger_lock = threading.Lock()
 last_trigger_time = {}  # To track last trigger time for each symbol
 TRIGGER_COOLDOWN = 60  # 1 minute cooldown between triggers (changed from 300)
 
@@ -81,11 +69,16 @@ processed_orders = set()  # To track already processed orders
 
 df=pd.DataFrame
 
-positions = pd.DataFrame(columns=['token', 'symbolname','option_type', 'buy_price', 'sell_price', 'buy_time', 'sell_time', 'state', 'option', 'qty', 'target', 'sl', 'trail'])
+# Indexed position store (same fields as the old positions DataFrame; .to_frame() for reports)
+positions = PositionStore()
 
 
-# Initialize an empty DataFrame to store trigger data
-trigger_df = pd.DataFrame(columns=["symbolname","token","option_type","High", "Low", "TriggerCandle_Time", "State"])
+# Indexed trigger store (same fields as the old trigger_df DataFrame; .to_frame() for reports)
+trigger_df = TriggerStore()
+# Orders and fills from the order-update stream; fills write buy_price/sell_price into positions
+order_book = OrderBook()
+position_fills = PositionFills(positions)
+order_book.add_listener(position_fills)
 # Add this at the top of the file with other global variables
 processed_candles = set()  # To track which candles we've processed
 # Add these near the top with other global variables
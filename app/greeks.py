@@ -0,0 +1,307 @@
+"""
+greeks.py - Vectorized implied volatility and Greeks over the subscribed option chain.
+
+GreeksEngine keeps the CE and PE rows of chain_index in one set of aligned
+arrays (strike, call/put flag, tick_store slot) next to the underlying's
+(NSE|26000) slot and the expiry's time to maturity. refresh() recomputes, in
+one NumPy pass:
+
+* implied volatility by Newton's method on Black-Scholes vega, kept inside a
+  shrinking [lo, hi] bracket and falling back to bisection whenever a Newton
+  step leaves it or vega vanishes;
+* delta, gamma, theta (per calendar day) and vega (per volatility point).
+
+Only relevant ticks cause work: when the underlying has ticked every row is
+recomputed, otherwise only the rows whose option ticked since the last pass
+(read from tick_store's per-slot sequence numbers). The arrays are rebuilt
+when the subscription manager re-centres chain_index.
+
+nearest_delta() then picks the strike closest to a target delta, e.g. 0.3 for
+an out-of-the-money CE or -0.3 for a PE.
+"""
+
+import math
+import threading
+import time
+from datetime import date, datetime, time as dtime
+from typing import Dict, Iterable, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import config
+
+from chain_index import ChainIndex
+from tick_store import TickStore
+
+RISK_FREE_RATE: float = getattr(config, "RISK_FREE_RATE", 0.065)
+EXPIRY_CLOSE: dtime = dtime(15, 30)  # Options expire at the NSE close
+IV_ITERATIONS: int = getattr(config, "IV_ITERATIONS", 30)
+IV_TOLERANCE: float = 1e-4  # Rupees of price error
+IV_BOUNDS: Tuple[float, float] = (1e-3, 5.0)
+IV_BRACKET: float = 1e-6  # Stop once the volatility bracket is this narrow
+MIN_T: float = 60 / (365 * 86400)  # Time to maturity floor (one minute), in years
+SECONDS_PER_YEAR = 365 * 86400
+_INV_SQRT_2PI = 1 / math.sqrt(2 * math.pi)
+
+
+def norm_pdf(x: np.ndarray) -> np.ndarray:
+    """Standard normal density."""
+    return _INV_SQRT_2PI * np.exp(-0.5 * x * x)
+
+
+def norm_cdf(x: np.ndarray) -> np.ndarray:
+    """Standard normal CDF (Abramowitz & Stegun 26.2.17, |error| < 7.5e-8)."""
+    z = np.abs(x)
+    t = 1.0 / (1.0 + 0.2316419 * z)
+    poly = t * (0.319381530 + t * (-0.356563782 + t * (1.781477937 + t * (-1.821255978 + t * 1.330274429))))
+    upper = norm_pdf(z) * poly
+    return np.where(x >= 0, 1.0 - upper, upper)
+
+
+def bs_price(spot: float, strike: np.ndarray, t: float, rate: float, sigma: np.ndarray,
+             is_call: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Black-Scholes prices with d1 and vega, for arrays of strikes and volatilities.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: (price, d1, vega per unit of sigma).
+    """
+    sqrt_t = math.sqrt(t)
+    vol_t = sigma * sqrt_t
+    d1 = (np.log(spot / strike) + (rate + 0.5 * sigma * sigma) * t) / vol_t
+    d2 = d1 - vol_t
+    disc = strike * math.exp(-rate * t)
+    call = spot * norm_cdf(d1) - disc * norm_cdf(d2)
+    price = np.where(is_call, call, call - spot + disc)  # Put via put-call parity
+    return price, d1, spot * norm_pdf(d1) * sqrt_t
+
+
+def implied_vol(price: np.ndarray, spot: float, strike: np.ndarray, t: float, rate: float,
+                is_call: np.ndarray, iterations: int = IV_ITERATIONS,
+                tolerance: float = IV_TOLERANCE) -> np.ndarray:
+    """Vectorized implied volatility by bracketed Newton-Raphson with bisection fallback.
+
+    Args:
+        price (np.ndarray): Option premiums.
+        spot (float): Underlying price.
+        strike (np.ndarray): Strikes aligned with `price`.
+        t (float): Time to maturity in years.
+        rate (float): Continuously compounded risk-free rate.
+        is_call (np.ndarray): True for calls, False for puts.
+        iterations (int): Maximum iterations.
+        tolerance (float): Price error at which a row counts as solved.
+
+    Returns:
+        np.ndarray: Annualized volatility, NaN where the premium is missing or outside
+        the no-arbitrage bounds. Where vega is tiny (far from the money, close to expiry)
+        any volatility reproduces the premium within `tolerance`, so only the Greeks
+        derived from it are meaningful there.
+    """
+    disc = strike * math.exp(-rate * t)
+    lower = np.where(is_call, np.maximum(spot - disc, 0.0), np.maximum(disc - spot, 0.0))
+    upper = np.where(is_call, spot, disc)
+    with np.errstate(invalid='ignore'):
+        valid = (price > lower) & (price < upper)
+    lo = np.full(len(price), IV_BOUNDS[0])
+    hi = np.full(len(price), IV_BOUNDS[1])
+    # Brenner-Subrahmanyam start, good near the money
+    sigma = np.clip(np.sqrt(2 * math.pi / t) * np.where(valid, price, 0.0) / spot, 0.05, 2.0)
+    active = valid.copy()
+    for _ in range(iterations):
+        if not active.any():
+            break
+        idx = np.flatnonzero(active)
+        s = sigma[idx]
+        model, _, vega = bs_price(spot, strike[idx], t, rate, s, is_call[idx])
+        diff = model - price[idx]
+        # Price rises with sigma, so the sign of diff tightens the bracket
+        high = diff > 0
+        hi[idx] = np.where(high, s, hi[idx])
+        lo[idx] = np.where(high, lo[idx], s)
+        # Deep ITM/OTM premiums barely move with sigma; the bracket width ends those rows
+        done = (np.abs(diff) < tolerance) | (hi[idx] - lo[idx] < IV_BRACKET)
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            step = s - diff / vega
+        bisect = ~((step > lo[idx]) & (step < hi[idx])) | (vega < 1e-8)
+        sigma[idx] = np.where(done, s, np.where(bisect, 0.5 * (lo[idx] + hi[idx]), step))
+        active[idx[done]] = False
+    return np.where(valid, sigma, np.nan)
+
+
+class Greeks(NamedTuple):
+    """Per-row results for one option type, aligned with chain_index rows."""
+    tokens: np.ndarray
+    strikes: np.ndarray
+    ltp: np.ndarray
+    iv: np.ndarray
+    delta: np.ndarray
+    gamma: np.ndarray
+    theta: np.ndarray  # Premium change per calendar day
+    vega: np.ndarray   # Premium change per volatility point (1%)
+
+
+class GreeksEngine:
+    """Batched IV/Greeks for the CE/PE window of a ChainIndex."""
+
+    def __init__(self, chain_index: ChainIndex, store: TickStore, expiry: date,
+                 underlying_token: str = "26000", rate: float = RISK_FREE_RATE,
+                 options: Sequence[str] = ("CE", "PE")) -> None:
+        """
+        Args:
+            chain_index (ChainIndex): Subscribed window (re-centred by the subscription manager).
+            store (TickStore): Live ticks of the options and the underlying.
+            expiry (date): Expiry date of the chain; maturity is taken at the 15:30 close.
+            underlying_token (str): Token of the underlying index (NSE|26000 for NIFTY).
+            rate (float): Risk-free rate.
+            options (Sequence[str]): Option types in the chain.
+        """
+        self.chain_index = chain_index
+        self.store = store
+        self.expiry_ts = datetime.combine(expiry, EXPIRY_CLOSE).timestamp()
+        self.underlying_slot = store.slot(str(underlying_token))
+        self.rate = rate
+        self.options = tuple(options)
+        self.recomputes = 0
+        self.rows_computed = 0
+        self.last_ms = 0.0
+        self._lock = threading.Lock()
+        self._layout: Tuple[np.ndarray, ...] = ()
+        self._build()
+
+    def _build(self) -> None:
+        """Concatenates the chain's CE/PE rows into aligned arrays."""
+        # One read of the published chains, so every array comes from the same generation
+        chains = self.chain_index.chains
+        self._layout = tuple(chains[o] for o in self.options)
+        sizes = [len(c.tokens) for c in self._layout]
+        self._offsets = dict(zip(self.options, np.cumsum([0] + sizes)[:-1]))
+        self._sizes = dict(zip(self.options, sizes))
+        self.tokens = np.concatenate([c.tokens for c in self._layout])
+        self.strikes = np.concatenate([c.strikes for c in self._layout])
+        self.symbols = np.concatenate([c.symbols for c in self._layout])
+        self.slots = np.concatenate([c.slots for c in self._layout]).astype(np.int64)
+        self.is_call = np.concatenate([np.full(n, o == "CE") for o, n in zip(self.options, sizes)])
+        n = len(self.tokens)
+        self.ltp = np.full(n, np.nan)
+        self.iv, self.delta, self.gamma, self.theta, self.vega = (np.full(n, np.nan) for _ in range(5))
+        self._row_seq = np.zeros(n, dtype=np.int64)
+        self._spot_seq = -1
+        self.spot = math.nan
+
+    def time_to_expiry(self, now: Optional[float] = None) -> float:
+        """Years to the expiry close, floored at one minute."""
+        now = time.time() if now is None else now
+        return max((self.expiry_ts - now) / SECONDS_PER_YEAR, MIN_T)
+
+    def refresh(self, now: Optional[float] = None, force: bool = False) -> int:
+        """Recomputes IV and Greeks for the rows whose inputs ticked since the last pass.
+
+        Args:
+            now (Optional[float]): Epoch seconds for time to maturity; now if omitted.
+            force (bool): Recompute every row regardless of ticks.
+
+        Returns:
+            int: Number of rows recomputed (0 if nothing relevant ticked).
+        """
+        with self._lock:
+            chains = self.chain_index.chains
+            if any(chains.get(o) is not c for o, c in zip(self.options, self._layout)):
+                self._build()
+                force = True
+            store = self.store
+            slots = np.append(self.slots, self.underlying_slot)
+            ltp, _, seq = store.snapshot(slots)
+            spot, spot_seq = float(ltp[-1]), int(seq[-1])
+            ltp, seq = ltp[:-1], seq[:-1]
+            if not spot > 0:
+                return 0
+            if force or spot_seq != self._spot_seq:
+                rows = np.arange(len(seq))
+            else:
+                rows = np.flatnonzero(seq != self._row_seq)
+            if len(rows) == 0:
+                return 0
+            start = time.perf_counter()
+            self._compute(rows, ltp[rows], spot, self.time_to_expiry(now))
+            self._row_seq[rows] = seq[rows]
+            self._spot_seq = spot_seq
+            self.spot = spot
+            self.last_ms = (time.perf_counter() - start) * 1000
+            self.recomputes += 1
+            self.rows_computed += len(rows)
+            return len(rows)
+
+    def _compute(self, rows: np.ndarray, price: np.ndarray, spot: float, t: float) -> None:
+        strike, is_call, rate = self.strikes[rows], self.is_call[rows], self.rate
+        iv = implied_vol(price, spot, strike, t, rate, is_call)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            _, d1, vega = bs_price(spot, strike, t, rate, iv, is_call)
+            sqrt_t = math.sqrt(t)
+            d2 = d1 - iv * sqrt_t
+            pdf = norm_pdf(d1)
+            disc = strike * math.exp(-rate * t)
+            carry = np.where(is_call, -rate * disc * norm_cdf(d2), rate * disc * norm_cdf(-d2))
+            self.delta[rows] = np.where(is_call, norm_cdf(d1), norm_cdf(d1) - 1.0)
+            self.gamma[rows] = pdf / (spot * iv * sqrt_t)
+            self.theta[rows] = (-spot * pdf * iv / (2 * sqrt_t) + carry) / 365
+            self.vega[rows] = vega / 100
+        self.ltp[rows] = price
+        self.iv[rows] = iv
+
+    def greeks(self, option: str) -> Greeks:
+        """Returns copies of the latest results for one option type (call refresh() first)."""
+        with self._lock:
+            return self._greeks(option)[0]
+
+    def _greeks(self, option: str) -> Tuple[Greeks, np.ndarray]:
+        """Results and trading symbols of one option type. Must be called with the lock held."""
+        s = slice(self._offsets[option], self._offsets[option] + self._sizes[option])
+        return (Greeks(self.tokens[s].copy(), self.strikes[s].copy(), self.ltp[s].copy(), self.iv[s].copy(),
+                       self.delta[s].copy(), self.gamma[s].copy(), self.theta[s].copy(), self.vega[s].copy()),
+                self.symbols[s])
+
+    def nearest_delta(self, deltas: Iterable[float], option: str, refresh: bool = True) -> np.ndarray:
+        """Vectorized nearest-delta lookup.
+
+        Args:
+            deltas (Iterable[float]): Target deltas (signs are ignored, so 0.3 and -0.3
+                both work for puts).
+            option (str): "CE" or "PE".
+            refresh (bool): Bring the Greeks up to date first.
+
+        Returns:
+            np.ndarray: chain_index row per target, -1 where no strike has a delta yet.
+        """
+        if refresh:
+            self.refresh()
+        return self._nearest(self.greeks(option).delta, deltas)
+
+    @staticmethod
+    def _nearest(delta: np.ndarray, deltas: Iterable[float]) -> np.ndarray:
+        delta = np.abs(delta)
+        targets = np.abs(np.asarray(list(deltas), dtype=np.float64))
+        if len(delta) == 0:
+            return np.full(len(targets), -1, dtype=np.int64)
+        diff = np.abs(delta[None, :] - targets[:, None])
+        diff[np.isnan(diff)] = np.inf
+        rows = diff.argmin(axis=1)
+        rows[np.isinf(diff[np.arange(len(targets)), rows])] = -1
+        return rows
+
+    def select(self, deltas: Sequence[float], options: Iterable[str] = ("CE", "PE")) -> Dict[str, list]:
+        """Delta-based counterpart of ChainIndex.select().
+
+        Returns:
+            Dict[str, list]: Option type -> list of (symbol, strike, ltp, delta, iv) per
+            target delta, with None where no strike has a delta yet.
+        """
+        self.refresh()
+        result = {}
+        for option in options:
+            # Results and symbols under one lock hold, so a rebuild cannot split them
+            with self._lock:
+                g, symbols = self._greeks(option)
+            rows = self._nearest(g.delta, deltas)
+            result[option] = [None if row < 0 else
+                              (symbols[row], float(g.strikes[row]), float(g.ltp[row]),
+                               float(g.delta[row]), float(g.iv[row]))
+                              for row in rows]
+        return result
@@ -0,0 +1,139 @@
+"""
+history_cache.py - Incremental on-disk cache of broker time series bars.
+
+Bars are kept per (exchange, token, interval) as a typed NumPy record array in
+one .npz file, together with the earliest start time already fetched. A history
+query loads the file, asks the broker only for bars from the last stored bar
+onwards (the last bar may still have been forming), merges, persists and
+returns typed arrays, so warm-up on restart and repeated history queries cost a
+file read instead of a full-window round-trip.
+"""
+
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import config
+
+BAR_CACHE_DIR: str = getattr(config, "BAR_CACHE_DIR", os.path.join("cache", "bars"))
+
+# t: bar start as naive local wall-clock epoch seconds (the broker's 'time' field)
+# e: bar start as true epoch seconds ('ssboe'), used as the incremental fetch start
+BAR_DTYPE = np.dtype([('t', 'i8'), ('e', 'i8'), ('o', 'f8'), ('h', 'f8'), ('l', 'f8'),
+                      ('c', 'f8'), ('v', 'i8'), ('oi', 'i8')])
+
+_EMPTY = np.zeros(0, dtype=BAR_DTYPE)
+
+
+def parse_bars(raw: List[dict]) -> np.ndarray:
+    """Converts get_time_price_series output to a time-sorted BAR_DTYPE array, once at ingest.
+
+    Args:
+        raw (List[dict]): Broker records with 'time', 'ssboe', 'into', 'inth', 'intl',
+            'intc', 'intv' and 'intoi' string fields.
+
+    Returns:
+        np.ndarray: Typed bars, oldest first, one row per bar start.
+    """
+    if not raw:
+        return _EMPTY.copy()
+    df = pd.DataFrame(raw)
+    times = pd.to_datetime(df['time'], format='%d-%m-%Y %H:%M:%S', errors='coerce')
+    bars = np.zeros(len(df), dtype=BAR_DTYPE)
+    bars['t'] = times.values.astype('datetime64[s]').astype(np.int64)
+    epoch = pd.to_numeric(df['ssboe'], errors='coerce') if 'ssboe' in df else pd.Series(np.nan, index=df.index)
+    bars['e'] = epoch.fillna(pd.Series(bars['t'], index=df.index)).to_numpy(dtype=np.int64)
+    for field, column in (('o', 'into'), ('h', 'inth'), ('l', 'intl'), ('c', 'intc'), ('v', 'intv'), ('oi', 'intoi')):
+        if column in df:
+            bars[field] = pd.to_numeric(df[column], errors='coerce').fillna(0).to_numpy()
+    bars = bars[times.notna().to_numpy()]
+    bars = bars[np.argsort(bars['t'], kind='stable')]
+    # Keep the last copy of any duplicated bar
+    keep = np.r_[bars['t'][1:] != bars['t'][:-1], True]
+    return bars[keep]
+
+
+def merge_bars(old: np.ndarray, new: np.ndarray) -> np.ndarray:
+    """Appends `new` to `old`, replacing any overlapping bars with the newer copy."""
+    if len(new) == 0:
+        return old
+    return np.concatenate([old[old['t'] < new['t'][0]], new])
+
+
+def to_frame(bars: np.ndarray) -> pd.DataFrame:
+    """Builds a typed DataFrame with the broker's column names from BAR_DTYPE bars."""
+    return pd.DataFrame({
+        'time': bars['t'].astype('datetime64[s]').astype('datetime64[ns]'),
+        'ssboe': bars['e'],
+        'into': bars['o'],
+        'inth': bars['h'],
+        'intl': bars['l'],
+        'intc': bars['c'],
+        'intv': bars['v'],
+        'intoi': bars['oi'],
+    })
+
+
+class BarCache:
+    """Per-(exchange, token, interval) incremental bar store."""
+
+    def __init__(self, fetch: Callable[..., Optional[List[dict]]], root: str = BAR_CACHE_DIR) -> None:
+        """
+        Args:
+            fetch (Callable[..., Optional[List[dict]]]): The broker's get_time_price_series.
+            root (str): Directory for the .npz files.
+        """
+        self.fetch = fetch
+        self.root = root
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _path(self, exchange: str, token: str, interval) -> str:
+        return os.path.join(self.root, f"{exchange}_{token}_{interval}.npz")
+
+    def _lock(self, path: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def _read(self, path: str) -> Tuple[np.ndarray, float]:
+        try:
+            with np.load(path) as f:
+                return f['bars'], float(f['since'])
+        except (OSError, ValueError, KeyError):
+            return _EMPTY.copy(), float('inf')
+
+    def load(self, exchange: str, token: str, interval) -> np.ndarray:
+        """Returns the cached bars without contacting the broker."""
+        return self._read(self._path(exchange, token, interval))[0]
+
+    def _save(self, path: str, bars: np.ndarray, since: float) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, bars=bars, since=since)
+        os.replace(tmp, path)
+
+    def bars(self, exchange: str, token: str, starttime: float, interval) -> np.ndarray:
+        """Returns bars from `starttime` onwards, fetching only what is not cached.
+
+        Args:
+            exchange (str): The exchange code (e.g., "NFO").
+            token (str): The token ID.
+            starttime (float): Window start in epoch seconds.
+            interval: Broker interval in minutes.
+
+        Returns:
+            np.ndarray: BAR_DTYPE bars with 'e' >= starttime, oldest first.
+        """
+        path = self._path(exchange, token, interval)
+        with self._lock(path):
+            cached, since = self._read(path)
+            covered = len(cached) > 0 and since <= starttime
+            fetch_from = float(cached['e'][-1]) if covered else starttime
+            fresh = parse_bars(self.fetch(exchange=exchange, token=token,
+                                          starttime=fetch_from, interval=interval) or [])
+            bars = merge_bars(cached, fresh) if covered else fresh
+            if len(fresh):
+                self._save(path, bars, since if covered else starttime)
+        return bars[bars['e'] >= starttime]
@@ -0,0 +1,129 @@
+"""
+indicators.py - Vectorized slope / trigger-candle scan across the whole strike window.
+
+Instead of calling dt_update and running a pandas pipeline per symbol, the
+IndicatorEngine pulls the last few closed candles of every strike from the
+CandleBuilder into 2-D (token x bar) arrays and evaluates the entry conditions
+for all strikes in one NumPy pass:
+
+* slope_negative - the tangent (least-squares line) through the closes of the
+  SLOPE_BARS candles before the trigger candle slopes down
+  (check_tanget_slope_negative);
+* trigger - the last closed candle closes green (Close > Open) after that
+  falling slope, which makes it the trigger candle whose High a later tick
+  must break (check_buy_condition).
+
+The scan runs once per bar interval, when the first token closes a candle.
+"""
+
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import config
+
+from candles import LOCAL_OFFSET_NS, NS_PER_MIN, CandleBuilder
+
+SLOPE_BARS: int = getattr(config, "SLOPE_BARS", 5)
+
+
+class Signals(NamedTuple):
+    """Per-token scan results, aligned with `tokens`."""
+    tokens: np.ndarray
+    t: np.ndarray               # Trigger (last closed) candle start, local wall-clock ns; 0 if no bars
+    high: np.ndarray
+    low: np.ndarray
+    slope: np.ndarray           # Close slope per bar over the SLOPE_BARS before the trigger candle
+    slope_negative: np.ndarray  # bool
+    trigger: np.ndarray         # bool, the buy-condition mask
+
+
+def slopes(y: np.ndarray) -> np.ndarray:
+    """Least-squares slope of each row of `y` against 0..k-1 (NaN if a row has a NaN)."""
+    k = y.shape[1]
+    x = np.arange(k, dtype=np.float64) - (k - 1) / 2
+    return ((y - y.mean(axis=1, keepdims=True)) @ x) / (x @ x)
+
+
+class IndicatorEngine:
+    """Vectorized candle conditions over many tokens."""
+
+    def __init__(self, candles: CandleBuilder, minutes: int = 5, slope_bars: int = SLOPE_BARS,
+                 executor: Optional[Executor] = None) -> None:
+        """
+        Args:
+            candles (CandleBuilder): Candle source.
+            minutes (int): Candle interval the conditions are evaluated on.
+            slope_bars (int): Candles the slope is fitted over (at least 2).
+            executor (Optional[Executor]): Runs the listeners instead of the engine's own thread.
+        """
+        self.candles = candles
+        self.minutes = minutes
+        self.slope_bars = slope_bars
+        self._listeners: List[Callable[[int], None]] = []
+        self._last_bucket = -1
+        self._lock = threading.Lock()
+        self._pool = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="indicators")
+
+    def scan(self, tokens: Sequence[str], now_ns: Optional[int] = None) -> Signals:
+        """Evaluates the slope and trigger-candle conditions for every token at once.
+
+        Args:
+            tokens (Sequence[str]): Tokens to scan (e.g. chain_index.tokens["CE"]).
+            now_ns (Optional[int]): UTC epoch ns defining which candles are closed; now if omitted.
+
+        Returns:
+            Signals: Masks and trigger-candle values aligned with `tokens`.
+        """
+        t, o, h, l, c = self.candles.matrix(tokens, self.slope_bars + 1, self.minutes, now_ns)
+        slope = slopes(c[:, :-1])
+        with np.errstate(invalid='ignore'):
+            slope_negative = slope < 0
+            trigger = slope_negative & (c[:, -1] > o[:, -1])
+        return Signals(np.asarray(tokens), t[:, -1], h[:, -1], l[:, -1], slope, slope_negative, trigger)
+
+    @staticmethod
+    def breakout(signals: Signals, ltps: np.ndarray) -> np.ndarray:
+        """Returns the mask of trigger tokens whose live LTP is above the trigger candle's High."""
+        with np.errstate(invalid='ignore'):
+            return signals.trigger & (ltps > signals.high)
+
+    def add_listener(self, listener: Callable[[int], None]) -> None:
+        """Registers listener(now_ns), run once per bar interval after candles close."""
+        self._listeners.append(listener)
+
+    def on_candle_close(self, ts_ns: int) -> bool:
+        """Called when a tick closed a candle; runs the listeners once per interval.
+
+        Listeners run on the engine's own thread so the tick consumer is not held up.
+
+        Args:
+            ts_ns (int): UTC epoch ns of the tick that closed the candle.
+
+        Returns:
+            bool: True if this close started a new interval and the listeners were scheduled.
+        """
+        bucket = (ts_ns + LOCAL_OFFSET_NS) // (self.minutes * NS_PER_MIN)
+        with self._lock:
+            if bucket <= self._last_bucket:
+                return False
+            self._last_bucket = bucket
+        for listener in self._listeners:
+            self._pool.submit(self._run, listener, ts_ns)
+        return True
+
+    def shutdown(self) -> None:
+        """Stops the listener thread after running the queued scans."""
+        self._pool.shutdown(wait=True)
+
+    @staticmethod
+    def _run(listener: Callable[[int], None], now_ns: int) -> None:
+        try:
+            start = time.perf_counter()
+            listener(now_ns)
+            print(f"Candle scan {getattr(listener, '__name__', listener)} took "
+                  f"{(time.perf_counter() - start) * 1000:.1f} ms")
+        except Exception as e:
+            print(f"Error in candle scan: {e}")
@@ -4,22 +4,48 @@ market_data.py - Fetches and processes market data.
 
 import pandas as pd
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from api_client import api_client
-from glb import feedJson  # Importing feedJson directly
+from glb import (feedJson, tick_store, candle_builder, indicator_engine, positions, trigger_df,  # Importing feedJson directly
+                 processed_candles, order_processing_lock, tick_dispatcher, position_fills)
+from chain_index import ChainIndex
+from greeks import GreeksEngine
+from symbol_master import load_master
+from history_cache import BarCache, to_frame
+from subscriptions import SubscriptionManager
+from strategy import Strategy
+from trigger_handler import trigger_b, trigger_s
 
-# Load market data
-symbolDf = pd.read_csv("https://api.shoonya.com/NFO_symbols.txt.zip")
-symbolDf["Expiry"] = pd.to_datetime(symbolDf["Expiry"]).apply(lambda x: x.date())
-ocdf = symbolDf[symbolDf.Symbol == "NIFTY"].sort_values(by="Expiry")
-latest_expiry = ocdf.head(1)["Expiry"].values[0]
+# Load market data from the daily symbol master cache (downloads at most once per trading day)
+symbol_master = load_master()
+nifty_expiries = symbol_master.expiries("NIFTY")
+if not nifty_expiries:
+    raise RuntimeError(f"No unexpired NIFTY expiry in the symbol master cache {symbol_master.path}; "
+                       "it is out of date and a fresh download is needed")
+latest_expiry = nifty_expiries[0]
+ocdf = symbol_master.load_slice("NIFTY", latest_expiry)
 
 # Extract CE/PE information
-ce_info = ocdf[(ocdf["Expiry"] == latest_expiry) & (ocdf["OptionType"] == "CE")]
-pe_info = ocdf[(ocdf["Expiry"] == latest_expiry) & (ocdf["OptionType"] == "PE")]
+ce_info = ocdf[ocdf["OptionType"] == "CE"]
+pe_info = ocdf[ocdf["OptionType"] == "PE"]
+
+# Incremental on-disk cache in front of get_time_price_series
+bar_cache = BarCache(api_client.rest.get_time_price_series)
+
+# Aligned token/strike/symbol arrays over the live tick store
+chain_index = ChainIndex({"CE": ce_info, "PE": pe_info}, tick_store)
+
+# Batched IV/Greeks over chain_index against NIFTY (NSE|26000), recomputed only on relevant ticks
+greeks = GreeksEngine(chain_index, tick_store, latest_expiry, "26000")
+
+# Seed the token resolver from the chain, so dt_update and get_ltp skip searchscrip
+api_client.tokens.seed("NFO", dict(zip(ocdf["TradingSymbol"], ocdf["Token"].astype(str))))
 
 def get_ce_pe_values(premium, option):
     """Finds the closest CE/PE token based on the given premium.
 
+    Uses chain_index for a single vectorized argmin over the live LTPs.
+
     Args:
         premium (float): The target premium value.
         option (str): "CE" for Call, "PE" for Put.
@@ -27,36 +53,78 @@ def get_ce_pe_values(premium, option):
     Returns:
         str: The closest matching symbol name, or None if not found.
     """
-    global pe_info, ce_info, feedJson
-    info = ce_info if option == "CE" else pe_info if option == "PE" else None
-    if info is None:
+    if option not in ("CE", "PE"):
         print("Invalid option type provided")
         return None
 
-    target_ltp = premium
-    closest_token = None
-    closest_diff = float("inf")
-    
     print(f"Searching for {option} strike with premium close to {premium}")
-    
-    for token in info["Token"]:
-        str_token = str(token)
-        if str_token in feedJson:
-            current_diff = abs(feedJson[str_token]["ltp"] - target_ltp)
-            if current_diff < closest_diff:
-                closest_diff = current_diff
-                closest_token = str_token
-                
-    if closest_token is not None:
-        symbol_name = info[info["Token"] == int(closest_token)]["TradingSymbol"].values[0]
-        strike_price = info[info["Token"] == int(closest_token)]["StrikePrice"].values[0]
-        ltp = feedJson[closest_token]["ltp"]
+
+    selected = chain_index.select([premium], (option,))[option][0]
+    if selected is not None:
+        symbol_name, strike_price, ltp = selected
         print(f"Selected {option} strike: {symbol_name}, Strike Price: {strike_price}, LTP: {ltp}")
         return symbol_name
     else:
         print(f"No suitable {option} strike found")
         return None
 
+
+def get_ce_pe_batch(premiums, options=("CE", "PE")):
+    """Selects the closest strikes for several premiums and option types in one pass.
+
+    Args:
+        premiums (Sequence[float]): Target premium values.
+        options (Iterable[str]): Option types to search, "CE" and/or "PE".
+
+    Returns:
+        Dict[str, list]: Option type -> list of matching symbol names (None where not found),
+        aligned with `premiums`.
+    """
+    selected = chain_index.select(premiums, options)
+    return {option: [None if hit is None else hit[0] for hit in hits] for option, hits in selected.items()}
+
+
+def get_ce_pe_by_delta(delta, option):
+    """Finds the CE/PE strike whose delta is closest to the target.
+
+    The delta-based counterpart of get_ce_pe_values: greeks brings IV and delta up
+    to date for the rows that ticked and does one vectorized argmin.
+
+    Args:
+        delta (float): Target delta, e.g. 0.3 (the sign is ignored for puts).
+        option (str): "CE" for Call, "PE" for Put.
+
+    Returns:
+        str: The closest matching symbol name, or None if no strike has a delta yet.
+    """
+    selected = greeks.select([delta], (option,))[option][0]
+    if selected is None:
+        print(f"No {option} strike with a delta yet")
+        return None
+    symbol_name, strike_price, ltp, strike_delta, iv = selected
+    print(f"Selected {option} strike: {symbol_name}, Strike Price: {strike_price}, LTP: {ltp}, "
+          f"Delta: {strike_delta:.3f}, IV: {iv:.1%}")
+    return symbol_name
+
+def get_bars(exchange, token, days, interval):
+    """Returns typed history bars from the on-disk bar cache.
+
+    Only bars newer than the last cached one are requested from the broker.
+
+    Args:
+        exchange (str): The exchange code (e.g., "NSE").
+        token (str): The token ID for the stock.
+        days (int): Number of past days to retrieve.
+        interval (str): Broker interval in minutes (e.g., 1, 5).
+
+    Returns:
+        np.ndarray: history_cache.BAR_DTYPE records, oldest first.
+    """
+    now = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    prev_day = now - timedelta(days=days)
+    return bar_cache.bars(exchange, str(token), prev_day.timestamp(), interval)
+
+
 def get_time_series(exchange, token, days, interval):
     """Fetches historical price data for a stock.
 
@@ -67,24 +135,85 @@ def get_time_series(exchange, token, days, interval):
         interval (str): Time interval (e.g., "5minute", "15minute").
 
     Returns:
-        pd.DataFrame: DataFrame containing historical price data.
+        pd.DataFrame: DataFrame containing historical price data, oldest first, with the
+        broker's column names already typed ('time' as datetime, prices as float).
     """
-    now = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    prev_day = now - timedelta(days=days)
-    prev_day_timestamp = prev_day.timestamp()
-    ret = api_client.api.get_time_price_series(
-        exchange=exchange,
-        token=token,
-        starttime=prev_day_timestamp,
-        interval=interval
-    )
-    if ret:
-        return pd.DataFrame(ret)
+    bars = get_bars(exchange, token, days, interval)
+    if len(bars):
+        return to_frame(bars)
     else:
         print("No Data for the given exchange, token, days and interval")
         return pd.DataFrame()
 
 
+def prepare_ohlc(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts get_time_series output into typed, time-sorted OHLC bars.
+
+    Args:
+        df (pd.DataFrame): Time series (raw broker strings or already typed) with 'time', 'into', 'inth', 'intl', 'intc' columns.
+
+    Returns:
+        pd.DataFrame: Columns Datetime, Open, High, Low, Close sorted by Datetime.
+    """
+    df = df[['time', 'into', 'inth', 'intl', 'intc']].rename(
+        columns={'intc': 'Close', 'intl': 'Low', 'inth': 'High', 'into': 'Open', 'time': 'Datetime'})
+    df['Datetime'] = pd.to_datetime(df['Datetime'], format='%d-%m-%Y %H:%M:%S', errors='coerce')
+    for col in ('Open', 'High', 'Low', 'Close'):
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df.dropna().sort_values(by='Datetime', ascending=True).reset_index(drop=True)
+
+
+def seed_candles(tokens, days: int = 4, workers: int = 8) -> None:
+    """
+    Seeds candle_builder with 1-minute history for each token, once at startup.
+
+    The history requests run concurrently on up to `workers` threads. After
+    seeding, websocket ticks keep the candles current and dt_update no longer
+    needs the broker. Tokens without history still get tick-built candles.
+
+    Args:
+        tokens (Iterable[str]): NFO tokens to seed.
+        days (int): Number of past days of 1-minute bars to load.
+        workers (int): Concurrent history requests.
+    """
+    def seed(token):
+        try:
+            df = get_time_series('NFO', token, days, 1)
+            if not df.empty:
+                candle_builder.seed(token, prepare_ohlc(df))
+                return
+        except Exception as e:
+            print(f"Error seeding candles for {token}: {e}")
+        candle_builder.track([token])
+
+    tokens = [str(token) for token in tokens]
+    if not tokens:
+        return
+    with ThreadPoolExecutor(max_workers=min(workers, len(tokens))) as pool:
+        list(pool.map(seed, tokens))
+
+
+# The trigger-candle strategy over glb's stores: scan_triggers runs once per candle
+# (registered from main), triggers are armed for breakout entry, entries for
+# target/SL exit. startup re-arms restored rows through arm_trigger / arm_position.
+strategy = Strategy(chain_index, indicator_engine, tick_dispatcher, positions, trigger_df, position_fills,
+                    on_buy=trigger_b, on_exit=trigger_s, processed_candles=processed_candles,
+                    lock=order_processing_lock)
+scan_triggers = strategy.scan
+arm_trigger = strategy.arm_trigger
+arm_position = strategy.arm_position
+
+
+# Keeps the subscribed CE/PE window and chain_index centered on NIFTY (NSE|26000);
+# started from main with subscriptions.start(nifty_ltp). Strikes with open positions
+# or pending triggers stay subscribed, and newly added strikes get their candles seeded.
+subscriptions = SubscriptionManager(api_client.api, {"CE": ce_info, "PE": pe_info}, chain_index, tick_store,
+                                    pinned=lambda: ({p.token for p in positions.in_state('open', 'exiting')}
+                                                    | {t.token for t in trigger_df.in_state('pending')}),
+                                    on_added=seed_candles)
+
+
 # Assume that 'api' and 'get_time_series' are available in the scope,
 # either via a direct import or defined earlier in your code.
 
@@ -92,9 +221,11 @@ def dt_update(stock: str) -> pd.DataFrame:
     """
     Updates and returns a 5-minute resampled DataFrame for the given stock.
 
-    This function performs the following steps:
-      1. Uses `api.searchscrip` on the 'NFO' exchange to search for the given stock,
-         and retrieves the token from the first result.
+    If the stock's token is tracked by candle_builder (seeded via seed_candles and
+    fed by websocket ticks), the in-memory 5-minute frame is returned directly.
+    Otherwise this function falls back to the broker:
+      1. Resolves the stock's 'NFO' token through api_client.resolve_token (cached,
+         `searchscrip` only on a miss).
       2. Calls `get_time_series('NFO', token, 4, 1)` to fetch historical time series data.
       3. If the resulting DataFrame is not empty:
          - Selects the columns ['time', 'into', 'inth', 'intl', 'intc'].
@@ -124,18 +255,17 @@ def dt_update(stock: str) -> pd.DataFrame:
         pd.DataFrame: The processed 5-minute resampled DataFrame, or the original (possibly empty) DataFrame.
     """
     global df
-    ret = api.searchscrip(exchange='NFO', searchtext=stock)
-    token = ret['values'][0]['token']
+    token = api_client.resolve_token(stock, 'NFO')
+    if token in candle_builder:
+        # Streaming candles: no REST round-trip and no resample
+        return candle_builder.frame(token, 5)
+
     df = get_time_series('NFO', token, 4, 1)
     
     if not df.empty:
-        df = df[['time', 'into', 'inth', 'intl', 'intc']]
-        df.rename(columns={'intc': 'Close', 'intl': 'Low', 'inth': 'High', 'into': 'Open', 'time': 'Datetime'}, inplace=True)
-        df['Datetime'] = pd.to_datetime(df['Datetime'], errors='coerce')
-        df.dropna(inplace=True)
-        df = df.sort_values(by='Datetime', ascending=True).reset_index(drop=True)
+        df = prepare_ohlc(df)
         df.set_index('Datetime', inplace=True)
-        df_5min = df.resample('5T').agg({
+        df_5min = df.resample('5min').agg({
             'Open': 'first',
             'High': 'max',
             'Low': 'min',
@@ -0,0 +1,296 @@
+"""
+metrics.py - Lightweight hot-path latency histograms, counters and a Prometheus endpoint.
+
+Histograms use HDR-style log-linear buckets (8 sub-buckets per power of two,
+about 12% relative error) over integer nanoseconds. Every metric keeps one
+shard of counts per thread, so recording is a thread-local lookup and a list
+increment with no lock; shards are only summed when /metrics is scraped.
+
+Stage names used by the tick path (all in nanoseconds):
+    feed_lag          exchange time ('ft') -> socket receipt
+    tick_handler      socket receipt -> event_handler_feed_update done
+    strategy_dispatch socket receipt -> a token's strategy handlers done
+    decision          socket receipt -> strategy decision (entry/exit fired)
+    order             order request -> broker response (queueing and retries included)
+    order_call        one broker place_order attempt
+    rest              one broker REST call, labelled by endpoint (rest_scheduler.py)
+    webhook_user      event submit -> one user's webhook done
+    webhook_event     event submit -> every user's webhook done
+    lock_wait         time spent waiting to acquire an instrumented lock
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+import config
+
+METRICS_HOST: str = getattr(config, "METRICS_HOST", "127.0.0.1")
+METRICS_PORT: int = getattr(config, "METRICS_PORT", 9108)
+PREFIX = "pha_"
+SUB_BITS = 3
+SUB = 1 << SUB_BITS
+NUM_BUCKETS = (64 - SUB_BITS) * SUB
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: object) -> str:
+    """Escapes a label value for the text exposition format (backslash, quote, newline)."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def bucket_index(value: int) -> int:
+    """Maps a non-negative integer to its log-linear bucket."""
+    if value < SUB:
+        return value if value > 0 else 0
+    shift = value.bit_length() - SUB_BITS - 1
+    return shift * SUB + (value >> shift)
+
+
+def bucket_upper(index: int) -> int:
+    """Returns the largest value that falls into bucket `index`."""
+    if index < 2 * SUB:
+        return index
+    shift = index // SUB - 1
+    top = index - shift * SUB
+    return ((top + 1) << shift) - 1
+
+
+class _Sharded:
+    """Base for metrics that keep one list of counts per writing thread."""
+
+    size = 1
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+        self._shards: List[List[int]] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> List[int]:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = [0] * self.size
+            self._local.shard = shard
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _merged(self) -> List[int]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        return [sum(col) for col in zip(*shards)] if shards else [0] * self.size
+
+
+class Counter(_Sharded):
+    """Monotonic counter."""
+
+    size = 1
+
+    def inc(self, n: int = 1) -> None:
+        self._shard()[0] += n
+
+    @property
+    def value(self) -> int:
+        return self._merged()[0]
+
+
+class Histogram(_Sharded):
+    """Log-linear latency histogram over integer nanoseconds.
+
+    Shard layout: [bucket counts..., total count, sum, max].
+    """
+
+    size = NUM_BUCKETS + 3
+
+    def record(self, value_ns: int) -> None:
+        if value_ns < 0:
+            value_ns = 0
+        shard = self._shard()
+        shard[bucket_index(value_ns)] += 1
+        shard[NUM_BUCKETS] += 1
+        shard[NUM_BUCKETS + 1] += value_ns
+        if value_ns > shard[NUM_BUCKETS + 2]:
+            shard[NUM_BUCKETS + 2] = value_ns
+
+    def summary(self) -> Dict[str, float]:
+        """Returns count, sum, max and the QUANTILES (bucket upper bounds), in ns."""
+        with self._shards_lock:
+            shards = list(self._shards)
+        counts = [sum(s[i] for s in shards) for i in range(NUM_BUCKETS)]
+        total = sum(s[NUM_BUCKETS] for s in shards)
+        result = {'count': total, 'sum': sum(s[NUM_BUCKETS + 1] for s in shards),
+                  'max': max((s[NUM_BUCKETS + 2] for s in shards), default=0)}
+        targets = [(q, q * total) for q in QUANTILES]
+        seen = 0
+        for index, c in enumerate(counts):
+            if not c:
+                continue
+            seen += c
+            while targets and seen >= targets[0][1]:
+                result[targets[0][0]] = min(bucket_upper(index), result['max'])
+                targets.pop(0)
+        for q, _ in targets:
+            result[q] = result['max']
+        return result
+
+
+class Registry:
+    """Named, labelled metrics and their Prometheus text rendering."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], Counter] = {}
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._help: Dict[str, str] = {}
+        self._callbacks: Dict[str, Tuple[str, Callable[[], float]]] = {}
+
+    def counter(self, name: str, help: str = "", **labels: str) -> Counter:
+        """Returns (creating once) the counter for a name and label set."""
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._counters.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._counters.setdefault(key, Counter())
+                self._help.setdefault(name, help)
+        return metric
+
+    def histogram(self, name: str, help: str = "", **labels: str) -> Histogram:
+        """Returns (creating once) the histogram for a name and label set."""
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._histograms.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._histograms.setdefault(key, Histogram())
+                self._help.setdefault(name, help)
+        return metric
+
+    def expose(self, name: str, fn: Callable[[], float], kind: str = "gauge", help: str = "") -> None:
+        """Exposes a value read at scrape time, e.g. a component's own int counter.
+
+        Args:
+            name (str): Metric name without the prefix.
+            fn (Callable[[], float]): Returns the current value.
+            kind (str): Prometheus type, "gauge" or "counter".
+            help (str): HELP text.
+        """
+        with self._lock:
+            self._callbacks[name] = (kind, fn)
+            self._help[name] = help
+
+    @staticmethod
+    def _labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+        items = list(labels) + ([extra] if extra else [])
+        if not items:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+    def render(self) -> str:
+        """Renders all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+            callbacks = sorted(self._callbacks.items())
+        lines: List[str] = []
+        typed = set()
+        for name, (kind, fn) in callbacks:
+            try:
+                value = fn()
+            except Exception:
+                continue
+            full = f"{PREFIX}{name}"
+            lines += [f"# HELP {full} {self._help.get(name, '')}", f"# TYPE {full} {kind}", f"{full} {value}"]
+        for (name, labels), metric in counters:
+            full = f"{PREFIX}{name}"
+            if full not in typed:
+                lines += [f"# HELP {full} {self._help.get(name, '')}", f"# TYPE {full} counter"]
+                typed.add(full)
+            lines.append(f"{full}{self._labels(labels)} {metric.value}")
+        for (name, labels), metric in histograms:
+            full = f"{PREFIX}{name}_seconds"
+            if full not in typed:
+                lines += [f"# HELP {full} {self._help.get(name, '')}", f"# TYPE {full} summary"]
+                typed.add(full)
+            s = metric.summary()
+            for q in QUANTILES:
+                lines.append(f"{full}{self._labels(labels, ('quantile', str(q)))} {s[q] / 1e9:.9f}")
+            lines.append(f"{full}_sum{self._labels(labels)} {s['sum'] / 1e9:.9f}")
+            lines.append(f"{full}_count{self._labels(labels)} {s['count']}")
+            lines.append(f"{PREFIX}{name}_max_seconds{self._labels(labels)} {s['max'] / 1e9:.9f}")
+        return "\n".join(lines) + "\n"
+
+
+# Shared registry
+registry = Registry()
+
+
+def observe(stage: str, value_ns: int) -> None:
+    """Records one latency sample for a stage (see the module docstring)."""
+    registry.histogram(stage, f"Latency of stage {stage}").record(value_ns)
+
+
+def inc(name: str, n: int = 1, **labels: str) -> None:
+    """Increments a counter."""
+    registry.counter(name, "", **labels).inc(n)
+
+
+class InstrumentedLock:
+    """threading.Lock wrapper that records how long acquire() waited."""
+
+    def __init__(self, name: str) -> None:
+        self._lock = threading.Lock()
+        self._wait = registry.histogram('lock_wait', "Time spent waiting for a lock", lock=name)
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        if self._lock.acquire(False):
+            self._wait.record(0)
+            return True
+        if not blocking:
+            return False
+        start = time.perf_counter_ns()
+        acquired = self._lock.acquire(True, timeout)
+        self._wait.record(time.perf_counter_ns() - start)
+        return acquired
+
+    def release(self) -> None:
+        self._lock.release()
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    def __enter__(self) -> bool:
+        return self.acquire()
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT) -> ThreadingHTTPServer:
+    """Serves /metrics in Prometheus text format from a daemon thread (idempotent)."""
+    global _server
+    if _server is None:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"Metrics available at http://{host}:{port}/metrics")
+    return _server
@@ -0,0 +1,341 @@
+"""
+order.py - Asynchronous order gateway with exit priority and idempotency keys.
+
+place_buy_order and place_target_or_sl_order no longer call the broker on the
+strategy thread. They hand an OrderRequest to the shared OrderGateway and
+return a Future at once, so callers release their locks before waiting:
+
+* a small pool of worker threads takes requests from one priority queue, so
+  several broker calls are in flight and a slow response delays only its own
+  order;
+* exits are always taken before entries;
+* each order carries an idempotency key built from (token, candle, side).
+  Submitting a key that is queued, in flight or already filled returns the
+  existing Future instead of a second order. The key is also sent as the order
+  remark, so a retry after a lost response first checks the order book: an
+  open or complete order counts as placed, a rejected one fails with its reason;
+* failed calls (exception or no response) are retried a bounded number of
+  times with exponential backoff; a broker rejection is not retried. ShoonyaApiPy
+  returns None for a rejected order too, so a None response is first looked up
+  by its remark, and an order the broker lists as rejected fails with its reason.
+  An order the broker rejects or cancels after accepting it (reported on the
+  order-update stream) releases its key, so the strategy can send it again.
+
+Keys are remembered in a bounded LRU table instead of an ever-growing set.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+import config
+from candles import LOCAL_OFFSET_NS, NS_PER_MIN
+from metrics import inc, observe, registry
+from order_book import CANCELLED, COMPLETE, OPEN, REJECTED, STATUS_MAP
+
+ORDER_WORKERS: int = getattr(config, "ORDER_WORKERS", 4)
+ORDER_RETRIES: int = getattr(config, "ORDER_RETRIES", 3)
+ORDER_BACKOFF: float = getattr(config, "ORDER_BACKOFF", 0.2)  # Seconds, doubled per retry
+ORDER_KEYS: int = getattr(config, "ORDER_KEYS", 4096)  # Idempotency keys remembered
+ORDER_PRODUCT: str = getattr(config, "ORDER_PRODUCT", "I")
+
+EXIT, ENTRY = 0, 1  # Queue priorities; lower is taken first
+
+
+def order_key(token: str, candle: Any, side: str) -> str:
+    """Idempotency key for one order of a token on a candle.
+
+    Args:
+        token (str): Broker token (or trading symbol if the token is not at hand).
+        candle (Any): Trigger candle start, e.g. TriggerCandle_Time or its epoch ns.
+        side (str): 'B' or 'S'.
+
+    Returns:
+        str: Key, also usable as the broker's order remark.
+    """
+    if hasattr(candle, 'value'):  # pd.Timestamp
+        candle = candle.value
+    return f"{token}:{candle}:{side}"
+
+
+def current_candle(minutes: int = 5) -> int:
+    """Start of the current `minutes` candle in local wall-clock epoch ns (the candles.py clock)."""
+    t = time.time_ns() + LOCAL_OFFSET_NS
+    return t - t % (minutes * NS_PER_MIN)
+
+
+class OrderRequest:
+    """One order waiting for, or being sent by, the gateway."""
+
+    __slots__ = ('key', 'priority', 'params', 'future', 'attempts', 'submitted_ns', 'recheck')
+
+    def __init__(self, key: str, priority: int, params: Dict[str, Any], recheck: bool = False) -> None:
+        self.key = key
+        self.priority = priority
+        self.params = params
+        self.recheck = recheck
+        self.future: Future = Future()
+        self.attempts = 0
+        self.submitted_ns = time.perf_counter_ns()
+
+
+class OrderGateway:
+    """Sends broker orders from worker threads, exits first, once per idempotency key."""
+
+    def __init__(self, api: Any, workers: int = ORDER_WORKERS, retries: int = ORDER_RETRIES,
+                 backoff: float = ORDER_BACKOFF, max_keys: int = ORDER_KEYS, book: Any = None) -> None:
+        """
+        Args:
+            api (Any): Broker API with place_order (and get_order_book for retry checks).
+            workers (int): Orders in flight at once.
+            retries (int): Retries after a failed call, per order.
+            backoff (float): Delay before the first retry; doubled on each further one.
+            max_keys (int): Idempotency keys remembered; the oldest finished ones are dropped.
+            book (Any): OrderBook fed by the order-update stream, checked for a key before
+                the broker's order book. The gateway also listens to it and forgets the key of
+                an order the broker rejects or cancels after accepting it, so it can be sent again.
+        """
+        self.api = api
+        self.book = book
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.max_keys = max_keys
+        self._cond = threading.Condition()
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._keys: "OrderedDict[str, OrderRequest]" = OrderedDict()
+        self._threads: List[threading.Thread] = []
+        self._running = False
+        if book is not None:
+            book.add_listener(self._on_order)
+
+    def depth(self) -> int:
+        """Orders waiting for a worker."""
+        return len(self._heap)
+
+    def start(self) -> None:
+        """Starts the worker threads if they are not already running."""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._threads = [threading.Thread(target=self._run, name=f"order-{i}", daemon=True)
+                             for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stops the workers once the queue is empty."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, key: str, is_exit: bool, recheck: bool = False, **params: Any) -> Future:
+        """Queues an order unless its key was already submitted.
+
+        Args:
+            key (str): Idempotency key, see order_key().
+            is_exit (bool): True for exits, which are sent before any waiting entry.
+            recheck (bool): Look the key up in the order books before the first attempt too,
+                for a key an earlier run may have sent (e.g. an exit resumed after a restart).
+            **params: Arguments for api.place_order (the remark defaults to the key).
+
+        Returns:
+            Future: Resolves to the broker response (with 'norenordno'), or raises
+            RuntimeError if the order was rejected or every attempt failed.
+        """
+        self.start()
+        params.setdefault('remarks', key)
+        with self._cond:
+            req = self._keys.get(key)
+            if req is not None and not (req.future.done() and req.future.exception() is not None):
+                self._keys.move_to_end(key)
+                inc('orders_deduplicated_total')
+                return req.future
+            req = OrderRequest(key, EXIT if is_exit else ENTRY, params, recheck)
+            self._keys[key] = req
+            self._evict()
+            self._push(req)
+        return req.future
+
+    def _on_order(self, order: Any, event: str) -> None:
+        """Order-book listener: a rejected or cancelled order no longer holds its key."""
+        if event not in (REJECTED, CANCELLED) or not order.remarks:
+            return
+        with self._cond:
+            self._keys.pop(order.remarks, None)
+
+    def _evict(self) -> None:
+        """Drops the oldest finished keys above max_keys. Must be called with the lock held."""
+        if len(self._keys) <= self.max_keys:
+            return
+        for key in [k for k, r in self._keys.items() if r.future.done()][:len(self._keys) - self.max_keys]:
+            del self._keys[key]
+
+    def _push(self, req: OrderRequest) -> None:
+        heapq.heappush(self._heap, (req.priority, next(self._seq), req))
+        self._cond.notify()
+
+    def _requeue(self, req: OrderRequest) -> None:
+        with self._cond:
+            self._push(req)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap and self._running:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                _, _, req = heapq.heappop(self._heap)
+            self._send(req)
+
+    def _lookup(self, key: str) -> Optional[dict]:
+        """Looks up the order carrying `key` as its remark, streamed order book first.
+
+        Returns:
+            Optional[dict]: A 'stat': 'Ok' response if the order is open or complete, a
+            'stat': 'Not_Ok' one with the reject reason as 'emsg' if it was rejected, or
+            None if the broker has no such order (or only a cancelled one).
+        """
+        if self.book is not None:
+            order = self.book.by_remarks(key)
+            if order is not None and order.state in (OPEN, COMPLETE):
+                return {'stat': 'Ok', 'norenordno': order.order_id, 'remarks': key}
+            if order is not None and order.state == REJECTED:
+                return {'stat': 'Not_Ok', 'norenordno': order.order_id, 'emsg': order.reject_reason or 'rejected'}
+        rejected = None
+        for entry in self.api.get_order_book() or []:
+            if entry.get('remarks') != key:
+                continue
+            state = STATUS_MAP.get(str(entry.get('status', '')).upper())
+            if state in (OPEN, COMPLETE):
+                return entry
+            if state == REJECTED:
+                # A key sent again after a rejection can have a live order besides the rejected one
+                rejected = {'stat': 'Not_Ok', 'norenordno': entry.get('norenordno'),
+                            'emsg': entry.get('rejreason') or 'rejected'}
+        return rejected
+
+    def _send(self, req: OrderRequest) -> None:
+        req.attempts += 1
+        ret, error = None, None
+        start = time.perf_counter_ns()
+        try:
+            # A retry may follow a call whose response was lost; never place the key twice
+            if req.attempts > 1 or req.recheck:
+                ret = self._lookup(req.key)
+            if ret is None:
+                ret = self.api.place_order(**req.params)
+        except Exception as e:
+            error = e
+        observe('order_call', time.perf_counter_ns() - start)
+        if ret is None and error is None:
+            # No response is also how ShoonyaApiPy reports a rejection; do not retry those
+            try:
+                ret = self._lookup(req.key)
+            except Exception as e:
+                print(f"Order {req.key}: could not check the order book: {e}")
+        if ret is not None and ret.get('stat', 'Ok') != 'Ok':
+            inc('order_failures_total', reason='rejected')
+            req.future.set_exception(RuntimeError(f"Order {req.key} rejected: {ret.get('emsg', ret)}"))
+            return
+        if ret is None:
+            if req.attempts <= self.retries:
+                inc('order_retries_total')
+                delay = self.backoff * 2 ** (req.attempts - 1)
+                print(f"Order {req.key} attempt {req.attempts} failed ({error}), retrying in {delay:.2f}s")
+                timer = threading.Timer(delay, self._requeue, (req,))
+                timer.daemon = True
+                timer.start()
+                return
+            inc('order_failures_total', reason='error')
+            req.future.set_exception(RuntimeError(f"Order {req.key} failed after {req.attempts} attempts: {error}"))
+            return
+        observe('order', time.perf_counter_ns() - req.submitted_ns)
+        req.future.set_result(ret)
+
+
+_gateway: Optional[OrderGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def gateway() -> OrderGateway:
+    """Returns the shared gateway on api_client.rest, created on first use."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            from api_client import api_client
+            from glb import order_book
+            api_client.login()
+            _gateway = OrderGateway(api_client.rest, book=order_book)
+            registry.expose('order_queue_depth', _gateway.depth, 'gauge', "Orders waiting for a gateway worker")
+        return _gateway
+
+
+def _market_order(side: str, tradingsymbol: str, qty: int, key: str, is_exit: bool,
+                  exchange: str, via: Optional[OrderGateway], recheck: bool = False) -> Future:
+    via = gateway() if via is None else via
+    return via.submit(key, is_exit, recheck, buy_or_sell=side, product_type=ORDER_PRODUCT, exchange=exchange,
+                      tradingsymbol=tradingsymbol, quantity=qty, discloseqty=0, price_type='MKT',
+                      price=0, trigger_price=None, retention='DAY')
+
+
+def place_buy_order(tradingsymbol: str, qty: int, token: Optional[str] = None, candle: Any = None,
+                    exchange: str = "NFO", via: Optional[OrderGateway] = None) -> Future:
+    """Queues a market buy (entry) without waiting for the broker.
+
+    Args:
+        tradingsymbol (str): Option to buy.
+        qty (int): Quantity.
+        token (Optional[str]): Broker token, for the idempotency key (the symbol if omitted).
+        candle (Any): Trigger candle the entry belongs to (the current 5-minute candle if omitted).
+        exchange (str): Exchange of the symbol.
+        via (Optional[OrderGateway]): Gateway to queue on; the shared gateway() if omitted.
+
+    Returns:
+        Future: Broker response; wait on it after releasing any strategy lock.
+    """
+    candle = current_candle() if candle is None else candle
+    key = order_key(token or tradingsymbol, candle, 'B')
+    return _market_order('B', tradingsymbol, qty, key, False, exchange, via)
+
+
+def place_target_or_sl_order(tradingsymbol: str, qty: int, token: Optional[str] = None, candle: Any = None,
+                             exchange: str = "NFO", via: Optional[OrderGateway] = None,
+                             recheck: bool = False) -> Future:
+    """Queues a market sell (target or stop-loss exit), ahead of every waiting entry.
+
+    Args:
+        tradingsymbol (str): Option to sell.
+        qty (int): Quantity.
+        token (Optional[str]): Broker token, for the idempotency key (the symbol if omitted).
+        candle (Any): Trigger candle of the entry being exited (the current 5-minute candle if omitted).
+        exchange (str): Exchange of the symbol.
+        via (Optional[OrderGateway]): Gateway to queue on; the shared gateway() if omitted.
+        recheck (bool): Check the order books for the key before placing, see OrderGateway.submit.
+
+    Returns:
+        Future: Broker response; wait on it after releasing any strategy lock.
+    """
+    candle = current_candle() if candle is None else candle
+    key = order_key(token or tradingsymbol, candle, 'S')
+    return _market_order('S', tradingsymbol, qty, key, True, exchange, via, recheck)
+
+
+def on_placed(future: Future, callback: Callable[[dict], None]) -> None:
+    """Calls callback(response) on the worker thread once the order is accepted; logs failures."""
+    def done(f: Future) -> None:
+        if f.exception() is not None:
+            print(f"Order failed: {f.exception()}")
+        else:
+            callback(f.result())
+    future.add_done_callback(done)
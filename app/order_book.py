@@ -0,0 +1,322 @@
+"""
+order_book.py - In-memory order and trade book built from the order-update stream.
+
+The websocket's order updates ('t': 'om') are parsed into Order records
+indexed by broker order id (norenordno) and by token, so fill status, average
+fill price and rejection reasons are known the moment the broker reports them
+instead of by polling the order book over REST.
+
+States are normalized to open -> complete | rejected | cancelled. Terminal
+states are final: a late or repeated update cannot move an order back. Fills
+are kept per order (deduplicated by fill id) and drive the average price.
+
+Listeners registered with add_listener() are called as listener(order, event)
+with event 'fill', 'complete', 'rejected' or 'cancelled'. PositionFills is the
+listener for the position logic: it writes real buy_price / sell_price and
+times into glb.positions as fills arrive.
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from stores import PositionStore
+
+OPEN, COMPLETE, REJECTED, CANCELLED = 'open', 'complete', 'rejected', 'cancelled'
+TERMINAL = (COMPLETE, REJECTED, CANCELLED)
+# Broker status -> normalized state
+STATUS_MAP: Dict[str, str] = {
+    'OPEN': OPEN, 'PENDING': OPEN, 'TRIGGER_PENDING': OPEN, 'NEW': OPEN, 'REPLACED': OPEN,
+    'COMPLETE': COMPLETE, 'REJECTED': REJECTED, 'CANCELED': CANCELLED, 'CANCELLED': CANCELLED,
+}
+FILL_TIME_FORMAT = '%d-%m-%Y %H:%M:%S'
+
+
+class Fill(NamedTuple):
+    """One execution of an order."""
+    fill_id: str
+    qty: int
+    price: float
+    time: str  # Broker fill time, e.g. '17-10-2026 09:21:03'
+
+
+class Order:
+    """One broker order; a snapshot is returned to readers via OrderBook.get()."""
+
+    __slots__ = ('order_id', 'token', 'symbol', 'exchange', 'side', 'qty', 'price', 'remarks',
+                 'state', 'status', 'filled_qty', 'avg_price', 'reject_reason', 'fills',
+                 'created_ns', 'updated_ns')
+
+    def __init__(self, order_id: str) -> None:
+        self.order_id = order_id
+        self.token: Optional[str] = None
+        self.symbol: Optional[str] = None
+        self.exchange: Optional[str] = None
+        self.side: Optional[str] = None
+        self.qty = 0
+        self.price = 0.0
+        self.remarks: Optional[str] = None
+        self.state = OPEN
+        self.status: Optional[str] = None
+        self.filled_qty = 0
+        self.avg_price: Optional[float] = None
+        self.reject_reason: Optional[str] = None
+        self.fills: Tuple[Fill, ...] = ()
+        self.created_ns = self.updated_ns = time.time_ns()
+
+    def copy(self) -> "Order":
+        clone = Order.__new__(Order)
+        for name in Order.__slots__:
+            setattr(clone, name, getattr(self, name))
+        return clone
+
+    def __repr__(self) -> str:
+        return (f"Order({self.order_id} {self.side} {self.symbol} {self.filled_qty}/{self.qty} "
+                f"@{self.avg_price} {self.state})")
+
+
+def _float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _int(value) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _fill_time(value: str) -> Optional[datetime]:
+    try:
+        return datetime.strptime(value, FILL_TIME_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+
+OrderListener = Callable[[Order, str], None]
+
+
+class OrderBook:
+    """Orders indexed by order id and token, updated from the order-update stream."""
+
+    def __init__(self, resolve: Optional[Callable[[str, str], Optional[str]]] = None) -> None:
+        """
+        Args:
+            resolve (Optional[Callable[[str, str], Optional[str]]]): (exchange, symbol) -> token,
+                used when an update has no 'tk' field.
+        """
+        self.resolve = resolve
+        self._lock = threading.Lock()
+        self._orders: Dict[str, Order] = {}
+        self._by_token: Dict[str, Dict[str, Order]] = {}
+        self._listeners: List[OrderListener] = []
+        self.updates = 0
+        self.ignored = 0
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def add_listener(self, listener: OrderListener) -> None:
+        """Registers listener(order, event) for 'fill', 'complete', 'rejected' and 'cancelled'."""
+        self._listeners.append(listener)
+
+    def on_update(self, update: dict) -> Optional[Order]:
+        """Applies one order update from the websocket.
+
+        Args:
+            update (dict): Broker order update with 'norenordno', 'status' and, for
+                fills, 'flqty'/'flprc'/'fltm' (and 'flid' if available).
+
+        Returns:
+            Optional[Order]: Snapshot of the order after the update, or None if the
+            update had no order id.
+        """
+        order_id = update.get('norenordno')
+        if not order_id:
+            return None
+        events: List[str] = []
+        with self._lock:
+            self.updates += 1
+            order = self._orders.get(order_id)
+            if order is None:
+                order = self._orders[order_id] = Order(order_id)
+            self._apply(order, update, events)
+            snapshot = order.copy()
+        for event in events:
+            for listener in self._listeners:
+                try:
+                    listener(snapshot, event)
+                except Exception as e:
+                    print(f"Error in order listener for {order_id} ({event}): {e}")
+        return snapshot
+
+    def _apply(self, order: Order, update: dict, events: List[str]) -> None:
+        """Merges an update into an order. Must be called with the lock held."""
+        order.symbol = update.get('tsym', order.symbol)
+        order.exchange = update.get('exch', order.exchange)
+        order.side = update.get('trantype', order.side)
+        order.remarks = update.get('remarks', order.remarks)
+        if update.get('qty'):
+            order.qty = _int(update['qty'])
+        if update.get('prc'):
+            order.price = _float(update['prc']) or order.price
+        token = update.get('tk') or order.token
+        if token is None and self.resolve is not None and order.symbol:
+            token = self.resolve(order.exchange or 'NFO', order.symbol)
+        if token is not None and token != order.token:
+            if order.token is not None:
+                self._by_token.get(order.token, {}).pop(order.order_id, None)
+            order.token = str(token)
+            self._by_token.setdefault(order.token, {})[order.order_id] = order
+        order.updated_ns = time.time_ns()
+
+        fill = self._fill(order, update)
+        if fill is not None:
+            order.fills += (fill,)
+            order.filled_qty += fill.qty
+            notional = sum(f.qty * f.price for f in order.fills)
+            order.avg_price = notional / order.filled_qty if order.filled_qty else fill.price
+            events.append('fill')
+        elif update.get('avgprc') and order.avg_price is None:
+            order.avg_price = _float(update['avgprc'])
+
+        status = str(update.get('status', '')).upper()
+        state = STATUS_MAP.get(status)
+        if state is None or order.state in TERMINAL:
+            if state is not None and state != order.state:
+                self.ignored += 1  # Out-of-order update after a terminal state
+            return
+        order.status = status
+        if state == REJECTED:
+            order.reject_reason = update.get('rejreason') or update.get('emsg')
+        if state != order.state:
+            order.state = state
+            if state in TERMINAL:
+                events.append(state)
+
+    @staticmethod
+    def _fill(order: Order, update: dict) -> Optional[Fill]:
+        """Returns the new fill carried by an update, if any and not seen before."""
+        price = _float(update.get('flprc'))
+        # Without 'flqty' the update reports the whole execution: take what is still unfilled
+        qty = _int(update['flqty']) if update.get('flqty') else order.qty - order.filled_qty
+        if qty <= 0 or price is None:
+            return None
+        fill_id = str(update.get('flid') or f"{update.get('fltm')}|{qty}|{price}")
+        if any(f.fill_id == fill_id for f in order.fills):
+            return None
+        return Fill(fill_id, qty, price, update.get('fltm', ''))
+
+    def get(self, order_id: str) -> Optional[Order]:
+        """Returns a snapshot of an order, or None."""
+        with self._lock:
+            order = self._orders.get(order_id)
+            return None if order is None else order.copy()
+
+    def by_token(self, token: str) -> Tuple[Order, ...]:
+        """Returns snapshots of a token's orders, oldest first."""
+        with self._lock:
+            return tuple(o.copy() for o in self._by_token.get(str(token), {}).values())
+
+    def by_remarks(self, remarks: str) -> Optional[Order]:
+        """Returns the latest order carrying a remark (e.g. an order.order_key idempotency key)."""
+        with self._lock:
+            for order in reversed(list(self._orders.values())):
+                if order.remarks == remarks:
+                    return order.copy()
+        return None
+
+    def in_state(self, *states: str) -> Tuple[Order, ...]:
+        """Returns snapshots of the orders in any of the given states."""
+        with self._lock:
+            return tuple(o.copy() for o in self._orders.values() if o.state in states)
+
+    def trades(self) -> Tuple[Tuple[str, Fill], ...]:
+        """Returns every fill as (order_id, fill), in arrival order per order."""
+        with self._lock:
+            return tuple((o.order_id, f) for o in self._orders.values() for f in o.fills)
+
+
+class PositionFills:
+    """Order-book listener that writes fill prices into a PositionStore.
+
+    The strategy links an order to its position before sending it, by the
+    order's remark (the gateway uses the idempotency key as remark):
+
+        key = order_key(token, candle, 'B')
+        position_fills.expect(key, pos_id)
+        place_buy_order(symbol, qty, token, candle)
+
+    Buy fills set buy_price (the order's average fill price) and buy_time; sell
+    fills set sell_price and sell_time, and a completed sell moves the position
+    from `exit_state` to `closed_state`.
+
+    A rejected or cancelled buy moves the position to `failed_state` and calls
+    on_failed(pos_id), so the strategy drops its target/SL watch. A rejected or
+    cancelled sell moves it from `exit_state` back to `open_state` and calls
+    on_reopened(pos_id), so the strategy watches it again and the next tick at the
+    level retries the exit. Part of an order filled before a cancel stays in the
+    position's qty. The link is dropped once the order is terminal.
+    """
+
+    def __init__(self, positions: PositionStore, exit_state: str = 'exiting',
+                 closed_state: str = 'closed', open_state: str = 'open', failed_state: str = 'failed') -> None:
+        self.positions = positions
+        self.exit_state = exit_state
+        self.closed_state = closed_state
+        self.open_state = open_state
+        self.failed_state = failed_state
+        self.on_failed: Optional[Callable[[int], None]] = None
+        self.on_reopened: Optional[Callable[[int], None]] = None
+        self._lock = threading.Lock()
+        self._expected: Dict[str, int] = {}
+
+    def expect(self, remarks: str, pos_id: int) -> None:
+        """Links the order that will carry `remarks` to a position."""
+        with self._lock:
+            self._expected[remarks] = pos_id
+
+    def __call__(self, order: Order, event: str) -> None:
+        with self._lock:
+            pos_id = self._expected.get(order.remarks)
+            if pos_id is not None and event in TERMINAL:
+                del self._expected[order.remarks]
+        if pos_id is None:
+            return
+        if event == 'fill':
+            fill_time = _fill_time(order.fills[-1].time) if order.fills else None
+            if order.side == 'B':
+                self.positions.update(pos_id, buy_price=order.avg_price, buy_time=fill_time)
+            else:
+                self.positions.update(pos_id, sell_price=order.avg_price, sell_time=fill_time)
+        elif event == COMPLETE and order.side == 'S':
+            self.positions.transition(pos_id, self.exit_state, self.closed_state)
+        elif event in (REJECTED, CANCELLED):
+            print(f"Order {order.order_id} for position {pos_id} {event}: {order.reject_reason or order.status}")
+            if order.side == 'B':
+                self._entry_failed(pos_id, order)
+            else:
+                self._exit_failed(pos_id, order)
+
+    def _entry_failed(self, pos_id: int, order: Order) -> None:
+        if order.filled_qty:
+            # Cancelled after a partial fill: the filled part is a live position
+            self.positions.update(pos_id, qty=order.filled_qty)
+            return
+        if (self.positions.transition(pos_id, self.open_state, self.failed_state)
+                or self.positions.transition(pos_id, self.exit_state, self.failed_state)):
+            if self.on_failed is not None:
+                self.on_failed(pos_id)
+
+    def _exit_failed(self, pos_id: int, order: Order) -> None:
+        pos = self.positions.get(pos_id)
+        if pos is None:
+            return
+        values = {'qty': pos.qty - order.filled_qty} if order.filled_qty else {}
+        if self.positions.transition(pos_id, self.exit_state, self.open_state, **values):
+            if self.on_reopened is not None:
+                self.on_reopened(pos_id)
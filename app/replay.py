@@ -0,0 +1,262 @@
+"""
+replay.py - Replays a recorded tick day through the live tick path.
+
+ReplayApi is an offline stand-in for ShoonyaApiPy: login and subscriptions are
+no-ops, quotes answer from the replayed prices and orders fill immediately at
+the last replayed price. The driver builds its own stores (tick store, candles,
+indicator engine, strategy dispatcher, positions, triggers, order book), runs
+market_data's Strategy on them with an OrderGateway over the stub, and feeds a
+recorded day through the same TickPipeline the live websocket consumer uses, at
+1x, Nx or maximum speed. The strike window is the recorded options of the
+symbol master. It does not import glb, so it needs neither a broker login nor
+a live NIFTY quote.
+
+Usage:
+    python app/replay.py recordings/ticks_2024-01-15.bin --speed 10
+    python app/replay.py recordings/ticks_2024-01-15.bin --speed 0   # max speed
+    python app/replay.py recordings/ticks_2024-01-15.bin --speed 0 --expect-orders
+"""
+
+import argparse
+import itertools
+import time
+from concurrent.futures import Executor, Future
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from candles import CandleBuilder
+from chain_index import ChainIndex
+from indicators import IndicatorEngine
+from order import OrderGateway
+from order_book import OrderBook, PositionFills
+from stores import PositionStore, TriggerStore
+from strategy import Strategy
+from strategy_dispatch import TickDispatcher
+from symbol_master import SymbolMaster, load_master
+from tick_pipeline import TickPipeline
+from tick_recorder import load_day
+from tick_store import TickStore
+
+NIFTY_TOKEN = '26000'
+
+
+class ReplayApi:
+    """Offline ShoonyaApiPy stand-in driven by replayed ticks."""
+
+    def __init__(self) -> None:
+        self.ltp: Dict[str, float] = {}
+        self.orders: List[dict] = []
+        self.subscriptions: set = set()
+        self.subscribe_callback: Optional[Callable[[dict], None]] = None
+        self.order_update_callback: Optional[Callable[[dict], None]] = None
+        self.resolve: Optional[Callable[[str, str], Optional[str]]] = None  # (exchange, tsym) -> token
+        self._order_ids = itertools.count(1)
+
+    def login(self, **kwargs) -> dict:
+        return {'stat': 'Ok'}
+
+    def start_websocket(self, order_update_callback=None, subscribe_callback=None,
+                        socket_open_callback=None, **kwargs) -> None:
+        self.order_update_callback = order_update_callback
+        self.subscribe_callback = subscribe_callback
+        if socket_open_callback is not None:
+            socket_open_callback()
+
+    def subscribe(self, instrument, feed_type=None) -> None:
+        self.subscriptions.update([instrument] if isinstance(instrument, str) else instrument)
+
+    def unsubscribe(self, instrument, feed_type=None) -> None:
+        self.subscriptions.difference_update([instrument] if isinstance(instrument, str) else instrument)
+
+    def searchscrip(self, exchange: str, searchtext: str) -> dict:
+        if searchtext == 'NIFTY INDEX':
+            return {'stat': 'Ok', 'values': [{'token': NIFTY_TOKEN, 'tsym': searchtext}]}
+        return {'stat': 'Not_Ok', 'emsg': 'searchscrip is not available in replay'}
+
+    def get_quotes(self, exchange: str, token: str) -> dict:
+        if token not in self.ltp:
+            return {'stat': 'Not_Ok', 'emsg': 'no replayed tick yet'}
+        return {'stat': 'Ok', 'lp': str(self.ltp[token])}
+
+    def get_time_price_series(self, **kwargs) -> None:
+        return None
+
+    def get_order_book(self) -> List[dict]:
+        return [dict(order, status='COMPLETE') for order in self.orders]
+
+    def place_order(self, **kwargs) -> dict:
+        """Fills the order immediately at the last replayed price of its symbol."""
+        norenordno = str(next(self._order_ids))
+        order = dict(kwargs, norenordno=norenordno)
+        token = self.resolve(kwargs.get('exchange', 'NFO'), kwargs.get('tradingsymbol')) if self.resolve else None
+        self.orders.append(order)
+        if self.order_update_callback is not None:
+            self.order_update_callback({'t': 'om', 'norenordno': norenordno, 'status': 'COMPLETE',
+                                        'tsym': kwargs.get('tradingsymbol'), 'remarks': kwargs.get('remarks'),
+                                        'qty': str(kwargs.get('quantity')),
+                                        'trantype': kwargs.get('buy_or_sell'),
+                                        'flprc': str(self.ltp.get(token, 0)),
+                                        'fltm': time.strftime('%d-%m-%Y %H:%M:%S')})
+        return {'stat': 'Ok', 'norenordno': norenordno}
+
+
+def replay(ticks: np.ndarray, callback: Callable[[dict], None], api: Optional[ReplayApi] = None,
+           speed: Optional[float] = 1.0) -> dict:
+    """Feeds recorded ticks to `callback` as websocket tick dicts.
+
+    Args:
+        ticks (np.ndarray): TICK_DTYPE records, as returned by load_day().
+        callback (Callable[[dict], None]): Usually event_handler_feed_update.
+        api (Optional[ReplayApi]): Stub whose quote prices follow the replay.
+        speed (Optional[float]): 1 for real time, N for N times faster, None or 0 for
+            as fast as possible.
+
+    Returns:
+        dict: 'ticks', 'seconds' and 'ticks_per_sec' of the run.
+    """
+    recv = ticks['recv_ns']
+    tokens = [t.decode() for t in ticks['tk'].tolist()]
+    exchanges = [e.decode() for e in ticks['e'].tolist()]
+    prices = ticks['lp'].tolist()
+    fts = ticks['ft'].tolist()
+    offsets = ((recv - recv[0]) / 1e9).tolist() if len(ticks) else []
+    start = time.perf_counter()
+    for i, tk in enumerate(tokens):
+        if speed:
+            delay = offsets[i] / speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+        tick = {'t': 'tf', 'e': exchanges[i], 'tk': tk}
+        lp = prices[i]
+        if lp == lp:  # not NaN
+            tick['lp'] = str(lp)
+            if api is not None:
+                api.ltp[tk] = lp
+        if fts[i]:
+            tick['ft'] = str(fts[i])
+        callback(tick)
+    seconds = time.perf_counter() - start
+    return {'ticks': len(tokens), 'seconds': seconds,
+            'ticks_per_sec': len(tokens) / seconds if seconds > 0 else float('inf')}
+
+
+class InlineExecutor(Executor):
+    """Runs each job at submit() on the calling thread, so a replay does not race its own handlers."""
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        future: Future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+class ReplaySession:
+    """Fresh stores, the NIFTY strategy and a TickPipeline over them, wired to a ReplayApi.
+
+    The strategy is market_data's: the same Strategy handlers (trigger scan, entry,
+    exit) run on the session's own stores, dispatcher and an OrderGateway over the
+    ReplayApi, so a recorded day produces the orders the live process would have sent.
+    """
+
+    def __init__(self, api: Optional[ReplayApi] = None, master: Optional[SymbolMaster] = None,
+                 underlying: str = "NIFTY", synchronous: bool = True) -> None:
+        """
+        Args:
+            api (Optional[ReplayApi]): Broker stand-in; a fresh one if omitted.
+            master (Optional[SymbolMaster]): Symbol master listing the recorded day's contracts;
+                the cached one (load_master()) if omitted.
+            underlying (str): Underlying whose recorded options form the strike window.
+            synchronous (bool): Run the candle scans and strategy handlers on the replay
+                thread, so they see every tick even at maximum speed; False keeps the
+                live worker threads (e.g. to measure their latency).
+        """
+        self.api = api or ReplayApi()
+        self.master = master
+        self.underlying = underlying
+        self.tick_store = TickStore()
+        self.candle_builder = CandleBuilder()
+        executor = InlineExecutor() if synchronous else None
+        self.indicator_engine = IndicatorEngine(self.candle_builder, executor=executor)
+        self.tick_dispatcher = TickDispatcher(executor=executor)
+        self.chain_index = ChainIndex({}, self.tick_store)
+        self.positions = PositionStore()
+        self.triggers = TriggerStore()
+        self.order_book = OrderBook()
+        self.position_fills = PositionFills(self.positions)
+        self.order_book.add_listener(self.position_fills)
+        self.api.order_update_callback = self.order_book.on_update
+        self.gateway = OrderGateway(self.api, book=self.order_book)
+        self.strategy = Strategy(self.chain_index, self.indicator_engine, self.tick_dispatcher, self.positions,
+                                 self.triggers, self.position_fills, gateway=self.gateway)
+        self.pipeline = TickPipeline(self.tick_store, self.candle_builder, self.indicator_engine,
+                                     self.tick_dispatcher)
+
+    def load_chain(self, tokens) -> int:
+        """Builds the strike window from the recorded tokens and starts the per-candle scan.
+
+        Args:
+            tokens (Iterable[str]): Tokens in the recording.
+
+        Returns:
+            int: Option contracts of the underlying found among the tokens.
+        """
+        master = self.master or load_master()
+        rows = master.load_slice(self.underlying)
+        rows = rows[rows['Token'].astype(str).isin(set(tokens))]
+        for option in ("CE", "PE"):
+            self.chain_index.set_chain(option, rows[rows['OptionType'] == option])
+        symbols = dict(zip(rows['TradingSymbol'].astype(str), rows['Token'].astype(str)))
+
+        def resolve(exchange: str, tradingsymbol: str) -> Optional[str]:
+            return symbols.get(tradingsymbol)
+
+        self.order_book.resolve = resolve
+        self.api.resolve = resolve
+        self.indicator_engine.add_listener(self.strategy.scan)
+        return len(rows)
+
+    def run(self, ticks: np.ndarray, speed: Optional[float] = 1.0) -> dict:
+        """Replays `ticks` through the strategy; each is processed synchronously as a batch of one.
+
+        Unlike the live ring/consumer hand-off this cannot fall behind at max
+        speed, so (in a synchronous session) every tick is handled deterministically.
+        """
+        tokens = np.unique(ticks['tk']).astype(str)
+        self.candle_builder.track(tokens)
+        if not self.chain_index.chains:
+            self.load_chain(tokens)
+        return replay(ticks, lambda tick: self.pipeline.process([(time.perf_counter_ns(), tick)]),
+                      self.api, speed)
+
+    def close(self) -> None:
+        """Waits for the queued scans, strategy handlers and orders, then stops their threads."""
+        self.indicator_engine.shutdown()
+        self.tick_dispatcher.shutdown()
+        self.gateway.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay a recorded tick day through the strategy.")
+    parser.add_argument('path', help="Recording file, e.g. recordings/ticks_2024-01-15.bin")
+    parser.add_argument('--speed', type=float, default=1.0, help="Replay speed multiplier; 0 = max speed")
+    parser.add_argument('--expect-orders', action='store_true',
+                        help="Exit with status 1 if the replayed day places no orders")
+    args = parser.parse_args()
+
+    session = ReplaySession()
+    try:
+        stats = session.run(load_day(args.path), args.speed or None)
+    finally:
+        session.close()
+    print(f"Replayed {stats['ticks']} ticks in {stats['seconds']:.2f}s "
+          f"({stats['ticks_per_sec']:.0f} ticks/s), {len(session.triggers)} triggers, "
+          f"{len(session.positions)} positions, {len(session.api.orders)} orders")
+    if args.expect_orders and not session.api.orders:
+        raise SystemExit(f"{args.path}: the replayed day placed no orders")
+
+
+if __name__ == '__main__':
+    main()
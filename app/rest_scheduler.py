@@ -0,0 +1,224 @@
+"""
+rest_scheduler.py - One coordinated front for every Shoonya REST call.
+
+RestScheduler wraps ShoonyaApiPy and exposes the same method names, so callers
+switch from `api_client.api.get_quotes(...)` to `api_client.rest.get_quotes(...)`
+and get, per call:
+
+* a token-bucket limiter per endpoint class (quotes, history, orders,
+  reports), so bursts from different threads stay under the broker's limits
+  instead of tripping them;
+* single-flight coalescing: identical read-only requests already in flight
+  share one broker call and its response;
+* a short-TTL response cache for read-only endpoints (REST_TTL);
+* execution on a shared thread pool, with submit() returning a Future for
+  callers that fan out;
+* per-endpoint latency histograms ('rest' stage, endpoint label) plus counters
+  for coalesced calls, cache hits, limiter waits, empty responses and throttling
+  errors.
+
+Order calls are rate limited but never coalesced or cached, and run on their own
+small pool, so an order never queues behind history or quote calls waiting for
+their bucket. Only 'Ok' responses are cached. ShoonyaApiPy answers None for any
+non-'Ok' reply and drops its emsg, so throttling is only recognized where the
+message survives: a 'Not_Ok' dict from the raw API or an exception's text;
+None responses are counted separately. Websocket methods (start_websocket,
+subscribe, ...) and anything unknown pass straight through.
+"""
+
+import inspect
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Tuple
+
+import config
+from metrics import inc, registry
+
+# Endpoint -> class sharing one token bucket
+REST_CLASSES: Dict[str, str] = {
+    'searchscrip': 'quotes', 'get_quotes': 'quotes', 'get_security_info': 'quotes',
+    'get_time_price_series': 'history', 'get_daily_price_series': 'history',
+    'place_order': 'orders', 'modify_order': 'orders', 'cancel_order': 'orders', 'exit_order': 'orders',
+    'get_order_book': 'reports', 'get_trade_book': 'reports', 'single_order_history': 'reports',
+    'get_positions': 'reports', 'get_holdings': 'reports', 'get_limits': 'reports',
+}
+# Class -> (requests per second, burst)
+REST_LIMITS: Dict[str, Tuple[float, int]] = getattr(config, "REST_LIMITS", {
+    'quotes': (10.0, 10), 'history': (5.0, 5), 'orders': (10.0, 10), 'reports': (5.0, 5),
+})
+# Read-only endpoint -> seconds a response is reused (0: coalesce only)
+REST_TTL: Dict[str, float] = getattr(config, "REST_TTL", {
+    'searchscrip': 3600.0, 'get_security_info': 3600.0, 'get_quotes': 0.25,
+    'get_time_price_series': 2.0, 'get_daily_price_series': 60.0, 'get_limits': 1.0,
+})
+REST_WORKERS: int = getattr(config, "REST_WORKERS", 16)
+REST_ORDER_WORKERS: int = getattr(config, "REST_ORDER_WORKERS", 4)
+MUTATING_CLASSES = ('orders',)
+THROTTLE_MARKERS = ('too many', 'rate limit', 'limit exceeded')
+
+
+def _ok(ret: Any) -> bool:
+    """True for a successful response: a list, or a dict with stat 'Ok'."""
+    return isinstance(ret, list) or (isinstance(ret, dict) and ret.get('stat') == 'Ok')
+
+
+def _throttled(message: Any) -> bool:
+    """True if an error message (emsg or exception) reads like a rate-limit rejection."""
+    text = str(message).lower()
+    return '429' in text or any(marker in text for marker in THROTTLE_MARKERS)
+
+
+class TokenBucket:
+    """Token-bucket rate limiter; acquire() sleeps until a token is available."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        """
+        Args:
+            rate (float): Tokens added per second.
+            burst (int): Bucket size, i.e. requests allowed back to back.
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Takes one token, waiting if the bucket is empty.
+
+        Returns:
+            float: Seconds waited.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class RestScheduler:
+    """Rate-limited, coalescing, caching proxy around the broker REST API."""
+
+    def __init__(self, api: Any, limits: Dict[str, Tuple[float, int]] = REST_LIMITS,
+                 ttls: Dict[str, float] = REST_TTL, workers: int = REST_WORKERS,
+                 order_workers: int = REST_ORDER_WORKERS) -> None:
+        """
+        Args:
+            api (Any): ShoonyaApiPy (or a stand-in with the same methods).
+            limits (Dict[str, Tuple[float, int]]): Endpoint class -> (rate per second, burst).
+            ttls (Dict[str, float]): Read-only endpoint -> response cache seconds.
+            workers (int): Threads running read-only broker calls.
+            order_workers (int): Threads running order calls.
+        """
+        self.api = api
+        self.ttls = ttls
+        self._buckets = {cls: TokenBucket(rate, burst) for cls, (rate, burst) in limits.items()}
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rest")
+        self._orders = ThreadPoolExecutor(max_workers=order_workers, thread_name_prefix="rest-orders")
+        self._lock = threading.Lock()
+        self._inflight: Dict[tuple, Future] = {}
+        self._cache: Dict[tuple, Tuple[float, Any]] = {}
+        self._signatures: Dict[str, inspect.Signature] = {}
+        registry.expose('rest_inflight', lambda: len(self._inflight), 'gauge',
+                        "Coalesced broker REST requests in flight")
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.api, name)
+        if name not in REST_CLASSES or not callable(attr):
+            return attr
+        return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+
+    def _key(self, name: str, args: tuple, kwargs: dict) -> tuple:
+        """Canonical request key, so positional and keyword spellings coalesce."""
+        sig = self._signatures.get(name)
+        if sig is None:
+            try:
+                sig = self._signatures[name] = inspect.signature(getattr(self.api, name))
+            except (TypeError, ValueError):
+                return (name, args, tuple(sorted(kwargs.items())))
+        try:
+            bound = sig.bind(*args, **kwargs)
+        except TypeError:
+            return (name, args, tuple(sorted(kwargs.items())))
+        bound.apply_defaults()
+        return (name,) + tuple((k, v if isinstance(v, (str, int, float, type(None))) else repr(v))
+                               for k, v in bound.arguments.items())
+
+    def call(self, name: str, *args: Any, **kwargs: Any) -> Any:
+        """Calls a broker endpoint through the scheduler and waits for its response."""
+        return self.submit(name, *args, **kwargs).result()
+
+    def submit(self, name: str, *args: Any, **kwargs: Any) -> Future:
+        """Schedules a broker call on the pool.
+
+        Args:
+            name (str): ShoonyaApiPy method, e.g. 'get_quotes'.
+            *args, **kwargs: Its arguments.
+
+        Returns:
+            Future: The broker response (or its exception).
+        """
+        endpoint_class = REST_CLASSES.get(name, 'other')
+        if endpoint_class in MUTATING_CLASSES:
+            return self._orders.submit(self._run, name, endpoint_class, args, kwargs)
+        key = self._key(name, args, kwargs)
+        ttl = self.ttls.get(name, 0.0)
+        with self._lock:
+            if ttl:
+                cached = self._cache.get(key)
+                if cached is not None and time.monotonic() - cached[0] < ttl:
+                    inc('rest_cache_hits_total', endpoint=name)
+                    future = Future()
+                    future.set_result(cached[1])
+                    return future
+            future = self._inflight.get(key)
+            if future is not None:
+                inc('rest_coalesced_total', endpoint=name)
+                return future
+            future = self._inflight[key] = self._pool.submit(self._run, name, endpoint_class, args, kwargs)
+        future.add_done_callback(lambda f: self._settle(key, ttl, f))
+        return future
+
+    def _settle(self, key: tuple, ttl: float, future: Future) -> None:
+        with self._lock:
+            self._inflight.pop(key, None)
+            # Only successful responses are cached; failures are retried by the next caller
+            if ttl and future.exception() is None and _ok(future.result()):
+                self._cache[key] = (time.monotonic(), future.result())
+                if len(self._cache) > 4096:
+                    now = time.monotonic()
+                    self._cache = {k: v for k, v in self._cache.items() if now - v[0] < self.ttls.get(k[0], 0.0)}
+
+    def _run(self, name: str, endpoint_class: str, args: tuple, kwargs: dict) -> Any:
+        bucket = self._buckets.get(endpoint_class)
+        if bucket is not None:
+            waited = bucket.acquire()
+            if waited:
+                inc('rest_limiter_waits_total', endpoint=name)
+        start = time.perf_counter_ns()
+        try:
+            ret = getattr(self.api, name)(*args, **kwargs)
+        except Exception as e:
+            # e.g. the JSON error or HTTP error of a throttled request
+            if _throttled(e):
+                inc('rest_throttled_total', endpoint=name)
+            raise
+        finally:
+            registry.histogram('rest', "Broker REST call latency", endpoint=name).record(
+                time.perf_counter_ns() - start)
+        if ret is None:
+            # ShoonyaApiPy's answer to any non-'Ok' reply (an error, throttling or no data)
+            inc('rest_empty_total', endpoint=name)
+        elif isinstance(ret, dict) and ret.get('stat') == 'Not_Ok' and _throttled(ret.get('emsg')):
+            inc('rest_throttled_total', endpoint=name)
+        return ret
+
+    def shutdown(self) -> None:
+        """Stops the pools after the calls in flight."""
+        self._pool.shutdown(wait=True)
+        self._orders.shutdown(wait=True)
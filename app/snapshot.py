@@ -0,0 +1,191 @@
+"""
+snapshot.py - Periodic warm-restart snapshot of strategy state and last ticks.
+
+SnapshotWriter pickles a compact copy of everything the strategy needs to pick
+up where it left off:
+
+* positions and trigger_df records, ids and states included;
+* processed_orders, last_trigger_time and processed_candles, so nothing that
+  already fired is fired again;
+* the last tick of every token and the newest 1-minute candles (the 5-minute
+  bars are rebuilt from them).
+
+The file is written atomically (temp file + os.replace, owner-only
+permissions) every SNAPSHOT_INTERVAL seconds when something changed, and once
+more at exit. On a restart the same trading day, restore() puts the state back
+in memory before the feed opens, so there is no REST round-trip to rebuild it.
+The saved last ticks are only put back by restore_ticks() once startup has
+waited for the live first ticks, so a stale price never counts as the feed
+being ready, and never replaces a live tick.
+"""
+
+import atexit
+import os
+import pickle
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import config
+import glb
+from symbol_master import trading_day
+
+SNAPSHOT_FILE: str = getattr(config, "SNAPSHOT_FILE", os.path.join("cache", "snapshot.pkl"))
+SNAPSHOT_INTERVAL: float = getattr(config, "SNAPSHOT_INTERVAL", 5.0)
+SNAPSHOT_BARS: int = getattr(config, "SNAPSHOT_BARS", 375)  # One session of 1-minute bars
+VERSION = 1
+
+
+def capture(bars: int = SNAPSHOT_BARS) -> Dict[str, Any]:
+    """Collects the current strategy state and last ticks from glb.
+
+    Args:
+        bars (int): 1-minute candles kept per token.
+
+    Returns:
+        Dict[str, Any]: Picklable snapshot.
+    """
+    slots = glb.tick_store.slots(glb.tick_store.tokens())
+    ltp, ts_ns, _ = glb.tick_store.snapshot(slots)
+    # The strategy changes these under order_processing_lock; copy them under it too
+    with glb.order_processing_lock:
+        processed_orders = set(glb.processed_orders)
+        last_trigger_time = dict(glb.last_trigger_time)
+        processed_candles = set(glb.processed_candles)
+    return {
+        'version': VERSION,
+        'day': trading_day().isoformat(),
+        'taken_ns': time.time_ns(),
+        'ticks': (glb.tick_store.tokens(), ltp, ts_ns),
+        'candles': glb.candle_builder.export(bars),
+        'positions': glb.positions.dump(),
+        'triggers': glb.trigger_df.dump(),
+        'processed_orders': processed_orders,
+        'last_trigger_time': last_trigger_time,
+        'processed_candles': processed_candles,
+    }
+
+
+def save(state: Dict[str, Any], path: str = SNAPSHOT_FILE) -> None:
+    """Writes a snapshot atomically, readable by the owner only."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def load(path: str = SNAPSHOT_FILE) -> Optional[Dict[str, Any]]:
+    """Reads the snapshot if it was taken on the current trading day.
+
+    Returns:
+        Optional[Dict[str, Any]]: The snapshot, or None if it is missing, stale or unreadable.
+    """
+    try:
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError) as e:
+        if not isinstance(e, FileNotFoundError):
+            print(f"Could not read snapshot {path}: {e}")
+        return None
+    if state.get('version') != VERSION or state.get('day') != trading_day().isoformat():
+        return None
+    return state
+
+
+def restore(state: Dict[str, Any]) -> Dict[str, int]:
+    """Puts a snapshot's strategy state back into glb before the feed starts.
+
+    Containers are updated in place, so modules that imported them keep valid
+    references. Triggers and positions come back in their saved states: rows that
+    already fired stay fired, and the caller re-arms watch_trigger/watch_position
+    only for 'pending' triggers and 'open' positions. The last ticks are left to
+    restore_ticks().
+
+    Args:
+        state (Dict[str, Any]): Output of load().
+
+    Returns:
+        Dict[str, int]: Counts of what was restored.
+    """
+    glb.candle_builder.restore(state['candles'])
+    glb.positions.restore(state['positions'])
+    glb.trigger_df.restore(state['triggers'])
+    with glb.order_processing_lock:
+        glb.processed_orders.update(state['processed_orders'])
+        glb.last_trigger_time.update(state['last_trigger_time'])
+        glb.processed_candles.update(state['processed_candles'])
+    return {'candles': len(state['candles']), 'positions': len(state['positions']),
+            'triggers': len(state['triggers']), 'processed_orders': len(state['processed_orders'])}
+
+
+def restore_ticks(state: Dict[str, Any]) -> int:
+    """Puts a snapshot's last ticks into glb.tick_store for tokens that have not ticked live yet.
+
+    Call it after FeedReadiness has seen the first ticks: a restored tick keeps its
+    old timestamp, so get_ltp still treats it as stale, and tick_store.seed never
+    overwrites a live tick.
+
+    Args:
+        state (Dict[str, Any]): Output of load().
+
+    Returns:
+        int: Ticks restored.
+    """
+    tokens, ltp, ts_ns = state['ticks']
+    return sum(glb.tick_store.seed(token, float(price), int(ts))
+               for token, price, ts in zip(tokens, ltp, ts_ns) if ts)
+
+
+class SnapshotWriter:
+    """Background thread that saves a snapshot every `interval` seconds when state changed."""
+
+    def __init__(self, path: str = SNAPSHOT_FILE, interval: float = SNAPSHOT_INTERVAL) -> None:
+        self.path = path
+        self.interval = interval
+        self.saves = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_key = None
+
+    def _key(self) -> tuple:
+        # Store snapshots are cached tuples replaced on every write, so identity tracks changes
+        return (glb.tick_store.last_seq, glb.positions.snapshot(), glb.trigger_df.snapshot(),
+                len(glb.processed_orders), len(glb.last_trigger_time), len(glb.processed_candles))
+
+    def save_now(self, force: bool = False) -> bool:
+        """Saves a snapshot if anything changed since the last one (or if `force`).
+
+        Returns:
+            bool: True if a snapshot was written.
+        """
+        key = self._key()
+        if not force and self._last_key is not None and all(
+                a is b or a == b for a, b in zip(key, self._last_key)):
+            return False
+        try:
+            save(capture(), self.path)
+        except Exception as e:
+            print(f"Could not save snapshot: {e}")
+            return False
+        self._last_key = key
+        self.saves += 1
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.save_now()
+
+    def start(self) -> None:
+        """Starts the writer thread and saves a final snapshot at exit."""
+        self._thread = threading.Thread(target=self._run, name="snapshot-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """Stops the thread and writes a last snapshot."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.save_now()
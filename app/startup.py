@@ -0,0 +1,192 @@
+"""
+startup.py - Parallel startup orchestrator with readiness events.
+
+Startup.run() replaces the fixed login -> download -> socket -> sleep loop ->
+subscribe -> sleep(5) sequence. Independent steps run concurrently:
+
+    login ──┬─> websocket open ─────────────┐
+            ├─> NIFTY quote ──┐             ├─> subscribe window ─> first ticks ─> live
+    symbol master ────────────┴─> history warm-up ─┘
+    snapshot restore ─────────────┘
+
+and waits on events instead of sleeping: FeedReadiness.socket_open is set by
+the websocket open callback, and wait_ticks() returns as soon as every needed
+token has ticked once. Each step's duration and the overall time-to-ready are
+reported.
+
+On a restart the same trading day the warm-restart snapshot (snapshot.py) is
+restored alongside login, so positions, triggers and already-fired markers are
+back before the feed opens and only tokens without restored candles are warmed
+up from history. Pending triggers and open positions are re-armed on the tick
+dispatcher once the window is subscribed. The saved last ticks are put back only
+after the first-ticks wait, for tokens that are still silent, so they never
+satisfy FeedReadiness.
+"""
+
+import importlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+import config
+
+SOCKET_TIMEOUT: float = getattr(config, "STARTUP_SOCKET_TIMEOUT", 10.0)
+TICK_TIMEOUT: float = getattr(config, "STARTUP_TICK_TIMEOUT", 10.0)
+
+
+class FeedReadiness:
+    """Socket-open and first-tick-per-token readiness events."""
+
+    def __init__(self, has_ticked: Optional[Callable[[str], bool]] = None) -> None:
+        """
+        Args:
+            has_ticked (Optional[Callable[[str], bool]]): Tells whether a token already has
+                a tick (e.g. lambda t: tick_store.get(t) is not None), checked by expect().
+        """
+        self.socket_open = threading.Event()
+        self.waiting = False  # Fast-path flag for the tick consumer
+        self._has_ticked = has_ticked
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._ticked = threading.Event()
+
+    def expect(self, tokens: Iterable[str]) -> None:
+        """Starts waiting for the first tick of `tokens` (tokens that already ticked are skipped)."""
+        with self._lock:
+            tokens = {str(t) for t in tokens}
+            if self._has_ticked is not None:
+                tokens = {t for t in tokens if not self._has_ticked(t)}
+            self._pending |= tokens
+            if self._pending:
+                self._ticked.clear()
+                self.waiting = True
+            else:
+                self._ticked.set()
+
+    def seen(self, tokens: Iterable[str]) -> None:
+        """Marks tokens as ticked; called by the tick consumer while `waiting`."""
+        with self._lock:
+            self._pending.difference_update(tokens)
+            if not self._pending:
+                self.waiting = False
+                self._ticked.set()
+
+    def wait_ticks(self, tokens: Iterable[str], timeout: float = TICK_TIMEOUT) -> List[str]:
+        """Blocks until every token has ticked once, or `timeout` seconds.
+
+        Returns:
+            List[str]: Tokens still without a tick (empty when all are ready).
+        """
+        self.expect(tokens)
+        self._ticked.wait(timeout)
+        with self._lock:
+            return sorted(self._pending)
+
+
+class Startup:
+    """Runs the startup steps concurrently and measures time-to-ready."""
+
+    def __init__(self, socket_timeout: float = SOCKET_TIMEOUT, tick_timeout: float = TICK_TIMEOUT,
+                 restore: bool = True) -> None:
+        """
+        Args:
+            socket_timeout (float): Seconds to wait for the websocket to open.
+            tick_timeout (float): Seconds to wait for the first ticks.
+            restore (bool): Restore today's warm-restart snapshot if there is one.
+        """
+        self.socket_timeout = socket_timeout
+        self.tick_timeout = tick_timeout
+        self.restore = restore
+        self.restored: Dict[str, int] = {}
+        self._state: Optional[dict] = None
+        self.timings: Dict[str, float] = {}
+        self.missing: List[str] = []
+        self._start = 0.0
+
+    def _timed(self, name: str, fn: Callable, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.timings[name] = time.perf_counter() - start
+            print(f"Startup: {name} done in {self.timings[name]:.2f}s "
+                  f"(t+{time.perf_counter() - self._start:.2f}s)")
+
+    def _open_socket(self, websocket_handler, feed_ready: FeedReadiness) -> None:
+        websocket_handler.start_websocket()
+        if not feed_ready.socket_open.wait(self.socket_timeout):
+            raise TimeoutError(f"Websocket did not open within {self.socket_timeout}s")
+
+    def _restore(self) -> None:
+        import snapshot
+        state = snapshot.load()
+        if state is not None:
+            self.restored = snapshot.restore(state)
+            self._state = state
+            print(f"Startup: restored snapshot {self.restored}")
+
+    def _rearm(self, glb, market_data) -> None:
+        """Re-registers the strategy handlers of restored pending triggers and open positions.
+
+        A position restored as 'exiting' stopped mid-exit: its sell is resumed with
+        the same idempotency key, placed again only if the broker has no open or
+        complete order under that key.
+        """
+        triggers = glb.trigger_df.in_state('pending')
+        for trigger in triggers:
+            market_data.arm_trigger(trigger.id)
+        positions = glb.positions.in_state('open')
+        for position in positions:
+            market_data.arm_position(position.id)
+        exiting = glb.positions.in_state('exiting')
+        for position in exiting:
+            market_data.strategy.resume_exit(position.id)
+        self.restored.update(armed_triggers=len(triggers), armed_positions=len(positions),
+                             resumed_exits=len(exiting))
+
+    def run(self) -> Dict[str, float]:
+        """Restores state, logs in, loads market data, opens the feed and subscribes; returns once live.
+
+        Returns:
+            Dict[str, float]: Seconds per step plus 'time_to_ready'.
+
+        Raises:
+            TimeoutError: If the websocket does not open in time.
+        """
+        self._start = time.perf_counter()
+        import glb
+        from api_client import api_client
+
+        with ThreadPoolExecutor(max_workers=4, thread_name_prefix="startup") as pool:
+            login = pool.submit(self._timed, 'login', api_client.login)
+            master = pool.submit(self._timed, 'symbol_master', importlib.import_module, 'market_data')
+            if self.restore:
+                self._timed('snapshot_restore', self._restore)
+            login.result()
+            import websocket_handler
+            socket = pool.submit(self._timed, 'socket_open', self._open_socket, websocket_handler, glb.feed_ready)
+            quote = pool.submit(self._timed, 'underlying_quote', api_client.get_ltp, 'NIFTY INDEX')
+            market_data = master.result()
+            subscriptions = market_data.subscriptions
+            ltp = quote.result()
+            # History warm-up overlaps with the socket handshake
+            window = subscriptions.window_tokens(ltp)
+            cold = [t for t in window if t not in glb.candle_builder]
+            self._timed('history_warmup', market_data.seed_candles, cold)
+            socket.result()
+
+        self._timed('subscribe', subscriptions.start, ltp, False)
+        glb.tick_dispatcher.register(subscriptions.underlying_token, subscriptions.on_tick)
+        if self._state is not None:
+            self._timed('rearm', self._rearm, glb, market_data)
+        needed = [subscriptions.underlying_token] + window
+        self.missing = self._timed('first_ticks', glb.feed_ready.wait_ticks, needed, self.tick_timeout)
+        if self.missing:
+            print(f"Startup: going live without a first tick for {len(self.missing)} tokens: {self.missing}")
+        if self._state is not None:
+            import snapshot
+            self.restored['ticks'] = self._timed('tick_restore', snapshot.restore_ticks, self._state)
+        self.timings['time_to_ready'] = time.perf_counter() - self._start
+        print(f"Startup: ready in {self.timings['time_to_ready']:.2f}s")
+        return self.timings
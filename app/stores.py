@@ -0,0 +1,238 @@
+"""
+stores.py - Slotted, indexed in-memory stores for positions and triggers.
+
+Records are `__slots__` objects indexed by id, by token and by state, so
+adding a record or moving it between states is O(1) and never copies a frame.
+Readers get immutable snapshots (tuples of namedtuples) that are rebuilt only
+after a write, so monitoring loops can scan them without holding a lock. A
+DataFrame with the old column layout is built on demand for reporting.
+"""
+
+import itertools
+from collections import namedtuple
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import pandas as pd
+
+from metrics import InstrumentedLock
+
+POSITION_FIELDS = ('token', 'symbolname', 'option_type', 'buy_price', 'sell_price', 'buy_time',
+                   'sell_time', 'state', 'option', 'qty', 'target', 'sl', 'trail', 'exit_candle')
+TRIGGER_FIELDS = ('symbolname', 'token', 'option_type', 'High', 'Low', 'TriggerCandle_Time', 'State')
+
+
+class Position:
+    """One position row; field names match the old glb.positions columns."""
+    __slots__ = ('id',) + POSITION_FIELDS
+
+
+class Trigger:
+    """One trigger row; field names match the old glb.trigger_df columns."""
+    __slots__ = ('id',) + TRIGGER_FIELDS
+
+
+class RecordStore:
+    """Records indexed by id, token and state with copy-on-write snapshots."""
+
+    record_cls: type = None
+    fields: Tuple[str, ...] = ()
+    state_field: str = 'state'
+    lock_name: str = 'record_lock'
+
+    def __init__(self) -> None:
+        # The old glb.position_lock/trigger_lock: waits show up as
+        # pha_lock_wait_seconds{lock=lock_name}
+        self._lock = InstrumentedLock(self.lock_name)
+        self._ids = itertools.count(1)
+        self._by_id: Dict[int, Any] = {}
+        self._by_token: Dict[str, Dict[int, Any]] = {}
+        self._by_state: Dict[Any, Dict[int, Any]] = {}
+        self._snapshot: Optional[tuple] = None
+        self.View = namedtuple(f"{self.record_cls.__name__}View", ('id',) + self.fields)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def _index(self, rec: Any) -> None:
+        self._by_token.setdefault(rec.token, {})[rec.id] = rec
+        self._by_state.setdefault(getattr(rec, self.state_field), {})[rec.id] = rec
+
+    def _unindex(self, rec: Any) -> None:
+        by_token = self._by_token[rec.token]
+        del by_token[rec.id]
+        if not by_token:
+            del self._by_token[rec.token]
+        by_state = self._by_state[getattr(rec, self.state_field)]
+        del by_state[rec.id]
+
+    def _check(self, values: Dict[str, Any]) -> None:
+        unknown = set(values) - set(self.fields)
+        if unknown:
+            raise KeyError(f"Unknown {self.record_cls.__name__} fields: {sorted(unknown)}")
+        if 'token' in values:
+            values['token'] = str(values['token'])
+
+    def _view(self, rec: Any) -> tuple:
+        return self.View(rec.id, *(getattr(rec, f) for f in self.fields))
+
+    def add(self, **values: Any) -> int:
+        """Adds a record. Missing fields default to None.
+
+        Returns:
+            int: The new record's id.
+        """
+        self._check(values)
+        rec = self.record_cls()
+        rec.id = next(self._ids)
+        for f in self.fields:
+            setattr(rec, f, values.get(f))
+        rec.token = str(rec.token)
+        with self._lock:
+            self._by_id[rec.id] = rec
+            self._index(rec)
+            self._snapshot = None
+        return rec.id
+
+    def update(self, rec_id: int, **values: Any) -> Optional[tuple]:
+        """Updates fields of a record, re-indexing it if its token or state changes.
+
+        Returns:
+            Optional[tuple]: The record's new snapshot view, or None if it does not exist.
+        """
+        self._check(values)
+        with self._lock:
+            rec = self._by_id.get(rec_id)
+            if rec is None:
+                return None
+            reindex = 'token' in values or self.state_field in values
+            if reindex:
+                self._unindex(rec)
+            for f, v in values.items():
+                setattr(rec, f, v)
+            if reindex:
+                self._index(rec)
+            self._snapshot = None
+            return self._view(rec)
+
+    def transition(self, rec_id: int, from_state: Any, to_state: Any, **values: Any) -> bool:
+        """Atomically moves a record from one state to another (compare-and-set).
+
+        Args:
+            rec_id (int): Record id.
+            from_state (Any): State the record must currently be in.
+            to_state (Any): New state.
+            **values: Other fields to set in the same step.
+
+        Returns:
+            bool: False if the record does not exist or was not in `from_state`.
+        """
+        values[self.state_field] = to_state
+        self._check(values)
+        with self._lock:
+            rec = self._by_id.get(rec_id)
+            if rec is None or getattr(rec, self.state_field) != from_state:
+                return False
+            self._unindex(rec)
+            for f, v in values.items():
+                setattr(rec, f, v)
+            self._index(rec)
+            self._snapshot = None
+            return True
+
+    def remove(self, rec_id: int) -> bool:
+        """Removes a record. Returns False if it did not exist."""
+        with self._lock:
+            rec = self._by_id.pop(rec_id, None)
+            if rec is None:
+                return False
+            self._unindex(rec)
+            self._snapshot = None
+            return True
+
+    def get(self, rec_id: int) -> Optional[tuple]:
+        """Returns a snapshot view of one record, or None."""
+        with self._lock:
+            rec = self._by_id.get(rec_id)
+            return None if rec is None else self._view(rec)
+
+    def snapshot(self) -> tuple:
+        """Returns an immutable tuple of all records; rebuilt only after a write."""
+        snap = self._snapshot
+        if snap is None:
+            with self._lock:
+                snap = self._snapshot
+                if snap is None:
+                    snap = self._snapshot = tuple(self._view(r) for r in self._by_id.values())
+        return snap
+
+    def by_token(self, token: str) -> tuple:
+        """Returns snapshot views of the records for a token."""
+        with self._lock:
+            return tuple(self._view(r) for r in self._by_token.get(str(token), {}).values())
+
+    def in_state(self, *states: Any) -> tuple:
+        """Returns snapshot views of the records in any of the given states."""
+        with self._lock:
+            return tuple(self._view(r) for s in states for r in self._by_state.get(s, {}).values())
+
+    def count(self, state: Any) -> int:
+        """Returns the number of records in a state."""
+        return len(self._by_state.get(state, ()))
+
+    def tokens(self) -> Iterable[str]:
+        """Returns the tokens that currently have records."""
+        with self._lock:
+            return tuple(self._by_token)
+
+    def dump(self) -> Tuple[dict, ...]:
+        """Returns every record as a plain dict including its id, for snapshotting."""
+        return tuple(v._asdict() for v in self.snapshot())
+
+    def restore(self, rows: Iterable[dict]) -> None:
+        """Replaces all records with dumped ones, keeping their ids.
+
+        New ids continue after the largest restored id, so ids held elsewhere
+        (e.g. in processed_orders) never get reused.
+
+        Args:
+            rows (Iterable[dict]): Output of dump().
+        """
+        recs = []
+        for row in rows:
+            values = dict(row)
+            rec_id = values.pop('id')
+            self._check(values)
+            rec = self.record_cls()
+            rec.id = rec_id
+            for f in self.fields:
+                setattr(rec, f, values.get(f))
+            rec.token = str(rec.token)
+            recs.append(rec)
+        with self._lock:
+            self._by_id = {rec.id: rec for rec in recs}
+            self._by_token = {}
+            self._by_state = {}
+            for rec in recs:
+                self._index(rec)
+            self._ids = itertools.count(max(self._by_id, default=0) + 1)
+            self._snapshot = None
+
+    def to_frame(self) -> pd.DataFrame:
+        """Exports the records as a DataFrame with the old column layout, for reporting."""
+        return pd.DataFrame([v[1:] for v in self.snapshot()], columns=list(self.fields))
+
+
+class PositionStore(RecordStore):
+    """Open and closed positions (replaces the glb.positions DataFrame)."""
+    record_cls = Position
+    fields = POSITION_FIELDS
+    state_field = 'state'
+    lock_name = 'position_lock'
+
+
+class TriggerStore(RecordStore):
+    """Trigger candles awaiting breakout (replaces the glb.trigger_df DataFrame)."""
+    record_cls = Trigger
+    fields = TRIGGER_FIELDS
+    state_field = 'State'
+    lock_name = 'trigger_lock'
@@ -0,0 +1,268 @@
+"""
+strategy.py - The NIFTY trigger-candle strategy over one set of stores.
+
+Strategy holds the handlers the strategy runs on: the per-candle trigger scan,
+the breakout entry and the target/SL exit. It works on the stores, dispatcher,
+order gateway and webhook hooks it is given, so the live process (market_data
+over glb), a replayed day (replay.ReplaySession) and an engine shard
+(engine.ShardContext, through attach()) run the same handlers, each over its own
+state.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+import config
+
+from chain_index import ChainIndex
+from indicators import IndicatorEngine
+from order import current_candle, order_key, place_buy_order, place_target_or_sl_order
+from order_book import COMPLETE, STATUS_MAP, PositionFills
+from stores import PositionStore, TriggerStore
+from strategy_dispatch import TickDispatcher, watch_position, watch_trigger
+
+ENTRY_QTY: int = getattr(config, "ENTRY_QTY", 75)
+TARGET_RR: float = getattr(config, "TARGET_RR", 2.0)        # Target distance as a multiple of the entry-to-stop risk
+TRAIL_POINTS: Optional[float] = getattr(config, "TRAIL_POINTS", None)  # Trailing stop distance, None for a fixed stop
+
+
+class Strategy:
+    """Trigger scan, breakout entry and target/SL exit over one set of stores."""
+
+    def __init__(self, chain_index: ChainIndex, indicators: IndicatorEngine, dispatcher: TickDispatcher,
+                 positions: PositionStore, triggers: TriggerStore, fills: PositionFills, gateway: Any = None,
+                 on_buy: Optional[Callable[[str], None]] = None, on_exit: Optional[Callable[[str], None]] = None,
+                 processed_candles: Optional[Set[Tuple[str, int]]] = None, lock: Any = None) -> None:
+        """
+        Args:
+            chain_index (ChainIndex): Strike window that is scanned.
+            indicators (IndicatorEngine): Candle conditions over the window.
+            dispatcher (TickDispatcher): Dispatcher the triggers and positions are watched on.
+            positions (PositionStore): Positions opened by the strategy.
+            triggers (TriggerStore): Trigger candles found by the scan.
+            fills (PositionFills): Order-book listener writing fills into `positions`.
+            gateway (Any): OrderGateway (or anything with its submit()) the orders go
+                through; the shared order.gateway() if omitted.
+            on_buy (Optional[Callable[[str], None]]): Buy webhooks, called with 'CE' or 'PE'.
+            on_exit (Optional[Callable[[str], None]]): Exit webhooks, called with 'CE' or 'PE'.
+            processed_candles (Optional[Set[Tuple[str, int]]]): (token, candle) pairs already
+                turned into triggers; shared so a snapshot can save it.
+            lock (Any): Lock processed_candles is changed under (the snapshot copies it under
+                the same lock); a private one if omitted.
+        """
+        self.chain_index = chain_index
+        self.indicators = indicators
+        self.dispatcher = dispatcher
+        self.positions = positions
+        self.triggers = triggers
+        self.fills = fills
+        self.gateway = gateway
+        self.on_buy = on_buy
+        self.on_exit = on_exit
+        self.processed_candles = set() if processed_candles is None else processed_candles
+        self.lock = threading.Lock() if lock is None else lock
+        self._watches: Dict[int, Tuple[Optional[int], Any]] = {}  # pos_id -> (dispatcher handle, entry candle)
+        fills.on_failed = self.unwatch
+        fills.on_reopened = self.rewatch
+
+    def scan(self, now_ns: Optional[int] = None, options: Iterable[str] = ("CE", "PE")) -> List[int]:
+        """
+        Scans every strike in the window for a trigger candle in one vectorized pass.
+
+        The indicator engine evaluates the falling slope and the green trigger candle
+        for the whole chain at once. Each new trigger candle is added to the trigger
+        store as a 'pending' row with the candle's High/Low, once per (token, candle)
+        via processed_candles, and armed with arm_trigger. Registered with
+        IndicatorEngine.add_listener, it runs once per 5-minute candle.
+
+        Args:
+            now_ns (Optional[int]): UTC epoch ns defining the closed candles; now if omitted.
+            options (Iterable[str]): Option types to scan.
+
+        Returns:
+            list: Ids of the trigger rows added.
+        """
+        added = []
+        for option in options:
+            chain = self.chain_index.chain(option)
+            tokens = chain.tokens
+            signals = self.indicators.scan(tokens, now_ns)
+            for row in np.flatnonzero(signals.trigger):
+                key = (tokens[row], int(signals.t[row]))
+                with self.lock:
+                    if key in self.processed_candles:
+                        continue
+                    self.processed_candles.add(key)
+                added.append(self.triggers.add(symbolname=chain.symbols[row], token=tokens[row],
+                                               option_type=option, High=float(signals.high[row]),
+                                               Low=float(signals.low[row]),
+                                               TriggerCandle_Time=pd.Timestamp(int(signals.t[row])),
+                                               State='pending'))
+                self.arm_trigger(added[-1])
+        return added
+
+    def arm_trigger(self, trigger_id: int) -> Optional[int]:
+        """
+        Watches a pending trigger row for its breakout; enter() runs once it fires.
+
+        Args:
+            trigger_id (int): Id of the trigger row.
+
+        Returns:
+            Optional[int]: Dispatcher handle, or None if the trigger does not exist.
+        """
+        return watch_trigger(self.dispatcher, self.triggers, trigger_id, self.enter)
+
+    def arm_position(self, pos_id: int, candle: Any = None, notify: bool = True) -> Optional[int]:
+        """
+        Watches an open position's target/SL/trail; exit_position() runs once it is hit.
+
+        Args:
+            pos_id (int): Id of the position.
+            candle (Any): Trigger candle of the entry, for the exit order's idempotency key
+                (the position's exit_candle if omitted, e.g. after a restart, or else the
+                current 5-minute candle at exit).
+            notify (bool): Send the Exit webhooks on exit; False when re-arming after a failed sell.
+
+        Returns:
+            Optional[int]: Dispatcher handle, or None if the position does not exist.
+        """
+        handle = watch_position(self.dispatcher, self.positions, pos_id,
+                                lambda pos, reason, ltp: self.exit_position(pos, reason, ltp, candle, notify))
+        self._watches[pos_id] = (handle, candle)
+        return handle
+
+    def unwatch(self, pos_id: int) -> None:
+        """Drops a position's target/SL watch, e.g. once its buy was rejected or cancelled."""
+        handle, _ = self._watches.pop(pos_id, (None, None))
+        if handle is not None:
+            self.dispatcher.unregister(handle)
+
+    def rewatch(self, pos_id: int) -> Optional[int]:
+        """Watches a position moved back to 'open' after a failed sell, without a second Exit webhook."""
+        _, candle = self._watches.get(pos_id, (None, None))
+        return self.arm_position(pos_id, candle, notify=False)
+
+    def enter(self, trigger: tuple, ltp: float) -> None:
+        """
+        Entry for a trigger that broke out: opens a position, queues the buy and sends the Buy webhooks.
+
+        The stop is the trigger candle's Low and the target TARGET_RR times the risk
+        above the breakout price. The position is linked to its order before the order
+        is queued, so the fill price lands in the position, and a failed, rejected or
+        cancelled order closes the position as 'failed' and drops its watch. Runs on a
+        dispatcher worker and never waits for the broker or the webhooks.
+
+        Args:
+            trigger (tuple): Snapshot view of the trigger row.
+            ltp (float): Breakout price.
+        """
+        candle = trigger.TriggerCandle_Time
+        pos_id = self.positions.add(token=trigger.token, symbolname=trigger.symbolname,
+                                    option_type=trigger.option_type, buy_price=ltp, state='open', qty=ENTRY_QTY,
+                                    sl=trigger.Low, target=ltp + TARGET_RR * (ltp - trigger.Low), trail=TRAIL_POINTS,
+                                    exit_candle=candle)
+        self.fills.expect(order_key(trigger.token, candle, 'B'), pos_id)
+        order = place_buy_order(trigger.symbolname, ENTRY_QTY, trigger.token, candle, via=self.gateway)
+
+        def placed(future):
+            if future.exception() is not None:
+                print(f"Buy for {trigger.symbolname} failed: {future.exception()}")
+                if self.positions.transition(pos_id, 'open', 'failed'):
+                    self.unwatch(pos_id)
+
+        order.add_done_callback(placed)
+        if self.on_buy is not None:
+            self.on_buy(trigger.option_type)
+        self.arm_position(pos_id, candle)
+
+    def exit_position(self, position: tuple, reason: str, ltp: float, candle: Any = None,
+                      notify: bool = True) -> None:
+        """
+        Exit for a position whose target or stop was hit: queues the sell and sends the Exit webhooks.
+
+        watch_position has already moved the position to 'exiting'; PositionFills
+        closes it when the sell completes. If the sell fails, or the broker rejects or
+        cancels it, the position goes back to 'open' and is watched again, so the next
+        tick at the level retries the exit with the same idempotency key (without
+        sending the users' Exit webhooks a second time).
+
+        Args:
+            position (tuple): Snapshot view of the position.
+            reason (str): 'target' or 'sl'.
+            ltp (float): Price that hit the level.
+            candle (Any): Trigger candle of the entry, see arm_position.
+            notify (bool): Send the Exit webhooks.
+        """
+        print(f"Exiting {position.symbolname} on {reason} at {ltp}")
+        self._sell(position, candle)
+        if notify and self.on_exit is not None:
+            self.on_exit(position.option_type)
+
+    def resume_exit(self, pos_id: int) -> None:
+        """
+        Picks up the exit of a position restored as 'exiting' (the process stopped mid-exit).
+
+        The sell is sent again with the key of the first one (the position's
+        exit_candle), but the gateway looks the key up in the order books first: an
+        open sell is only linked, so its fill closes the position, a complete one
+        closes it at once, and a rejected, cancelled or missing one is placed again.
+        No second Exit webhook is sent.
+
+        Args:
+            pos_id (int): Id of the position.
+        """
+        position = self.positions.get(pos_id)
+        if position is None or position.state != 'exiting':
+            return
+        print(f"Resuming the exit of {position.symbolname}")
+        self._sell(position, None, recheck=True)
+
+    def _sell(self, position: tuple, candle: Any, recheck: bool = False) -> None:
+        if candle is None:
+            candle = current_candle() if position.exit_candle is None else position.exit_candle
+        # A retried or resumed exit keeps this order's key
+        self._watches[position.id] = (None, candle)
+        self.positions.update(position.id, exit_candle=candle)
+        self.fills.expect(order_key(position.token, candle, 'S'), position.id)
+        order = place_target_or_sl_order(position.symbolname, position.qty, position.token, candle,
+                                         via=self.gateway, recheck=recheck)
+
+        def placed(future):
+            if future.exception() is not None:
+                print(f"Sell for {position.symbolname} failed: {future.exception()}")
+                if self.positions.transition(position.id, 'exiting', 'open'):
+                    self.rewatch(position.id)
+                return
+            ret = future.result()
+            if STATUS_MAP.get(str(ret.get('status', '')).upper()) == COMPLETE:
+                # Found already complete in the broker's order book: no fill will be streamed
+                price = ret.get('avgprc')
+                self.positions.transition(position.id, 'exiting', 'closed',
+                                          sell_price=float(price) if price else None)
+
+        order.add_done_callback(placed)
+
+
+def attach(ctx: Any) -> Strategy:
+    """
+    engine.SHARD_STRATEGY entry point: runs the strategy on an engine shard.
+
+    The shard's ShardContext supplies the stores, indicator engine and dispatcher,
+    and is itself the order gateway (its orders go through the coordinator's
+    OrderGateway). Buy/Exit webhooks are sent through the coordinator as well.
+
+    Args:
+        ctx (engine.ShardContext): The shard, in its worker process.
+
+    Returns:
+        Strategy: The shard's strategy, scanning once per closed 5-minute candle.
+    """
+    strategy = Strategy(ctx.chain_index, ctx.indicators, ctx.dispatcher, ctx.positions, ctx.triggers,
+                        ctx.position_fills, gateway=ctx,
+                        on_buy=lambda option: ctx.emit_webhook(f"{option}_Buy"),
+                        on_exit=lambda option: ctx.emit_webhook(f"{option}_Exit"))
+    ctx.indicators.add_listener(strategy.scan)
+    return strategy
@@ -0,0 +1,229 @@
+"""
+strategy_dispatch.py - Event-driven per-token strategy dispatch.
+
+Strategy code registers callbacks for the tokens it cares about (an open
+position's target/SL/trail check, a trigger row's breakout check) and
+TickDispatcher.on_tick, called from event_handler_feed_update, runs only the
+handlers of the token that ticked. Handlers run on a bounded worker pool so the
+websocket thread never blocks. Ticks for one token are handled in order, one
+batch at a time; if a token ticks again while its handlers are running, only
+its latest tick is kept (conflation), which bounds the queue to one job per
+token.
+"""
+
+import itertools
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+from metrics import registry
+from stores import PositionStore, TriggerStore
+
+TickHandler = Callable[[str, float, int], None]  # (token, ltp, ts_ns)
+
+_dispatch_latency = registry.histogram('strategy_dispatch', "Tick receipt to the token's handlers done")
+_decision_latency = registry.histogram('decision', "Tick receipt to a strategy entry/exit decision")
+_current = threading.local()  # Receipt time of the tick a worker is handling
+
+
+def tick_recv_ns() -> int:
+    """Returns perf_counter_ns() at receipt of the tick the calling handler is processing (0 outside handlers)."""
+    return getattr(_current, 'recv_ns', 0)
+
+
+def _record_decision() -> None:
+    recv_ns = tick_recv_ns()
+    if recv_ns:
+        _decision_latency.record(time.perf_counter_ns() - recv_ns)
+
+
+class TickDispatcher:
+    """Runs per-token tick handlers on a worker pool."""
+
+    def __init__(self, workers: int = 4, executor: Optional[Executor] = None) -> None:
+        """
+        Args:
+            workers (int): Worker threads that run handlers.
+            executor (Optional[Executor]): Runs the handler jobs instead of a pool of `workers`
+                threads (e.g. replay.InlineExecutor for a deterministic replay).
+        """
+        self._pool = executor or ThreadPoolExecutor(max_workers=workers, thread_name_prefix="strategy")
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._handlers: Dict[str, Dict[int, TickHandler]] = {}
+        self._owner: Dict[int, str] = {}
+        self._latest: Dict[str, Tuple[float, int, int]] = {}  # Tokens with a queued/running job
+        self.dispatched = 0
+        self.conflated = 0
+        self.errors = 0
+
+    def register(self, token: str, handler: TickHandler) -> int:
+        """Registers a handler for a token's ticks.
+
+        Args:
+            token (str): Broker token.
+            handler (TickHandler): Called as handler(token, ltp, ts_ns) on a worker thread.
+
+        Returns:
+            int: Handle for unregister().
+        """
+        token = str(token)
+        with self._lock:
+            handle = next(self._ids)
+            # Copy-on-write so on_tick can read the dict without the lock
+            handlers = dict(self._handlers.get(token, {}))
+            handlers[handle] = handler
+            self._handlers[token] = handlers
+            self._owner[handle] = token
+        return handle
+
+    def unregister(self, handle: int) -> None:
+        """Removes a handler; safe to call from inside the handler itself."""
+        with self._lock:
+            token = self._owner.pop(handle, None)
+            if token is None:
+                return
+            handlers = dict(self._handlers[token])
+            del handlers[handle]
+            if handlers:
+                self._handlers[token] = handlers
+            else:
+                del self._handlers[token]
+
+    def on_tick(self, token: str, ltp: float, ts_ns: int, recv_ns: Optional[int] = None) -> None:
+        """Schedules the token's handlers; returns immediately. Called on the websocket thread.
+
+        Args:
+            token (str): Broker token.
+            ltp (float): Last traded price.
+            ts_ns (int): Tick time (epoch ns).
+            recv_ns (Optional[int]): perf_counter_ns() when the tick was received; now if omitted.
+        """
+        if token not in self._handlers:
+            return
+        if recv_ns is None:
+            recv_ns = time.perf_counter_ns()
+        with self._lock:
+            queued = token in self._latest
+            # None means the job is running with nothing waiting: this tick will still be handled
+            if self._latest.get(token) is not None:
+                self.conflated += 1
+            self._latest[token] = (ltp, ts_ns, recv_ns)
+            if queued:
+                return
+        self._pool.submit(self._run, token)
+
+    def _run(self, token: str) -> None:
+        while True:
+            with self._lock:
+                tick = self._latest.get(token)
+                if tick is None:
+                    return
+                # Leave a sentinel so ticks arriving meanwhile are conflated into the next pass
+                self._latest[token] = None
+                handlers = self._handlers.get(token, {})
+            ltp, ts_ns, recv_ns = tick
+            _current.recv_ns = recv_ns
+            for handler in tuple(handlers.values()):
+                try:
+                    handler(token, ltp, ts_ns)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Error in strategy handler for {token}: {e}")
+            _current.recv_ns = 0
+            _dispatch_latency.record(time.perf_counter_ns() - recv_ns)
+            self.dispatched += 1
+            with self._lock:
+                if self._latest.get(token) is None:
+                    del self._latest[token]
+                    return
+
+    def shutdown(self) -> None:
+        """Stops the worker pool after running queued handlers."""
+        self._pool.shutdown(wait=True)
+
+
+def watch_position(dispatcher: TickDispatcher, positions: PositionStore, pos_id: int,
+                   on_exit: Callable[[tuple, str, float], None],
+                   open_state: str = 'open', exit_state: str = 'exiting') -> Optional[int]:
+    """Registers target/SL/trail checks for an open position.
+
+    On every tick of the position's token the stop is trailed up to ltp - trail
+    (when trail is set), and once ltp reaches target or falls to the stop the
+    position is moved from `open_state` to `exit_state` and on_exit(view, reason, ltp)
+    is called exactly once. The handler unregisters itself after the exit.
+
+    Args:
+        dispatcher (TickDispatcher): Dispatcher to register on.
+        positions (PositionStore): Store holding the position.
+        pos_id (int): Position id.
+        on_exit (Callable[[tuple, str, float], None]): Exit action ('target' or 'sl' reason).
+        open_state (str): State of a live position.
+        exit_state (str): State set when an exit fires.
+
+    Returns:
+        Optional[int]: Dispatcher handle, or None if the position does not exist.
+    """
+    pos = positions.get(pos_id)
+    if pos is None:
+        return None
+    handle = None
+
+    def check(token: str, ltp: float, ts_ns: int) -> None:
+        pos = positions.get(pos_id)
+        if pos is None or pos.state != open_state:
+            dispatcher.unregister(handle)
+            return
+        if pos.trail and pos.sl is not None and ltp - pos.trail > pos.sl:
+            pos = positions.update(pos_id, sl=ltp - pos.trail)
+        reason = None
+        if pos.target is not None and ltp >= pos.target:
+            reason = 'target'
+        elif pos.sl is not None and ltp <= pos.sl:
+            reason = 'sl'
+        if reason and positions.transition(pos_id, open_state, exit_state):
+            _record_decision()
+            dispatcher.unregister(handle)
+            on_exit(positions.get(pos_id), reason, ltp)
+
+    handle = dispatcher.register(pos.token, check)
+    return handle
+
+
+def watch_trigger(dispatcher: TickDispatcher, triggers: TriggerStore, trigger_id: int,
+                  on_breakout: Callable[[tuple, float], None],
+                  pending_state: str = 'pending', fired_state: str = 'triggered') -> Optional[int]:
+    """Registers a breakout check for a trigger row.
+
+    When ltp rises above the trigger candle's High the row is moved from
+    `pending_state` to `fired_state` and on_breakout(view, ltp) is called exactly once.
+
+    Args:
+        dispatcher (TickDispatcher): Dispatcher to register on.
+        triggers (TriggerStore): Store holding the trigger row.
+        trigger_id (int): Trigger id.
+        on_breakout (Callable[[tuple, float], None]): Entry action.
+        pending_state (str): State of a trigger awaiting breakout.
+        fired_state (str): State set when the breakout fires.
+
+    Returns:
+        Optional[int]: Dispatcher handle, or None if the trigger does not exist.
+    """
+    trig = triggers.get(trigger_id)
+    if trig is None:
+        return None
+    handle = None
+
+    def check(token: str, ltp: float, ts_ns: int) -> None:
+        trig = triggers.get(trigger_id)
+        if trig is None or trig.State != pending_state:
+            dispatcher.unregister(handle)
+            return
+        if ltp > trig.High and triggers.transition(trigger_id, pending_state, fired_state):
+            _record_decision()
+            dispatcher.unregister(handle)
+            on_breakout(triggers.get(trigger_id), ltp)
+
+    handle = dispatcher.register(trig.token, check)
+    return handle
@@ -0,0 +1,195 @@
+"""
+subscriptions.py - Strike-window subscription manager that follows the underlying.
+
+The manager keeps the websocket subscribed to the CE/PE strikes within
+`window` points of the underlying (NIFTY, NSE|26000) and re-centers when the
+underlying has moved `hysteresis` points from the current center. Only the
+difference between the old and new window is sent, as batched subscribe and
+unsubscribe calls. The ChainIndex is rebuilt over the new window and the
+unsubscribed tokens are cleared from the TickStore, so strike selection never
+picks a stale price. Tokens with open positions or pending triggers are pinned
+and never unsubscribed.
+
+Re-centers run on the manager's own thread, not the dispatcher worker that
+sees the underlying's tick, and the candle seeding of added strikes (REST
+calls) holds no lock.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import pandas as pd
+import config
+
+from chain_index import ChainIndex
+from metrics import registry
+from tick_store import TickStore
+
+STRIKE_WINDOW: float = getattr(config, "STRIKE_WINDOW", 600)
+STRIKE_STEP: int = getattr(config, "STRIKE_STEP", 50)
+RECENTER_HYSTERESIS: float = getattr(config, "RECENTER_HYSTERESIS", 100)
+SUBSCRIBE_BATCH: int = getattr(config, "SUBSCRIBE_BATCH", 100)  # Instruments per subscribe call
+
+
+class SubscriptionManager:
+    """Keeps the subscribed CE/PE window centered on the underlying."""
+
+    def __init__(self, api, chains: Dict[str, pd.DataFrame], chain_index: ChainIndex, store: TickStore,
+                 underlying: str = "NSE|26000", window: float = STRIKE_WINDOW, step: int = STRIKE_STEP,
+                 hysteresis: float = RECENTER_HYSTERESIS,
+                 pinned: Optional[Callable[[], Iterable[str]]] = None,
+                 on_added: Optional[Callable[[List[str]], None]] = None) -> None:
+        """
+        Args:
+            api: Broker API with subscribe/unsubscribe (ShoonyaApiPy).
+            chains (Dict[str, pd.DataFrame]): Option type -> the expiry's full symbol master
+                rows ('Exchange', 'Token', 'StrikePrice', 'TradingSymbol').
+            chain_index (ChainIndex): Index rebuilt over the subscribed window.
+            store (TickStore): Tick store whose unsubscribed tokens are cleared.
+            underlying (str): "EXCHANGE|token" of the underlying index.
+            window (float): Points either side of the center to subscribe.
+            step (int): Strike interval the center is rounded to.
+            hysteresis (float): Points the underlying must move from the center to re-center.
+            pinned (Optional[Callable[[], Iterable[str]]]): Returns tokens that must stay
+                subscribed (open positions, pending triggers).
+            on_added (Optional[Callable[[List[str]], None]]): Called with newly added tokens
+                before they are subscribed, e.g. seed_candles.
+        """
+        self.api = api
+        self.chains = {option: info.sort_values('StrikePrice').reset_index(drop=True)
+                       for option, info in chains.items()}
+        self.chain_index = chain_index
+        self.store = store
+        self.underlying = underlying
+        self.underlying_token = underlying.split('|')[1]
+        self.window = window
+        self.step = step
+        self.hysteresis = hysteresis
+        self.pinned = pinned
+        self.on_added = on_added
+        self.center: Optional[float] = None
+        self.subscribed: Set[str] = set()  # "EXCHANGE|token" of the option window
+        self.recenters = 0
+        self._lock = threading.Lock()           # subscribed/center and the subscribe calls
+        self._recenter_lock = threading.Lock()  # One window diff/apply at a time; not held across on_added
+        self._queue_lock = threading.Lock()
+        self._queued_ltp: Optional[float] = None  # Price of the re-center waiting for the recenter thread
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recenter")
+        registry.expose('subscribed_instruments', lambda: len(self.subscribed) + 1, 'gauge',
+                        "Instruments subscribed on the websocket (option window + underlying)")
+        registry.expose('strike_window_recenters_total', lambda: self.recenters, 'counter',
+                        "Times the strike window was re-centered on the underlying")
+
+    def _window(self, center: float) -> Dict[str, pd.DataFrame]:
+        return {option: info[(info['StrikePrice'] - center).abs() <= self.window]
+                for option, info in self.chains.items()}
+
+    @staticmethod
+    def _instruments(rows: pd.DataFrame) -> List[str]:
+        return (rows['Exchange'].astype(str) + '|' + rows['Token'].astype(str)).tolist()
+
+    def _send(self, method: Callable, instruments: List[str]) -> None:
+        for i in range(0, len(instruments), SUBSCRIBE_BATCH):
+            method(instruments[i:i + SUBSCRIBE_BATCH])
+
+    def window_tokens(self, ltp: float) -> List[str]:
+        """Returns the option tokens the window around `ltp` would subscribe."""
+        window = self._window(round(ltp / self.step) * self.step)
+        return [token for rows in window.values() for token in rows['Token'].astype(str)]
+
+    def start(self, ltp: float, seed: bool = True) -> None:
+        """Subscribes the underlying and the window around `ltp`.
+
+        Args:
+            ltp (float): Current underlying price.
+            seed (bool): Call on_added for the initial window; pass False if the
+                caller already warmed up window_tokens(ltp).
+        """
+        self.api.subscribe(self.underlying)
+        self.recenter(ltp, seed)
+
+    def resubscribe(self) -> None:
+        """Re-sends the current subscriptions, e.g. after the websocket reconnects."""
+        with self._lock:
+            self.api.subscribe(self.underlying)
+            self._send(self.api.subscribe, sorted(self.subscribed))
+
+    def on_tick(self, token: str, ltp: float, ts_ns: int) -> None:
+        """TickDispatcher handler for the underlying: queues a re-center once it has moved past the hysteresis.
+
+        The re-center runs on the manager's thread, so the dispatcher worker never
+        waits for subscribe calls or candle seeding. Ticks arriving while one is
+        queued only update the price it will use.
+        """
+        if self.center is not None and abs(ltp - self.center) < self.hysteresis:
+            return
+        with self._queue_lock:
+            queued = self._queued_ltp is not None
+            self._queued_ltp = ltp
+        if not queued:
+            self._pool.submit(self._recenter_queued)
+
+    def _recenter_queued(self) -> None:
+        with self._queue_lock:
+            ltp, self._queued_ltp = self._queued_ltp, None
+        try:
+            self.recenter(ltp)
+        except Exception as e:
+            print(f"Strike window re-center on {ltp} failed: {e}")
+
+    def _wanted(self, center: float) -> Tuple[Dict[str, pd.DataFrame], Set[str]]:
+        """Returns the window rows per option type (pinned strikes included) and their instruments."""
+        window = self._window(center)
+        wanted = set()
+        for rows in window.values():
+            wanted.update(self._instruments(rows))
+        if self.pinned is not None:
+            pinned = {str(t) for t in self.pinned()}
+            for option, info in self.chains.items():
+                keep = info[info['Token'].astype(str).isin(pinned)]
+                wanted.update(self._instruments(keep))
+                window[option] = pd.concat([window[option], keep]).drop_duplicates('Token')
+        return window, wanted
+
+    def recenter(self, ltp: float, seed: bool = True) -> bool:
+        """Moves the window to the strike nearest `ltp`, sending only the subscription diff.
+
+        Args:
+            ltp (float): Current underlying price.
+            seed (bool): Call on_added for the added tokens.
+
+        Returns:
+            bool: True if the window changed.
+        """
+        center = round(ltp / self.step) * self.step
+        with self._recenter_lock:
+            if center == self.center:
+                return False
+            _, wanted = self._wanted(center)
+            added = sorted(wanted - self.subscribed)
+        # Seeding makes REST calls; no lock is held, so neither a reconnect's resubscribe
+        # nor another re-center waits for it
+        if added and seed and self.on_added is not None:
+            self.on_added([i.split('|')[1] for i in added])
+        with self._recenter_lock:
+            if center == self.center:
+                return False
+            # Pins or the subscriptions may have changed while seeding: diff against the current state
+            window, wanted = self._wanted(center)
+            added = sorted(wanted - self.subscribed)
+            removed = sorted(self.subscribed - wanted)
+            with self._lock:
+                self._send(self.api.subscribe, added)
+                for option, rows in window.items():
+                    self.chain_index.set_chain(option, rows)
+                self._send(self.api.unsubscribe, removed)
+                self.store.clear(i.split('|')[1] for i in removed)
+
+                self.subscribed = wanted
+                previous, self.center = self.center, center
+                if previous is not None:
+                    self.recenters += 1
+        print(f"Strike window centered on {center} (underlying {ltp}): "
+              f"+{len(added)} -{len(removed)}, {len(wanted)} option instruments subscribed")
+        return True
@@ -0,0 +1,190 @@
+"""
+symbol_master.py - On-disk cache of the Shoonya NFO symbol master.
+
+The master is downloaded at most once per trading day and stored as one .npy
+file per column (string columns with few distinct values as categorical codes),
+with rows sorted by Symbol/Expiry/OptionType/StrikePrice. Every underlying and
+underlying/expiry pair is therefore a contiguous row range recorded in
+meta.json, so a warm start memory-maps the columns and reads only the slice it
+needs. Set SYMBOL_MASTER_OFFLINE in config (or pass offline=True) to run from
+the newest cached copy without touching the network.
+"""
+
+import json
+import os
+import shutil
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import config
+
+NFO_SYMBOLS_URL = "https://api.shoonya.com/NFO_symbols.txt.zip"
+CACHE_DIR: str = getattr(config, "SYMBOL_CACHE_DIR", os.path.join("cache", "nfo_symbols"))
+OFFLINE: bool = getattr(config, "SYMBOL_MASTER_OFFLINE", False)
+SORT_COLUMNS = ["Symbol", "Expiry", "OptionType", "StrikePrice"]
+CATEGORY_RATIO = 0.5  # Store a string column as categorical below this unique/rows ratio
+
+
+def trading_day(day: Optional[date] = None) -> date:
+    """Returns the trading day a cache written on `day` belongs to (weekends roll back to Friday)."""
+    day = day or date.today()
+    return day - timedelta(days=max(0, day.weekday() - 4))
+
+
+def _slice_key(symbol: str, expiry: Optional[date] = None) -> str:
+    return symbol if expiry is None else f"{symbol}|{expiry.isoformat()}"
+
+
+def build_cache(df: pd.DataFrame, path: str) -> None:
+    """Writes a parsed symbol master to `path` in the columnar cache layout.
+
+    Args:
+        df (pd.DataFrame): Raw symbol master as read from NFO_symbols.txt.
+        path (str): Target directory for this trading day.
+    """
+    df = df.loc[:, ~df.columns.str.startswith("Unnamed")].copy()
+    df["Expiry"] = pd.to_datetime(df["Expiry"]).values.astype("datetime64[D]")
+    df = df.sort_values(SORT_COLUMNS, kind="stable").reset_index(drop=True)
+
+    tmp = f"{path}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)  # Leftover of an interrupted build
+    os.makedirs(tmp)
+    columns: Dict[str, dict] = {}
+    for name in df.columns:
+        col = df[name]
+        if not (pd.api.types.is_numeric_dtype(col) or pd.api.types.is_datetime64_any_dtype(col)):
+            if col.nunique() < CATEGORY_RATIO * len(col):
+                cat = col.astype("category")
+                np.save(os.path.join(tmp, f"{name}.npy"), cat.cat.codes.to_numpy())
+                columns[name] = {"kind": "category", "categories": cat.cat.categories.tolist()}
+                continue
+            np.save(os.path.join(tmp, f"{name}.npy"), col.to_numpy(dtype=str))
+        else:
+            np.save(os.path.join(tmp, f"{name}.npy"), col.to_numpy())
+        columns[name] = {"kind": "plain"}
+
+    slices: Dict[str, Tuple[int, int]] = {}
+    symbols = df["Symbol"].to_numpy()
+    expiries = df["Expiry"].to_numpy()
+    starts = np.flatnonzero(np.r_[True, (symbols[1:] != symbols[:-1]) | (expiries[1:] != expiries[:-1])])
+    ends = np.r_[starts[1:], len(df)]
+    for start, stop in zip(starts.tolist(), ends.tolist()):
+        symbol = symbols[start]
+        expiry = pd.Timestamp(expiries[start]).date()
+        slices[_slice_key(symbol, expiry)] = (start, stop)
+        first, _ = slices.get(symbol, (start, stop))
+        slices[symbol] = (first, stop)
+
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({"rows": len(df), "columns": columns, "slices": slices}, f)
+    # os.replace cannot overwrite a directory, e.g. a same-day copy left without meta.json
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    try:
+        os.replace(tmp, path)
+    except OSError as e:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise OSError(f"Could not move the symbol master cache into {path}: {e}") from e
+
+
+class SymbolMaster:
+    """Memory-mapped, slice-addressable view of one day's cached symbol master."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.rows: int = meta["rows"]
+        self.columns: Dict[str, dict] = meta["columns"]
+        self.slices: Dict[str, Tuple[int, int]] = {k: tuple(v) for k, v in meta["slices"].items()}
+        self._arrays: Dict[str, np.ndarray] = {}
+
+    def _column(self, name: str) -> np.ndarray:
+        arr = self._arrays.get(name)
+        if arr is None:
+            arr = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+            self._arrays[name] = arr
+        return arr
+
+    def expiries(self, symbol: str, include_expired: bool = False) -> List[date]:
+        """Returns the cached expiries for an underlying, nearest first.
+
+        Args:
+            symbol (str): Underlying, e.g. "NIFTY".
+            include_expired (bool): Also return expiries before today, which an older
+                (offline or fallback) cache still lists.
+
+        Returns:
+            List[date]: Expiry dates, empty if none is left.
+        """
+        prefix = f"{symbol}|"
+        today = date.today()
+        return sorted(d for d in (date.fromisoformat(k[len(prefix):]) for k in self.slices if k.startswith(prefix))
+                      if include_expired or d >= today)
+
+    def load_slice(self, symbol: str, expiry: Optional[date] = None) -> pd.DataFrame:
+        """Loads the rows of one underlying (optionally one expiry) only.
+
+        Args:
+            symbol (str): Underlying, e.g. "NIFTY".
+            expiry (Optional[date]): Restrict to this expiry.
+
+        Returns:
+            pd.DataFrame: Symbol master rows with categorical string columns and
+            'Expiry' as datetime.date values, or an empty frame if not cached.
+        """
+        start, stop = self.slices.get(_slice_key(symbol, expiry), (0, 0))
+        data = {}
+        for name, spec in self.columns.items():
+            values = np.array(self._column(name)[start:stop])
+            if spec["kind"] == "category":
+                data[name] = pd.Categorical.from_codes(values, categories=spec["categories"])
+            elif name == "Expiry":
+                data[name] = values.astype("datetime64[D]").astype(object)
+            else:
+                data[name] = values
+        return pd.DataFrame(data)
+
+
+def _cached_days() -> List[str]:
+    if not os.path.isdir(CACHE_DIR):
+        return []
+    return sorted(d for d in os.listdir(CACHE_DIR)
+                  if not d.endswith(".tmp") and os.path.exists(os.path.join(CACHE_DIR, d, "meta.json")))
+
+
+def load_master(offline: Optional[bool] = None) -> SymbolMaster:
+    """Returns today's cached symbol master, downloading it first if needed.
+
+    Args:
+        offline (Optional[bool]): Never download; use the newest cached copy.
+            Defaults to SYMBOL_MASTER_OFFLINE from config.
+
+    Returns:
+        SymbolMaster: The cached master.
+
+    Raises:
+        FileNotFoundError: If running offline and nothing has been cached yet.
+    """
+    offline = OFFLINE if offline is None else offline
+    today = trading_day().isoformat()
+    cached = _cached_days()
+    if offline or (cached and cached[-1] >= today):
+        if not cached:
+            raise FileNotFoundError(f"No cached symbol master in {CACHE_DIR}")
+        return SymbolMaster(os.path.join(CACHE_DIR, cached[-1]))
+
+    path = os.path.join(CACHE_DIR, today)
+    try:
+        build_cache(pd.read_csv(NFO_SYMBOLS_URL), path)
+    except Exception as e:
+        if not cached:
+            raise
+        print(f"Symbol master download failed, using cached {cached[-1]}: {e}")
+        return SymbolMaster(os.path.join(CACHE_DIR, cached[-1]))
+    for old in cached:
+        # Keep only the newest copy around
+        shutil.rmtree(os.path.join(CACHE_DIR, old), ignore_errors=True)
+    return SymbolMaster(path)
@@ -1,36 +1,209 @@
+import re
 import threading
+import time
 import requests
 import config
-from typing import NoReturn
+from collections import OrderedDict, deque
+from typing import Deque, List, Optional, Tuple
 
 # Load configuration
-CHAT_ID: str = config.chat_id 
-BOT_TOKEN: str = config.bot_token 
+CHAT_ID: str = config.chat_id
+BOT_TOKEN: str = config.bot_token
 
-def send_message1(msg: str) -> NoReturn:
+# Priorities for send_message
+CRITICAL: int = 0  # Sent ahead of everything else, never coalesced or dropped
+NORMAL: int = 1
+
+MAX_QUEUE: int = 500        # Pending normal messages before new ones are dropped
+COALESCE_WINDOW: float = 2.0  # Seconds to collect similar messages into one digest
+MIN_INTERVAL: float = 1.0   # Telegram: at most ~1 message per second per chat
+PER_MINUTE: int = 20        # Telegram: at most 20 messages per minute per group chat
+MAX_LENGTH: int = 4096      # Telegram message length limit
+DIGEST_EXAMPLES: int = 3    # Sample messages shown per digest group
+
+_NUMBERS = re.compile(r"\d+(\.\d+)?")
+
+
+def send_message1(msg: str, session: Optional[requests.Session] = None) -> Optional[requests.Response]:
     """Sends a message to a Telegram chat using the Telegram Bot API.
-    
+
     Args:
         msg (str): The message text to be sent to the Telegram chat.
-    
-    Raises:
-        Exception: If the request to Telegram API fails, an error is printed.
+        session (Optional[requests.Session]): Session to reuse; a one-off request is made if omitted.
+
+    Returns:
+        Optional[requests.Response]: The API response, or None if the request failed (the
+        error is printed).
     """
     url: str = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
     data: dict[str, str] = {
         "chat_id": CHAT_ID,
-        "text": msg
+        "text": msg[:MAX_LENGTH]
     }
     try:
-        requests.post(url, data=data)
+        return (session or requests).post(url, data=data, timeout=10)
     except Exception as e:
         print(f"Failed to send message: {e}")
+        return None
+
+
+class TelegramNotifier:
+    """Single background sender with a bounded queue, digests and Telegram rate limits.
+
+    Normal messages wait up to COALESCE_WINDOW so that messages with the same key
+    (by default the text with numbers masked) are merged into one digest. Critical
+    messages skip the queue and the window. When MAX_QUEUE normal messages are
+    pending, new ones are dropped and counted instead of blocking the caller.
+    """
+
+    def __init__(self) -> None:
+        self.session = requests.Session()
+        self.enabled = True  # When False, messages are counted as dropped and never sent
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self._cond = threading.Condition()
+        self._urgent: Deque[str] = deque()
+        self._pending: Deque[Tuple[float, str, str]] = deque()
+        self._sent_times: Deque[float] = deque(maxlen=PER_MINUTE)
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, msg: str, priority: int = NORMAL, key: Optional[str] = None) -> bool:
+        """Queues a message without blocking.
+
+        Args:
+            msg (str): Message text.
+            priority (int): CRITICAL or NORMAL.
+            key (Optional[str]): Coalescing key; messages sharing it within the window are
+                sent as one digest. Defaults to the message with numbers masked.
+
+        Returns:
+            bool: False if the message was dropped because the queue is full.
+        """
+        if not self.enabled:
+            self.dropped += 1
+            return False
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="telegram-notifier", daemon=True)
+                self._thread.start()
+            if priority == CRITICAL:
+                self._urgent.append(msg)
+            elif len(self._pending) >= MAX_QUEUE:
+                self.dropped += 1
+                return False
+            else:
+                self._pending.append((time.monotonic(), key or _NUMBERS.sub("#", msg), msg))
+            self._cond.notify()
+        return True
+
+    def _next(self) -> Tuple[Optional[str], List[Tuple[float, str, str]]]:
+        """Blocks until a critical message or a ripe batch of normal messages is available."""
+        with self._cond:
+            while True:
+                if self._urgent:
+                    return self._urgent.popleft(), []
+                if self._pending:
+                    wait = self._pending[0][0] + COALESCE_WINDOW - time.monotonic()
+                    if wait <= 0:
+                        batch = list(self._pending)
+                        self._pending.clear()
+                        return None, batch
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+
+    def _digest(self, batch: List[Tuple[float, str, str]]) -> List[str]:
+        """Merges a batch into as few messages as fit Telegram's length limit."""
+        groups: "OrderedDict[str, List[str]]" = OrderedDict()
+        for _, key, msg in batch:
+            groups.setdefault(key, []).append(msg)
+        parts = []
+        for msgs in groups.values():
+            if len(msgs) == 1:
+                parts.append(msgs[0])
+                continue
+            self.coalesced += len(msgs) - 1
+            lines = msgs[:DIGEST_EXAMPLES]
+            if len(msgs) > DIGEST_EXAMPLES:
+                lines.append(f"...and {len(msgs) - DIGEST_EXAMPLES} more")
+            parts.append(f"[{len(msgs)}x]\n" + "\n".join(lines))
+        messages, current = [], ""
+        for part in parts:
+            if current and len(current) + len(part) + 2 > MAX_LENGTH:
+                messages.append(current)
+                current = ""
+            current = f"{current}\n\n{part}" if current else part
+        if current:
+            messages.append(current)
+        return messages
+
+    def _wait_for_slot(self) -> None:
+        """Sleeps until sending another message stays within the per-chat limits."""
+        now = time.monotonic()
+        delay = 0.0
+        if self._sent_times:
+            delay = self._sent_times[-1] + MIN_INTERVAL - now
+        if len(self._sent_times) == PER_MINUTE:
+            delay = max(delay, self._sent_times[0] + 60 - now)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _send(self, msg: str) -> None:
+        for _ in range(2):
+            self._wait_for_slot()
+            self._sent_times.append(time.monotonic())
+            response = send_message1(msg, self.session)
+            if response is None:
+                return
+            if response.status_code != 429:
+                self.sent += 1
+                return
+            # Rate limited by Telegram: honour retry_after once, then give up
+            try:
+                retry_after = response.json()["parameters"]["retry_after"]
+            except Exception:
+                retry_after = 5
+            time.sleep(retry_after)
+        print(f"Dropping Telegram message after rate limiting: {msg[:80]}")
+        self.dropped += 1
+
+    def _send_urgent(self) -> None:
+        """Sends any critical messages that arrived while a digest was going out."""
+        while True:
+            with self._cond:
+                if not self._urgent:
+                    return
+                msg = self._urgent.popleft()
+            self._send(msg)
+
+    def _run(self) -> None:
+        while True:
+            urgent, batch = self._next()
+            try:
+                if urgent is not None:
+                    self._send(urgent)
+                else:
+                    for msg in self._digest(batch):
+                        self._send_urgent()
+                        self._send(msg)
+            except Exception as e:
+                print(f"Telegram notifier error: {e}")
+
+
+# Shared notifier used by send_message
+notifier = TelegramNotifier()
+
+
+def send_message(msg: str, priority: int = NORMAL, key: Optional[str] = None) -> bool:
+    """Queues a message for the background Telegram notifier without blocking.
 
-def send_message(msg: str) -> NoReturn:
-    """Sends a message in a separate thread to avoid blocking the main script.
-    
     Args:
         msg (str): The message text to be sent asynchronously.
+        priority (int): CRITICAL to send ahead of queued messages, NORMAL otherwise.
+        key (Optional[str]): Coalescing key for digests (see TelegramNotifier.submit).
+
+    Returns:
+        bool: False if the message was dropped because the queue is full.
     """
-    thread = threading.Thread(target=send_message1, args=(msg,))
-    thread.start()
+    return notifier.submit(msg, priority, key)
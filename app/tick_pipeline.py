@@ -0,0 +1,111 @@
+"""
+tick_pipeline.py - Batch processing of raw ticks drained from the ingestion ring.
+
+TickPipeline holds the components a tick passes through (recorder, candle
+builder, indicator engine, tick store, strategy dispatcher, startup readiness)
+as constructor arguments instead of module globals. websocket_handler builds
+the live one over glb's instances; replay.py and the latency benchmark build
+their own over fresh stores, without importing glb.
+"""
+
+import time
+from typing import List, Optional
+
+from candles import CandleBuilder
+from indicators import IndicatorEngine
+from metrics import registry
+from startup import FeedReadiness
+from strategy_dispatch import TickDispatcher
+from tick_recorder import TickRecorder
+from tick_ring import RawTick
+from tick_store import NS_PER_SEC, TickStore
+
+_conflated = registry.counter('ticks_batch_conflated_total',
+                              "Ticks superseded within a consumer batch (store/strategy skipped)")
+_dropped = registry.counter('ticks_dropped_total', "Ticks that failed processing")
+_feed_lag = registry.histogram('feed_lag', "Exchange time ('ft', 1s resolution) to processing")
+_queue_wait = registry.histogram('tick_queue_wait', "Socket receipt to the consumer picking the tick up")
+_handler_latency = registry.histogram('tick_handler', "Socket receipt to the tick's processing done")
+
+
+class TickPipeline:
+    """Applies batches of raw ticks to the stores and strategy handlers."""
+
+    def __init__(self, store: TickStore, candles: CandleBuilder, indicators: IndicatorEngine,
+                 dispatcher: TickDispatcher, recorder: Optional[TickRecorder] = None,
+                 readiness: Optional[FeedReadiness] = None) -> None:
+        """
+        Args:
+            store (TickStore): Latest price per token.
+            candles (CandleBuilder): Fed every tick.
+            indicators (IndicatorEngine): Told when a tick closes a candle.
+            dispatcher (TickDispatcher): Runs the strategy handlers of the tokens that ticked.
+            recorder (Optional[TickRecorder]): Raw tick log for replay; nothing is recorded if omitted.
+            readiness (Optional[FeedReadiness]): Told which tokens ticked while startup waits.
+        """
+        self.store = store
+        self.candles = candles
+        self.indicators = indicators
+        self.dispatcher = dispatcher
+        self.recorder = recorder
+        self.readiness = readiness
+
+    def process(self, batch: List[RawTick]) -> None:
+        """
+        Process a batch of raw ticks drained from tick_ring.
+
+        Every tick is recorded for replay and fed into the candle builder, so
+        candles see every price. For each token only its latest tick in the batch
+        then updates the tick store (an epoch-ns timestamp from 'ft', or receipt
+        time if it is missing) and is handed to the strategy handlers; the earlier
+        ones are counted as conflated. When the consumer keeps up batches hold one
+        tick and nothing is conflated. A closed 5-minute candle lets the indicator
+        engine run its once-per-interval scan.
+
+        Args:
+            batch (List[RawTick]): (recv_ns, tick_data) pairs in arrival order, recv_ns from perf_counter_ns().
+        """
+        picked_ns = time.perf_counter_ns()
+        wall_offset = time.time_ns() - picked_ns  # perf_counter_ns -> epoch ns
+        recorder = self.recorder
+        latest = {}
+        parsed = 0
+        closed_ns = None
+        for recv_ns, tick_data in batch:
+            _queue_wait.record(picked_ns - recv_ns)
+            try:
+                if recorder is not None:
+                    recorder.record(tick_data, recv_ns + wall_offset)
+                if 'lp' in tick_data and 'tk' in tick_data:
+                    # Get timestamp, default to receipt time if 'ft' is missing
+                    try:
+                        ts_ns = int(tick_data['ft']) * NS_PER_SEC
+                        _feed_lag.record(recv_ns + wall_offset - ts_ns)
+                    except (KeyError, ValueError, TypeError):
+                        ts_ns = recv_ns + wall_offset
+
+                    ltp = float(tick_data['lp'])
+                    if self.candles.on_tick(tick_data['tk'], ltp, ts_ns):
+                        closed_ns = ts_ns
+                    latest[tick_data['tk']] = (ltp, ts_ns, recv_ns)
+                    parsed += 1
+            except Exception as e:
+                _dropped.inc()
+                print(f"Error processing tick data: {str(e)}")
+        if parsed > len(latest):
+            _conflated.inc(parsed - len(latest))
+        if closed_ns is not None:
+            self.indicators.on_candle_close(closed_ns)
+        if self.readiness is not None and self.readiness.waiting:
+            self.readiness.seen(latest)
+        for token, (ltp, ts_ns, recv_ns) in latest.items():
+            try:
+                # Update the tick store in place, no per-tick dict or string formatting
+                self.store.update(token, ltp, ts_ns)
+                self.dispatcher.on_tick(token, ltp, ts_ns, recv_ns)
+            except Exception as e:
+                _dropped.inc()
+                print(f"Error processing tick data: {str(e)}")
+        done_ns = time.perf_counter_ns()
+        for recv_ns, _ in batch:
+            _handler_latency.record(done_ns - recv_ns)
@@ -0,0 +1,129 @@
+"""
+tick_recorder.py - Compact binary recorder for raw websocket ticks.
+
+Every tick with a token is appended as one fixed-size TICK_DTYPE record
+(receive time, exchange time, price, token, exchange) to a daily file with no
+header, so a recorded day can be opened with np.memmap and replayed. Records
+are staged as tuples; a background writer thread converts and writes them in
+blocks, so the cost on the tick path is one list append per tick and no disk
+I/O.
+"""
+
+import os
+import threading
+import time
+from datetime import date
+from typing import List, Optional, Tuple
+
+import numpy as np
+import config
+
+RECORD_DIR: str = getattr(config, "TICK_RECORD_DIR", "recordings")
+RECORD_TICKS: bool = getattr(config, "RECORD_TICKS", True)
+FLUSH_RECORDS: int = 4096   # Records per block write
+FLUSH_INTERVAL: float = 1.0  # Seconds before a partial block is written anyway
+
+TICK_DTYPE = np.dtype([('recv_ns', 'i8'), ('ft', 'i8'), ('lp', 'f8'), ('tk', 'S12'), ('e', 'S4')])
+
+
+def day_path(day: date, root: str = RECORD_DIR) -> str:
+    """Returns the recording file for a trading day."""
+    return os.path.join(root, f"ticks_{day.isoformat()}.bin")
+
+
+def load_day(path: str) -> np.ndarray:
+    """Memory-maps a recorded day as a TICK_DTYPE array (read-only)."""
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=TICK_DTYPE)
+    return np.memmap(path, dtype=TICK_DTYPE, mode='r')
+
+
+class TickRecorder:
+    """Appends raw ticks to a daily binary log."""
+
+    def __init__(self, root: str = RECORD_DIR, enabled: bool = RECORD_TICKS) -> None:
+        """
+        Args:
+            root (str): Directory for the daily files.
+            enabled (bool): Record ticks; record() is a no-op when False.
+        """
+        self.root = root
+        self.enabled = enabled
+        self.recorded = 0
+        self._lock = threading.Lock()      # Guards _pending
+        self._io_lock = threading.Lock()   # Guards the file
+        self._pending: List[Tuple[int, int, float, bytes, bytes]] = []
+        self._wake = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        self._day: Optional[date] = None
+        self._file = None
+
+    def record(self, tick_data: dict, recv_ns: Optional[int] = None) -> None:
+        """Stages one raw tick for the writer thread. Ticks without a token are ignored.
+
+        Args:
+            tick_data (dict): Tick as received from the websocket ('tk', optional 'lp', 'ft', 'e').
+            recv_ns (Optional[int]): Epoch-ns receipt time; now if omitted.
+        """
+        if not self.enabled or 'tk' not in tick_data:
+            return
+        if recv_ns is None:
+            recv_ns = time.time_ns()
+        try:
+            ft = int(tick_data.get('ft', 0))
+        except (ValueError, TypeError):
+            ft = 0
+        try:
+            lp = float(tick_data['lp'])
+        except (KeyError, ValueError, TypeError):
+            lp = np.nan
+        with self._lock:
+            self._pending.append((recv_ns, ft, lp, tick_data['tk'].encode(), tick_data.get('e', '').encode()))
+            self.recorded += 1
+            full = len(self._pending) >= FLUSH_RECORDS
+        if self._writer is None:
+            self._start_writer()
+        if full:
+            self._wake.set()
+
+    def _start_writer(self) -> None:
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name="tick-recorder", daemon=True)
+                self._writer.start()
+
+    def _run(self) -> None:
+        while True:
+            # A full block wakes the writer early; otherwise partial blocks go out every FLUSH_INTERVAL
+            self._wake.wait(FLUSH_INTERVAL)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error writing tick recording: {e}")
+
+    def flush(self) -> None:
+        """Writes any staged ticks to disk."""
+        with self._io_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return
+            today = date.today()
+            if today != self._day:
+                if self._file is not None:
+                    self._file.close()
+                os.makedirs(self.root, exist_ok=True)
+                self._file = open(day_path(today, self.root), 'ab')
+                self._day = today
+            self._file.write(np.array(pending, dtype=TICK_DTYPE).tobytes())
+            self._file.flush()
+
+    def close(self) -> None:
+        """Flushes and closes the current file."""
+        self.flush()
+        with self._io_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._day = None
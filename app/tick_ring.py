@@ -0,0 +1,140 @@
+"""
+tick_ring.py - Preallocated ring buffer between the websocket callback and tick processing.
+
+The broker library calls event_handler_feed_update on its websocket thread;
+anything slow there backs up the socket. TickRing.push only stamps the raw
+tick with its receipt time and stores it in a preallocated slot, and a
+TickConsumer thread drains it in batches and runs the real processing.
+
+The ring has a single producer (the websocket thread) and a single consumer.
+It never blocks the producer: if the consumer falls a full ring behind, the
+oldest unread ticks are overwritten and counted in `overwritten`, since for a
+price feed the newest ticks are the ones worth processing.
+"""
+
+import threading
+import time
+from typing import Callable, List, Tuple
+
+RawTick = Tuple[int, dict]  # (perf_counter_ns() at receipt, raw tick dict)
+
+
+class TickRing:
+    """Single-producer, single-consumer lossy ring of raw ticks."""
+
+    def __init__(self, capacity: int = 65536) -> None:
+        """
+        Args:
+            capacity (int): Slots, rounded up to a power of two.
+        """
+        size = 1
+        while size < capacity:
+            size <<= 1
+        self.capacity = size
+        self._mask = size - 1
+        self._slots: List[Tuple[int, int, dict]] = [(-1, 0, {})] * size
+        self._head = 0  # Next sequence number to write (producer only)
+        self._tail = 0  # Next sequence number to read (consumer only)
+        self._waiting = False
+        self._wake = threading.Event()
+        self.overwritten = 0
+        self.max_depth = 0
+
+    @property
+    def pushed(self) -> int:
+        """Total ticks pushed."""
+        return self._head
+
+    def depth(self) -> int:
+        """Ticks pushed but not yet drained."""
+        return min(self._head - self._tail, self.capacity)
+
+    def push(self, tick: dict) -> None:
+        """Stores a raw tick; never blocks. Called on the websocket thread only."""
+        seq = self._head
+        self._slots[seq & self._mask] = (seq, time.perf_counter_ns(), tick)
+        self._head = seq + 1
+        if self._waiting:
+            self._wake.set()
+
+    def drain(self, max_items: int, timeout: float = 0.1) -> List[RawTick]:
+        """Takes up to `max_items` ticks in arrival order, waiting up to `timeout` if empty.
+
+        Returns:
+            List[RawTick]: (recv_ns, tick) pairs; empty on timeout.
+        """
+        if self._head == self._tail:
+            self._waiting = True
+            # Re-check after publishing the flag so a push in between is not missed
+            if self._head == self._tail:
+                self._wake.wait(timeout)
+            self._waiting = False
+            self._wake.clear()
+        head = self._head
+        tail = self._tail
+        depth = head - tail
+        if depth > self.max_depth:
+            self.max_depth = min(depth, self.capacity)
+        if depth > self.capacity:
+            self.overwritten += depth - self.capacity
+            tail = head - self.capacity
+        end = min(head, tail + max_items)
+        batch = []
+        for seq in range(tail, end):
+            slot_seq, recv_ns, tick = self._slots[seq & self._mask]
+            if slot_seq != seq:  # Overwritten by the producer while we were reading
+                self.overwritten += 1
+                continue
+            batch.append((recv_ns, tick))
+        self._tail = end
+        return batch
+
+
+class TickConsumer:
+    """Thread that drains a TickRing in batches into a handler."""
+
+    def __init__(self, ring: TickRing, handler: Callable[[List[RawTick]], None],
+                 max_batch: int = 1024) -> None:
+        """
+        Args:
+            ring (TickRing): Ring to drain.
+            handler (Callable[[List[RawTick]], None]): Processes one batch, in arrival order.
+            max_batch (int): Largest batch handed to the handler at once.
+        """
+        self.ring = ring
+        self.handler = handler
+        self.max_batch = max_batch
+        self.batches = 0
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """Starts the consumer thread (idempotent)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="tick-consumer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            batch = self.ring.drain(self.max_batch)
+            if not batch:
+                continue
+            try:
+                self.handler(batch)
+            except Exception as e:
+                self.errors += 1
+                print(f"Error in tick consumer: {e}")
+            self.batches += 1
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Drains what is already queued, then stops the thread."""
+        if self._thread is None:
+            return
+        deadline = time.monotonic() + timeout
+        while self.ring.depth() and time.monotonic() < deadline:
+            time.sleep(0.001)
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
@@ -0,0 +1,243 @@
+"""
+tick_store.py - Preallocated, token-indexed columnar store for live ticks.
+
+The websocket callback writes every tick into fixed NumPy columns (ltp, epoch-ns
+timestamp, sequence number) addressed by a token -> slot index, so no dict is
+allocated and no timestamp is formatted on the callback thread. Readers take
+consistent snapshots of the columns, and FeedView keeps the old
+`feedJson[token]['ltp']` access pattern working on top of the store.
+"""
+
+import threading
+import time
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+NS_PER_SEC = 1_000_000_000
+
+
+class TickStore:
+    """Columnar last-tick store indexed by token."""
+
+    def __init__(self, capacity: int = 256) -> None:
+        """Preallocates the tick columns.
+
+        Args:
+            capacity (int): Initial number of token slots. The store doubles its
+                columns when more tokens than this are seen.
+        """
+        self._lock = threading.Lock()
+        self._slots: Dict[str, int] = {}
+        self._tokens: List[str] = []
+        self._seq = 0
+        self.ltp = np.full(capacity, np.nan, dtype=np.float64)
+        self.ts_ns = np.zeros(capacity, dtype=np.int64)
+        self.seq = np.zeros(capacity, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    @property
+    def last_seq(self) -> int:
+        """int: Sequence number of the most recent update (0 if none)."""
+        return self._seq
+
+    def _grow(self) -> None:
+        """Doubles the column capacity. Must be called with the lock held."""
+        capacity = len(self.ltp) * 2
+        ltp = np.full(capacity, np.nan, dtype=np.float64)
+        ts_ns = np.zeros(capacity, dtype=np.int64)
+        seq = np.zeros(capacity, dtype=np.int64)
+        n = len(self._tokens)
+        ltp[:n] = self.ltp[:n]
+        ts_ns[:n] = self.ts_ns[:n]
+        seq[:n] = self.seq[:n]
+        self.ltp, self.ts_ns, self.seq = ltp, ts_ns, seq
+
+    def _slot_locked(self, token: str) -> int:
+        slot = self._slots.get(token)
+        if slot is None:
+            slot = len(self._tokens)
+            if slot >= len(self.ltp):
+                self._grow()
+            self._slots[token] = slot
+            self._tokens.append(token)
+        return slot
+
+    def slot(self, token: str) -> int:
+        """Returns the slot for a token, allocating one if it is new.
+
+        Args:
+            token (str): Broker token, e.g. "26000".
+
+        Returns:
+            int: Index of the token's row in the columns.
+        """
+        slot = self._slots.get(token)
+        if slot is not None:
+            return slot
+        with self._lock:
+            return self._slot_locked(token)
+
+    def slots(self, tokens: Iterable[str]) -> np.ndarray:
+        """Returns (allocating as needed) the slots for several tokens.
+
+        Args:
+            tokens (Iterable[str]): Broker tokens.
+
+        Returns:
+            np.ndarray: int64 array of slots aligned with `tokens`.
+        """
+        with self._lock:
+            return np.fromiter((self._slot_locked(str(t)) for t in tokens), dtype=np.int64)
+
+    def find(self, token: str) -> Optional[int]:
+        """Returns the slot of a token, or None if it has never been seen."""
+        return self._slots.get(token)
+
+    def tokens(self) -> List[str]:
+        """Returns a copy of the known tokens, in slot order."""
+        return list(self._tokens)
+
+    def update(self, token: str, ltp: float, ts_ns: int) -> int:
+        """Writes one tick into the token's slot.
+
+        Args:
+            token (str): Broker token.
+            ltp (float): Last traded price.
+            ts_ns (int): Exchange timestamp in epoch nanoseconds.
+
+        Returns:
+            int: The sequence number assigned to this update.
+        """
+        with self._lock:
+            slot = self._slots.get(token)
+            if slot is None:
+                slot = self._slot_locked(token)
+            self._seq += 1
+            self.ltp[slot] = ltp
+            self.ts_ns[slot] = ts_ns
+            self.seq[slot] = self._seq
+            return self._seq
+
+    def seed(self, token: str, ltp: float, ts_ns: int) -> bool:
+        """Writes a tick only if the token has none yet, e.g. a last tick restored from a snapshot.
+
+        A live tick that arrived first is never overwritten by the older price.
+
+        Args:
+            token (str): Broker token.
+            ltp (float): Last traded price.
+            ts_ns (int): Timestamp of that price in epoch nanoseconds.
+
+        Returns:
+            bool: True if the tick was written.
+        """
+        with self._lock:
+            slot = self._slot_locked(token)
+            if self.seq[slot]:
+                return False
+            self._seq += 1
+            self.ltp[slot] = ltp
+            self.ts_ns[slot] = ts_ns
+            self.seq[slot] = self._seq
+            return True
+
+    def clear(self, tokens: Iterable[str]) -> None:
+        """Forgets the last tick of tokens (e.g. after unsubscribing) so stale prices are not read.
+
+        The slots stay allocated and are reused if the tokens tick again.
+
+        Args:
+            tokens (Iterable[str]): Broker tokens; unknown tokens are ignored.
+        """
+        with self._lock:
+            slots = [self._slots[t] for t in map(str, tokens) if t in self._slots]
+            self.ltp[slots] = np.nan
+            self.ts_ns[slots] = 0
+            self.seq[slots] = 0
+
+    def get(self, token: str) -> Optional[Tuple[float, int]]:
+        """Reads the latest tick for one token.
+
+        Args:
+            token (str): Broker token.
+
+        Returns:
+            Optional[Tuple[float, int]]: (ltp, ts_ns), or None if the token has not ticked.
+        """
+        slot = self._slots.get(token)
+        if slot is None:
+            return None
+        with self._lock:
+            if self.seq[slot] == 0:
+                return None
+            return float(self.ltp[slot]), int(self.ts_ns[slot])
+
+    def snapshot(self, slots: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Copies the columns under the lock so readers see one consistent state.
+
+        Args:
+            slots (Optional[np.ndarray]): Slots to read. Reads every known token if omitted.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: (ltp, ts_ns, seq) copies. Tokens that
+            have not ticked yet have ltp NaN and seq 0.
+        """
+        with self._lock:
+            if slots is None:
+                n = len(self._tokens)
+                return self.ltp[:n].copy(), self.ts_ns[:n].copy(), self.seq[:n].copy()
+            return self.ltp[slots], self.ts_ns[slots], self.seq[slots]
+
+    def ltps(self, slots: np.ndarray) -> np.ndarray:
+        """Copies only the ltp column for the given slots."""
+        with self._lock:
+            return self.ltp[slots]
+
+    def view(self) -> "FeedView":
+        """Returns a dict-like view compatible with the old feedJson layout."""
+        return FeedView(self)
+
+
+class FeedView(Mapping):
+    """Read-mostly `feedJson` compatibility view over a TickStore.
+
+    `view[token]` returns `{'ltp': float, 'tt': isoformat}` built on demand, and
+    `token in view` is True only once the token has ticked.
+    """
+
+    def __init__(self, store: TickStore) -> None:
+        self._store = store
+
+    def __getitem__(self, token: str) -> dict:
+        tick = self._store.get(token)
+        if tick is None:
+            raise KeyError(token)
+        ltp, ts_ns = tick
+        return {'ltp': ltp, 'tt': datetime.fromtimestamp(ts_ns // NS_PER_SEC).isoformat()}
+
+    def __setitem__(self, token: str, value: dict) -> None:
+        try:
+            ts_ns = int(datetime.fromisoformat(value['tt']).timestamp() * NS_PER_SEC)
+        except (KeyError, ValueError, TypeError):
+            ts_ns = time.time_ns()
+        self._store.update(token, float(value['ltp']), ts_ns)
+
+    def __contains__(self, token: object) -> bool:
+        return isinstance(token, str) and self._store.get(token) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        _, _, seq = self._store.snapshot()
+        tokens = self._store.tokens()
+        return iter([tokens[i] for i in np.flatnonzero(seq)])
+
+    def __len__(self) -> int:
+        _, _, seq = self._store.snapshot()
+        return int(np.count_nonzero(seq))
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
@@ -1,110 +1,381 @@
 import asyncio
+import itertools
+import threading
+import time
+import zlib
 import aiohttp
-from telegram_bot import send_messagxe
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from telegram_bot import CRITICAL, send_message
 from config import HEADERS, TIMEOUT
-from file_manager import load_users_config  # Assuming load_users_config is defined in file_manager.py
+from file_manager import FanoutEntry, load_fanout_table
+from metrics import inc, observe, registry
+import config
 
-async def trigger_webhook_for_user(session: aiohttp.ClientSession, user_name: str, config: dict, event_name: str) -> None:
+WEBHOOK_SHARDS: int = getattr(config, "WEBHOOK_SHARDS", 4)  # Event loops users are spread over
+WEBHOOK_CONCURRENCY: int = getattr(config, "WEBHOOK_CONCURRENCY", 100)  # In-flight posts per shard
+WEBHOOK_DEADLINE: float = getattr(config, "WEBHOOK_DEADLINE", 3.0)  # Seconds per endpoint
+BREAKER_FAILURES: int = getattr(config, "BREAKER_FAILURES", 5)  # Consecutive failed/slow posts to open
+BREAKER_COOLDOWN: float = getattr(config, "BREAKER_COOLDOWN", 30.0)  # Seconds an endpoint is skipped
+BREAKER_SLOW: float = getattr(config, "BREAKER_SLOW", 1.0)  # Seconds; a slower success counts as failed
+
+async def trigger_webhook_for_user(session: aiohttp.ClientSession, entry: FanoutEntry, event_name: str,
+                                   timeout: float = TIMEOUT) -> bool:
     """
     Asynchronously triggers a webhook for a single user.
 
-    This function checks if the specified event exists in the user's configuration. 
-    If it does, it constructs a payload with the user's access token and the event name, 
-    then sends a POST request to the webhook URL. It handles timeouts and network errors 
-    by printing an error message and sending a Telegram alert.
+    This function sends the entry's pre-serialized payload (the user's access token and
+    the event name) as a POST request to the entry's webhook URL. It handles timeouts and
+    network errors by printing an error message and sending a Telegram alert.
 
     Args:
         session (aiohttp.ClientSession): The HTTP session for making asynchronous requests.
-        user_name (str): The unique identifier for the user.
-        config (dict): The user's configuration containing 'access_token' and 'webhooks'.
+        entry (FanoutEntry): The user's precompiled (user_name, url, body) for this event.
         event_name (str): The event name to trigger (e.g., "CE_Buy", "PE_Exit").
+        timeout (float): Seconds the endpoint has to answer.
 
     Returns:
-        None
+        bool: True if the webhook answered with HTTP 200.
     """
-    if event_name not in config.get("webhooks", {}):
-        error_msg = f"Invalid event: {event_name} for user {user_name}"
-        print(error_msg)
-        send_message(error_msg)
-        return
-
-    url = config["webhooks"][event_name]
-    payload = {
-        "access_token": config["access_token"],
-        "alert_name": event_name
-    }
-
+    user_name, url, body = entry
+    failure_key = f"{event_name} webhook failure"  # Coalesce per-user failures into one digest
     try:
-        async with session.post(url, headers=HEADERS, json=payload, timeout=TIMEOUT) as response:
+        async with session.post(url, headers=HEADERS, data=body, timeout=timeout) as response:
             if response.status == 200:
                 success_msg = f"{event_name} Triggered Successfully for {user_name}!"
                 print(success_msg)
+                return True
             else:
                 error_text = await response.text()
                 error_msg = f"Failed to trigger {event_name} for {user_name}. Status: {response.status}, Response: {error_text}"
                 print(error_msg)
-                send_message(error_msg)
+                send_message(error_msg, key=failure_key)
+                inc('webhook_failures_total', user=user_name, event=event_name)
     except asyncio.TimeoutError:
         error_msg = f"Timeout error for {user_name} while triggering {event_name}. Webhook URL: {url}"
         print(error_msg)
-        send_message(error_msg)
+        send_message(error_msg, key=failure_key)
+        inc('webhook_failures_total', user=user_name, event=event_name)
     except aiohttp.ClientError as e:
         error_msg = f"Network error for {user_name} while triggering {event_name}: {str(e)}. Webhook URL: {url}"
         print(error_msg)
-        send_message(error_msg)
+        send_message(error_msg, key=failure_key)
+        inc('webhook_failures_total', user=user_name, event=event_name)
     except Exception as e:
         error_msg = f"Unexpected error for {user_name} while triggering {event_name}: {str(e)}"
         print(error_msg)
-        send_message(error_msg)
+        send_message(error_msg, key=failure_key)
+        inc('webhook_failures_total', user=user_name, event=event_name)
+    return False
+
+
+def event_priority(event_name: str) -> int:
+    """Queue priority of an event: exits (0) are posted before buys (1)."""
+    return 0 if event_name.endswith('_Exit') else 1
 
 
-async def trigger_webhook_async(event_name: str) -> None:
+class CircuitBreaker:
+    """Per-endpoint breaker that skips webhook URLs which keep failing or answering slowly.
+
+    After `failures` consecutive failed or slow posts an endpoint is skipped for
+    `cooldown` seconds; then one post is let through, and its outcome closes the
+    breaker again or reopens it. Endpoints are keyed by URL rather than host, so
+    one user's slow hook on a shared platform does not cut off the others.
     """
-    Asynchronously triggers webhooks for all users based on the given event name.
-    
-    This function loads user configuration from 'users.csv' using load_users_config().
-    It then creates an asynchronous HTTP session and concurrently triggers webhooks 
-    for each user by calling trigger_webhook_for_user. If the user configuration fails 
-    to load or if an error occurs during webhook execution, it prints an error message 
-    and sends a Telegram alert.
-    
-    Args:
-        event_name (str): The name of the event that will be used to determine which webhook to trigger.
-    
-    Returns:
-        None
+
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN,
+                 slow: float = BREAKER_SLOW) -> None:
+        self.failures = failures
+        self.cooldown = cooldown
+        self.slow = slow
+        self._lock = threading.Lock()
+        self._failed: Dict[str, int] = {}
+        self._open_until: Dict[str, float] = {}
+
+    def allow(self, endpoint: str) -> bool:
+        """Returns False while the endpoint's breaker is open."""
+        until = self._open_until.get(endpoint)
+        if until is None:
+            return True
+        with self._lock:
+            until = self._open_until.get(endpoint)
+            if until is None:
+                return True
+            if time.monotonic() < until:
+                return False
+            # Half-open: let this post through and hold the rest until it finishes
+            self._open_until[endpoint] = time.monotonic() + self.cooldown
+            return True
+
+    def record(self, endpoint: str, ok: bool, elapsed: float) -> None:
+        """Records a post's outcome; a success slower than `slow` seconds counts as a failure."""
+        with self._lock:
+            if ok and elapsed <= self.slow:
+                self._failed.pop(endpoint, None)
+                self._open_until.pop(endpoint, None)
+                return
+            failed = self._failed.get(endpoint, 0) + 1
+            self._failed[endpoint] = failed
+            if failed >= self.failures:
+                if endpoint not in self._open_until:
+                    print(f"Circuit open for webhook {endpoint} after {failed} failed/slow posts")
+                    inc('webhook_circuit_opened_total')
+                self._open_until[endpoint] = time.monotonic() + self.cooldown
+
+    def open_endpoints(self) -> int:
+        """Number of endpoints currently skipped."""
+        now = time.monotonic()
+        return sum(1 for until in list(self._open_until.values()) if until > now)
+
+
+class _EventFanout:
+    """Tracks one event's deliveries across shards and completes its Future after the last one.
+
+    The Future resolves to this event's own user -> seconds latencies, so concurrent
+    events never overwrite each other's measurements. Users skipped by the circuit
+    breaker count towards completion but not as deliveries: they get no latency.
     """
-    users_config = load_users_config()
-    
-    if not users_config:
-        error_msg = ("Failed to load users configuration. Check if users.csv exists "
-                     "and is properly formatted.")
-        print(error_msg)
-        send_message(error_msg)
-        return
-    
-    async with aiohttp.ClientSession() as session:
-        tasks = []
-        for user_name, config in users_config.items():
-            task = trigger_webhook_for_user(session, user_name, config, event_name)
-            tasks.append(task)
-        
+
+    def __init__(self, event_name: str, count: int, submitted: float) -> None:
+        self.event_name = event_name
+        self.submitted = submitted
+        self.future: Future = Future()
+        self.latencies: Dict[str, float] = {}  # user -> seconds from submit to completion
+        self._count = self._remaining = count
+        self._lock = threading.Lock()
+        self._slowest: Tuple[float, str] = (0.0, '')
+        self._skipped = 0
+
+    def delivered(self, user_name: str) -> None:
+        """Records a finished post (successful or not) to one user."""
+        elapsed = time.perf_counter() - self.submitted
+        observe('webhook_user', int(elapsed * 1e9))
+        with self._lock:
+            self.latencies[user_name] = elapsed
+            if elapsed > self._slowest[0]:
+                self._slowest = (elapsed, user_name)
+            self._remaining -= 1
+            last = self._remaining == 0
+        if last:
+            self._complete(elapsed)
+
+    def skipped(self, user_name: str) -> None:
+        """Records a user whose post was not sent (circuit open)."""
+        with self._lock:
+            self._skipped += 1
+            self._remaining -= 1
+            last = self._remaining == 0
+        if last:
+            self._complete(time.perf_counter() - self.submitted)
+
+    def _complete(self, elapsed: float) -> None:
+        # Time to last delivery
+        observe('webhook_event', int(elapsed * 1e9))
+        print(f"{self.event_name} delivered to {self._count - self._skipped} users in "
+              f"{elapsed * 1000:.1f} ms, slowest {self._slowest[1]}"
+              + (f", {self._skipped} skipped" if self._skipped else ""))
+        self.future.set_result(self.latencies)
+
+
+class _WebhookShard:
+    """One event loop thread with its own connection pool and an exit-first delivery queue."""
+
+    def __init__(self, index: int, owner: "WebhookDispatcher") -> None:
+        self.index = index
+        self.owner = owner
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: List[asyncio.Task] = []
+        self._ready = threading.Event()
+
+    async def _open(self) -> None:
+        owner = self.owner
+        connector = aiohttp.TCPConnector(limit=owner.limit, limit_per_host=owner.limit_per_host,
+                                         ttl_dns_cache=owner.dns_ttl, keepalive_timeout=owner.keepalive_timeout)
+        self.session = aiohttp.ClientSession(connector=connector)
+        self.queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.ensure_future(self._work()) for _ in range(owner.concurrency)]
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
         try:
-            # Execute all webhook calls concurrently
-            await asyncio.gather(*tasks, return_exceptions=True)
-        except Exception as e:
-            error_msg = f"Error in webhook execution: {str(e)}"
+            self.loop.run_until_complete(self._open())
+        finally:
+            self._ready.set()
+        self.loop.run_forever()
+
+    def start(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self._run, name=f"webhook-shard-{self.index}", daemon=True).start()
+        self._ready.wait()
+
+    def put(self, items: List[tuple]) -> None:
+        """Queues (priority, seq, entry, fanout) deliveries from any thread."""
+        self.loop.call_soon_threadsafe(lambda: [self.queue.put_nowait(item) for item in items])
+
+    async def _work(self) -> None:
+        while True:
+            _, _, entry, fanout = await self.queue.get()
+            sent = True
+            try:
+                sent = await self._deliver(entry, fanout)
+            except Exception as e:
+                print(f"Error delivering {fanout.event_name} to {entry.user_name}: {e}")
+            finally:
+                if sent:
+                    fanout.delivered(entry.user_name)
+                else:
+                    fanout.skipped(entry.user_name)
+
+    async def _deliver(self, entry: FanoutEntry, fanout: _EventFanout) -> bool:
+        """Posts to one user unless the circuit breaker skips the endpoint; returns False if skipped."""
+        breaker = self.owner.breaker
+        if not breaker.allow(entry.url):
+            inc('webhook_failures_total', user=entry.user_name, event=fanout.event_name)
+            inc('webhook_skipped_total', event=fanout.event_name)
+            send_message(f"{fanout.event_name} skipped for {entry.user_name}: circuit open for "
+                         f"{urlsplit(entry.url).netloc}", key=f"{fanout.event_name} circuit open")
+            return False
+        start = time.perf_counter()
+        ok = await trigger_webhook_for_user(self.session, entry, fanout.event_name, self.owner.deadline)
+        breaker.record(entry.url, ok, time.perf_counter() - start)
+        return True
+
+    async def _close(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await self.session.close()
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class WebhookDispatcher:
+    """
+    Long-lived, sharded webhook fan-out.
+
+    Users are spread over `shards` event loop threads by a stable hash of their
+    name. Each shard keeps one aiohttp session with a keep-alive connection pool,
+    DNS cache and per-host connection limit, and posts from a priority queue with
+    at most `concurrency` requests in flight, so Exit events are always sent ahead
+    of queued Buy events and a burst never opens unbounded connections. Every post
+    has a `deadline`, and a CircuitBreaker skips endpoints that keep failing or
+    answering slowly, so a few bad endpoints cannot hold an event back. The time
+    from submit to the last delivery is recorded as the 'webhook_event' stage.
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 10, dns_ttl: int = 300,
+                 keepalive_timeout: float = 60, shards: int = WEBHOOK_SHARDS,
+                 concurrency: int = WEBHOOK_CONCURRENCY, deadline: float = WEBHOOK_DEADLINE,
+                 breaker: Optional[CircuitBreaker] = None) -> None:
+        """
+        Args:
+            limit (int): Simultaneous connections per shard's pool.
+            limit_per_host (int): Simultaneous connections per webhook host, per shard.
+            dns_ttl (int): Seconds to cache DNS lookups.
+            keepalive_timeout (float): Seconds to keep idle connections open.
+            shards (int): Event loop threads the users are spread over.
+            concurrency (int): Posts in flight per shard.
+            deadline (float): Seconds each endpoint has to answer.
+            breaker (Optional[CircuitBreaker]): Per-endpoint breaker; a default one if omitted.
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.concurrency = concurrency
+        self.deadline = deadline
+        self.breaker = breaker or CircuitBreaker()
+        self._shards = [_WebhookShard(i, self) for i in range(shards)]
+        self._seq = itertools.count()
+        self._running = False
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Starts the shard threads if they are not already running."""
+        with self._lock:
+            if self._running:
+                return
+            for shard in self._shards:
+                shard.start()
+            self._running = True
+
+    def shard_of(self, user_name: str) -> int:
+        """Index of the shard a user's webhooks are posted from."""
+        return zlib.crc32(user_name.encode()) % len(self._shards)
+
+    def submit(self, event_name: str) -> Future:
+        """
+        Schedules webhooks for an event without blocking the caller.
+
+        Args:
+            event_name (str): The event to trigger (e.g., "CE_Buy", "PE_Exit").
+
+        Returns:
+            concurrent.futures.Future: Completes when every user's webhook has finished, with
+            this event's user -> seconds from submit to delivery.
+        """
+        submitted = time.perf_counter()
+        self.start()
+        fanout = load_fanout_table(event_name)
+        tracker = _EventFanout(event_name, len(fanout), submitted)
+        tracker.future.add_done_callback(lambda f: self._report(event_name, f))
+        if not fanout:
+            error_msg = (f"No webhooks configured for {event_name}. Check if users.csv exists "
+                         "and is properly formatted.")
             print(error_msg)
             send_message(error_msg)
+            tracker.future.set_result({})
+            return tracker.future
+        priority = event_priority(event_name)
+        batches: List[List[tuple]] = [[] for _ in self._shards]
+        for entry in fanout:
+            batches[self.shard_of(entry.user_name)].append((priority, next(self._seq), entry, tracker))
+        for shard, items in zip(self._shards, batches):
+            if items:
+                shard.put(items)
+        return tracker.future
+
+    def queued(self) -> int:
+        """Deliveries waiting across all shards."""
+        return sum(shard.queue.qsize() for shard in self._shards if shard.queue is not None)
+
+    @staticmethod
+    def _report(event_name: str, future: Future) -> None:
+        if future.exception() is not None:
+            error_msg = f"Critical error in webhook system for {event_name}: {future.exception()}"
+            print(error_msg)
+            send_message(error_msg, CRITICAL)
+
+    def stop(self) -> None:
+        """Closes the sessions and stops the shard threads."""
+        with self._lock:
+            if not self._running:
+                return
+            for shard in self._shards:
+                shard.stop()
+            self._shards = [_WebhookShard(i, self) for i in range(len(self._shards))]
+            self._running = False
+
+
+# Shared dispatcher used by trigger_b/trigger_s
+dispatcher = WebhookDispatcher()
+registry.expose('webhook_queue_depth', dispatcher.queued, 'gauge', "Webhook posts waiting in the shard queues")
+registry.expose('webhook_circuits_open', dispatcher.breaker.open_endpoints, 'gauge',
+                "Webhook endpoints currently skipped by the circuit breaker")
 
 
 def trigger_webhook(event_name: str) -> None:
     """
-    Synchronously triggers a webhook for the given event using an asynchronous call.
+    Synchronously triggers a webhook for the given event on the shared dispatcher.
 
-    This function creates a new asyncio event loop, sets it as the current event loop,
-    and runs the asynchronous function `trigger_webhook_async` with the provided event name.
-    If an exception occurs during execution, it prints an error message and sends a Telegram alert.
+    This function submits the event to the shared WebhookDispatcher, which posts to
+    every user on its shard loops, and waits until all posts have finished. If an
+    exception occurs during execution, it prints an error message and sends a
+    Telegram alert.
 
     Args:
         event_name (str): The name of the event triggering the webhook.
@@ -112,49 +383,49 @@ def trigger_webhook(event_name: str) -> None:
     Returns:
         None
     """
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
     try:
-        loop.run_until_complete(trigger_webhook_async(event_name))
+        dispatcher.submit(event_name).result()
     except Exception as e:
         error_msg = f"Critical error in webhook system: {str(e)}"
         print(error_msg)
-        send_message(error_msg)
-    finally:
-        loop.close()
+        send_message(error_msg, CRITICAL)
 
 
-def trigger_b(h: str) -> None:
+def trigger_b(h: str) -> Optional[Future]:
     """
-    Triggers a BUY event by appending '_Buy' to the given event name and calling trigger_webhook.
+    Triggers a BUY event by appending '_Buy' to the given event name and submitting it to
+    the webhook dispatcher without waiting for delivery.
 
     Args:
         h (str): The base event name (typically representing an option type or trade signal).
 
     Returns:
-        None
+        Optional[Future]: Completes when every user's webhook has finished, or None if
+        submission failed.
     """
     try:
         print(f"{h}_Buy")
-        trigger_webhook(f"{h}_Buy")
+        return dispatcher.submit(f"{h}_Buy")
     except Exception as e:
         print(f"Error in trigger_b: {e}")
         send_message(f"Error triggering {h}_Buy: {e}")
 
 
-def trigger_s(h: str) -> None:
+def trigger_s(h: str) -> Optional[Future]:
     """
-    Triggers an EXIT event by appending '_Exit' to the given event name and calling trigger_webhook.
+    Triggers an EXIT event by appending '_Exit' to the given event name and submitting it to
+    the webhook dispatcher without waiting for delivery.
 
     Args:
         h (str): The base event name (typically representing an option type or trade signal).
 
     Returns:
-        None
+        Optional[Future]: Completes when every user's webhook has finished, or None if
+        submission failed.
     """
     try:
         print(f"{h}_Exit")
-        trigger_webhook(f"{h}_Exit")
+        return dispatcher.submit(f"{h}_Exit")
     except Exception as e:
         print(f"Error in trigger_s: {e}")
         send_message(f"Error triggering {h}_Exit: {e}")
@@ -0,0 +1,71 @@
+"""
+universe.py - Configurable instrument universe for the sharded engine.
+
+Each entry of config.UNIVERSE is one underlying/expiry pair that runs as its
+own engine shard, e.g.
+
+    UNIVERSE = [
+        {"symbol": "NIFTY"},                       # nearest expiry, defaults below
+        {"symbol": "NIFTY", "expiry": 1},          # next expiry
+        {"symbol": "BANKNIFTY", "window": 1500},
+        {"symbol": "FINNIFTY"},
+    ]
+
+Keys: symbol (required), expiry (0 = nearest, 1 = next, ...), window (points
+either side of the index LTP to subscribe), step (strike interval) and
+index_token (NSE token of the underlying index). Missing keys default per
+symbol from INDEX_TOKENS / STRIKE_STEPS.
+"""
+
+from typing import Iterable, List, Mapping, NamedTuple, Optional
+
+import config
+
+INDEX_TOKENS = {"NIFTY": "26000", "BANKNIFTY": "26009", "FINNIFTY": "26037", "MIDCPNIFTY": "26074"}
+STRIKE_STEPS = {"NIFTY": 50, "BANKNIFTY": 100, "FINNIFTY": 50, "MIDCPNIFTY": 25}
+DEFAULT_WINDOW = 600
+DEFAULT_UNIVERSE = [{"symbol": "NIFTY"}]
+
+UNIVERSE: List[dict] = getattr(config, "UNIVERSE", DEFAULT_UNIVERSE)
+
+
+class Instrument(NamedTuple):
+    """One underlying/expiry pair, i.e. one engine shard."""
+    symbol: str
+    expiry: int
+    window: float
+    step: int
+    index_token: str
+
+    @property
+    def name(self) -> str:
+        """Shard name, e.g. 'NIFTY-0' for NIFTY's nearest expiry."""
+        return f"{self.symbol}-{self.expiry}"
+
+
+def load_universe(spec: Optional[Iterable[Mapping]] = None) -> List[Instrument]:
+    """Parses a universe spec (config.UNIVERSE by default) into Instruments.
+
+    Args:
+        spec (Optional[Iterable[Mapping]]): Entries as described in the module docstring.
+
+    Returns:
+        List[Instrument]: One per entry, in order.
+
+    Raises:
+        ValueError: On an unknown symbol without an explicit index_token, or a duplicate entry.
+    """
+    instruments = []
+    for entry in (UNIVERSE if spec is None else spec):
+        symbol = entry["symbol"].upper()
+        index_token = entry.get("index_token", INDEX_TOKENS.get(symbol))
+        if index_token is None:
+            raise ValueError(f"No index token known for {symbol}; set 'index_token' in UNIVERSE")
+        instrument = Instrument(symbol=symbol, expiry=int(entry.get("expiry", 0)),
+                                window=float(entry.get("window", DEFAULT_WINDOW)),
+                                step=int(entry.get("step", STRIKE_STEPS.get(symbol, 50))),
+                                index_token=str(index_token))
+        if any(i.name == instrument.name for i in instruments):
+            raise ValueError(f"Duplicate universe entry {instrument.name}")
+        instruments.append(instrument)
+    return instruments
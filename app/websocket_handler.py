@@ -1,66 +1,100 @@
 """
 websocket_handler.py - Handles real-time WebSocket communication.
 
-This module initializes the WebSocket connection using the API client and defines
+This module opens the WebSocket connection using the API client (start_websocket) and defines
 callbacks to process incoming market feed data and order updates. It uses global
-variables imported from glb.py to share real-time data (feedJson) and connection status.
+variables imported from glb.py to share real-time data (tick_store) and connection status.
+The feed callback only queues raw ticks on tick_ring; tick_consumer processes them in
+batches on its own thread through tick_pipeline (see tick_pipeline.py).
 """
 
-from glb import feedJson, feed_opened, websocket_connected
+from glb import (tick_store, candle_builder, indicator_engine, tick_dispatcher, tick_recorder, tick_ring,
+                 feed_ready, order_book, feed_opened, websocket_connected)
 from api_client import api_client
-from datetime import datetime
-import time
+from tick_pipeline import TickPipeline
+from tick_ring import TickConsumer
+from metrics import registry
+
+registry.expose('ticks_total', lambda: tick_ring.pushed, 'counter', "Ticks received from the websocket")
+registry.expose('tick_queue_depth', tick_ring.depth, 'gauge', "Ticks waiting in the ingestion ring")
+registry.expose('tick_queue_max_depth', lambda: tick_ring.max_depth, 'gauge',
+                "Deepest the ingestion ring has been")
+registry.expose('ticks_overwritten_total', lambda: tick_ring.overwritten, 'counter',
+                "Ticks lost because the consumer fell a full ring behind")
+registry.expose('ticks_conflated_total', lambda: tick_dispatcher.conflated, 'counter',
+                "Ticks superseded by a newer tick before their strategy handlers ran")
+registry.expose('strategy_errors_total', lambda: tick_dispatcher.errors, 'counter',
+                "Exceptions raised by strategy handlers")
 
 def event_handler_feed_update(tick_data):
     """
-    Handle feed updates more gracefully.
+    Handle feed updates with minimal work on the websocket thread.
 
-    This function processes tick data received from the WebSocket, extracts the last
-    traded price ('lp') and token ('tk'), and updates the global feedJson with the
-    latest price and a timestamp. If a timestamp ('ft') is not provided, it uses the current time.
+    The raw tick is only pushed into the preallocated tick_ring together with its
+    receipt time; tick_consumer processes it on its own thread (see process_ticks),
+    so a slow batch never backs up the socket.
 
     Args:
         tick_data (dict): A dictionary containing tick data with keys 'lp', 'tk', and optionally 'ft'.
     """
-    try:
-        if 'lp' in tick_data and 'tk' in tick_data:
-            # Get timestamp, default to current time if 'ft' is missing
-            try:
-                timest = datetime.fromtimestamp(int(tick_data.get('ft', time.time()))).isoformat()
-            except (ValueError, TypeError):
-                timest = datetime.now().isoformat()
-            
-            # Update feedJson with the tick data
-            feedJson[tick_data['tk']] = {
-                'ltp': float(tick_data['lp']),
-                'tt': timest
-            }
-    except Exception as e:
-        print(f"Error processing tick data: {str(e)}")
+    tick_ring.push(tick_data)
+
+# Records, builds candles, updates tick_store and dispatches strategy handlers per batch
+tick_pipeline = TickPipeline(tick_store, candle_builder, indicator_engine, tick_dispatcher,
+                             tick_recorder, feed_ready)
+process_ticks = tick_pipeline.process
+
+# Drains tick_ring on its own thread; started before the websocket so no tick waits
+tick_consumer = TickConsumer(tick_ring, process_ticks)
+tick_consumer.start()
+
+# Order updates rarely carry the token; resolve it from the symbol master / token cache
+order_book.resolve = api_client.tokens.get
+# get_ltp answers from fresh feed ticks before falling back to a REST quote
+api_client.feed = tick_store
 
 def event_handler_order_update(tick_data):
     """
     Handle order update events.
 
+    The update is applied to order_book, whose listeners (glb.position_fills) see
+    fills and state changes straight away.
+
     Args:
         tick_data (dict): A dictionary containing order update information.
     """
-    print(f"Order update {tick_data}")
+    order = order_book.on_update(tick_data)
+    print(f"Order update {order if order is not None else tick_data}")
 
 def open_callback():
     """
     Callback function invoked when the WebSocket connection is opened.
 
-    It sets the global flags feed_opened and websocket_connected to True.
+    It sets the global flags feed_opened and websocket_connected to True and
+    signals feed_ready.socket_open for the startup orchestrator. A later open is a
+    reconnect, which starts with no subscriptions: the underlying and the current
+    strike window are subscribed again.
     """
     global feed_opened, websocket_connected
     feed_opened = True
+    feed_ready.socket_open.set()
     if not websocket_connected:
         websocket_connected = True
         print("Websocket connected")
+        return
+    # Before startup's subscriptions.start (center still None) there is nothing to restore
+    from market_data import subscriptions
+    if subscriptions.center is not None:
+        print("Websocket reconnected, resubscribing")
+        subscriptions.resubscribe()
+
+def start_websocket():
+    """
+    Opens the WebSocket connection with this module's callbacks.
 
-# Immediately start the WebSocket connection using the API client's start_websocket method.
-# This call initiates the connection as soon as this module is imported.
-api_client.api.start_websocket(order_update_callback=event_handler_order_update,
-                               subscribe_callback=event_handler_feed_update,
-                               socket_open_callback=open_callback)
+    Called by startup.Startup once the API client has logged in; importing this
+    module no longer connects.
+    """
+    api_client.api.start_websocket(order_update_callback=event_handler_order_update,
+                                   subscribe_callback=event_handler_feed_update,
+                                   socket_open_callback=open_callback)
@@ -0,0 +1,127 @@
+"""
+greeks_bench.py - Full-chain IV/Greeks recompute time of greeks.GreeksEngine.
+
+Builds a synthetic NIFTY chain (--strikes CE and PE rows around --spot) over a
+real TickStore/ChainIndex, prices every option with Black-Scholes from a
+volatility smile, and then times:
+
+* full  - refresh(force=True), the underlying moved so every row is solved;
+* tick  - refresh() after --dirty option ticks with the underlying unchanged;
+* idle  - refresh() with nothing new (the relevant-tick check only).
+
+It also reports the worst IV error against the smile on rows where the premium
+moves at least one 0.05 tick per volatility point (elsewhere the IV is not
+identifiable from the premium), the worst delta error on all rows, and appends
+the result as one JSON line to --out like latency_bench.py.
+
+Usage:
+    python benchmarks/greeks_bench.py --strikes 200 --repeat 500
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from chain_index import ChainIndex  # noqa: E402
+from greeks import GreeksEngine, bs_price, norm_cdf  # noqa: E402
+from tick_store import TickStore  # noqa: E402
+from latency_bench import git_version, summarize  # noqa: E402
+
+UNDERLYING = '26000'
+
+
+def chain(option: str, strikes: np.ndarray, base: int) -> pd.DataFrame:
+    return pd.DataFrame({'Token': [str(base + i) for i in range(len(strikes))], 'StrikePrice': strikes,
+                         'TradingSymbol': [f"NIFTY{option}{int(k)}" for k in strikes]})
+
+
+def run(args: argparse.Namespace) -> dict:
+    store = TickStore()
+    strikes = args.spot + args.step * (np.arange(args.strikes) - args.strikes // 2)
+    index = ChainIndex({'CE': chain('CE', strikes, 40000), 'PE': chain('PE', strikes, 50000)}, store)
+    expiry = date.today() + timedelta(days=args.days)
+    engine = GreeksEngine(index, store, expiry, UNDERLYING)
+    now = time.time()
+    t = engine.time_to_expiry(now)
+    smile = 0.12 + 0.4 * ((strikes - args.spot) / args.spot) ** 2 * 25
+    ns = time.time_ns()
+
+    store.update(UNDERLYING, args.spot, ns)
+    truth = {}
+    for option, is_call in (('CE', True), ('PE', False)):
+        prices, d1, vega = bs_price(args.spot, strikes, t, engine.rate, smile, np.full(len(strikes), is_call))
+        delta = norm_cdf(d1) - (0.0 if is_call else 1.0)
+        truth[option] = (smile, delta, vega / 100 >= 0.05)
+        for token, price in zip(index.tokens[option], prices):
+            store.update(token, round(float(price), 2) if args.tick_size else float(price), ns)
+
+    full_ns, tick_ns, idle_ns = [], [], []
+    rng = np.random.default_rng(0)
+    tokens = np.concatenate([index.tokens['CE'], index.tokens['PE']])
+    for i in range(args.repeat):
+        store.update(UNDERLYING, args.spot, ns + i)
+        start = time.perf_counter_ns()
+        engine.refresh(now, force=True)
+        full_ns.append(time.perf_counter_ns() - start)
+
+        for token in rng.choice(tokens, args.dirty, replace=False):
+            store.update(token, float(engine.ltp[engine.tokens == token][0]), ns + i)
+        start = time.perf_counter_ns()
+        engine.refresh(now)
+        tick_ns.append(time.perf_counter_ns() - start)
+
+        start = time.perf_counter_ns()
+        engine.refresh(now)
+        idle_ns.append(time.perf_counter_ns() - start)
+
+    errors = {}
+    for option in ('CE', 'PE'):
+        g = engine.greeks(option)
+        iv, delta, identifiable = truth[option]
+        solved = ~np.isnan(g.iv)
+        errors[option] = {'solved': int(solved.sum()), 'rows': len(g.iv), 'identifiable': int(identifiable.sum()),
+                          'max_iv_error': float(np.abs(g.iv - iv)[solved & identifiable].max()),
+                          'max_delta_error': float(np.abs(g.delta - delta)[solved].max())}
+    picks = engine.select([0.5, 0.3, 0.1])
+    return {
+        'version': git_version(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {k: v for k, v in vars(args).items() if k != 'out'},
+        'rows': len(engine.tokens),
+        'recompute': {'full': summarize(full_ns), 'tick': summarize(tick_ns), 'idle': summarize(idle_ns)},
+        'accuracy': errors,
+        'nearest_delta': {option: [None if hit is None else [hit[0], round(hit[3], 3)] for hit in hits]
+                          for option, hits in picks.items()},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Full-chain IV/Greeks recompute benchmark.")
+    parser.add_argument('--strikes', type=int, default=100, help="Strikes per option type")
+    parser.add_argument('--spot', type=float, default=24500, help="Underlying price")
+    parser.add_argument('--step', type=float, default=50, help="Strike step")
+    parser.add_argument('--days', type=int, default=3, help="Days to expiry")
+    parser.add_argument('--dirty', type=int, default=5, help="Option ticks between incremental refreshes")
+    parser.add_argument('--repeat', type=int, default=200, help="Timed rounds")
+    parser.add_argument('--tick-size', action='store_true', help="Round premiums to the 0.05 tick (2 dp)")
+    parser.add_argument('--out', default=os.path.join(ROOT, 'benchmarks', 'results.jsonl'),
+                        help="File the JSON result line is appended to")
+    args = parser.parse_args()
+
+    result = run(args)
+    with open(args.out, 'a') as f:
+        f.write(json.dumps(result) + "\n")
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
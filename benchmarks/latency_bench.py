@@ -0,0 +1,266 @@
+"""
+latency_bench.py - End-to-end tick-to-webhook latency benchmark.
+
+Runs the live tick path (tick_ring -> TickConsumer -> TickPipeline -> strategy
+dispatch) -> trigger_b -> webhook dispatcher against local stand-ins:
+
+* FakeBroker, a ShoonyaApiPy stand-in (see app/replay.py) whose feed thread
+  plays the role of the broker's websocket thread and pushes synthetic ticks
+  into the registered callback at a fixed rate. One "signal" token breaks out
+  above its trigger candle every --signal-every ticks.
+* WebhookSink, a local aiohttp server with one endpoint per user, where every
+  --slow-every'th user answers after --slow-ms and every --fail-every'th user
+  returns HTTP 500.
+
+The stores come from replay.ReplaySession rather than glb, so the benchmark
+needs no broker login or live quote; only config (webhook headers/timeouts) and
+the Telegram notifier settings must import.
+
+Per stage it reports p50/p99/max latency in ms plus throughput, and appends
+the result as one JSON line to --out so runs of different versions can be
+compared.
+
+Usage:
+    python benchmarks/latency_bench.py --users 500 --rate 2000 --duration 10
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from replay import ReplayApi, ReplaySession  # noqa: E402
+from stores import TriggerStore  # noqa: E402
+from tick_ring import TickConsumer, TickRing  # noqa: E402
+
+SIGNAL_TOKEN = '35001'
+
+
+def summarize(samples_ns: List[int]) -> Dict[str, float]:
+    """Returns count and p50/p99/max in milliseconds for nanosecond samples."""
+    if not samples_ns:
+        return {'count': 0}
+    arr = np.asarray(samples_ns, dtype=np.float64) / 1e6
+    return {'count': len(arr), 'p50_ms': float(np.percentile(arr, 50)),
+            'p99_ms': float(np.percentile(arr, 99)), 'max_ms': float(arr.max())}
+
+
+class WebhookSink:
+    """Local webhook endpoints with configurable slow and failing users."""
+
+    def __init__(self, port: int, slow_every: int = 0, slow_ms: float = 0, fail_every: int = 0) -> None:
+        self.port = port
+        self.slow_every = slow_every
+        self.slow_ms = slow_ms
+        self.fail_every = fail_every
+        self.received = 0
+        self._ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+    def url(self, user: int) -> str:
+        return f"http://127.0.0.1:{self.port}/hook/{user}"
+
+    async def _hook(self, request: web.Request) -> web.Response:
+        user = int(request.match_info['user'])
+        await request.read()
+        self.received += 1
+        if self.slow_every and user % self.slow_every == 0:
+            await asyncio.sleep(self.slow_ms / 1000)
+        if self.fail_every and user % self.fail_every == 0:
+            return web.Response(status=500, text="simulated failure")
+        return web.Response(text="ok")
+
+    async def _start(self) -> None:
+        app = web.Application()
+        app.add_routes([web.post('/hook/{user}', self._hook)])
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', self.port).start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._start())
+        self._ready.set()
+        self._loop.run_forever()
+
+    def start(self) -> None:
+        threading.Thread(target=self._run, name="webhook-sink", daemon=True).start()
+        self._ready.wait()
+
+
+class FakeBroker(ReplayApi):
+    """ShoonyaApiPy stand-in whose feed thread pushes synthetic ticks at a fixed rate."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.handler_ns: List[int] = []
+        self.signal_sent_ns = 0
+        self.ticks_sent = 0
+
+    def run_feed(self, rate: float, duration: float, tokens: int, signal_every: int) -> float:
+        """Pushes ticks into subscribe_callback on the calling thread.
+
+        Returns:
+            float: Wall-clock seconds the feed ran for.
+        """
+        interval = 1.0 / rate
+        names = [str(40000 + i) for i in range(tokens)]
+        start = time.perf_counter()
+        n = 0
+        while time.perf_counter() - start < duration:
+            n += 1
+            if n % signal_every == 0:
+                tick = {'t': 'tf', 'e': 'NFO', 'tk': SIGNAL_TOKEN, 'lp': '101.0', 'ft': str(int(time.time()))}
+            else:
+                tick = {'t': 'tf', 'e': 'NFO', 'tk': names[n % tokens], 'lp': f"{100 + n % 7}.5",
+                        'ft': str(int(time.time()))}
+            sent = time.perf_counter_ns()
+            if tick['tk'] == SIGNAL_TOKEN:
+                self.signal_sent_ns = sent
+            self.subscribe_callback(tick)
+            self.handler_ns.append(time.perf_counter_ns() - sent)
+            self.ticks_sent += 1
+            delay = start + n * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return time.perf_counter() - start
+
+
+def write_users(path: str, sink: WebhookSink, users: int) -> None:
+    with open(path, 'w') as f:
+        f.write("name,access_token,ce_buy,ce_exit,pe_buy,pe_exit\n")
+        for i in range(users):
+            url = sink.url(i)
+            f.write(f"user{i},token{i},{url},{url},{url},{url}\n")
+
+
+def git_version() -> str:
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'], cwd=ROOT,
+                                       text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return 'unknown'
+
+
+def run(args: argparse.Namespace) -> dict:
+    sink = WebhookSink(args.port, args.slow_every, args.slow_ms, args.fail_every)
+    sink.start()
+    users_file = os.path.join(tempfile.mkdtemp(prefix="latency_bench_"), 'users.csv')
+    write_users(users_file, sink, args.users)
+
+    import telegram_bot
+    telegram_bot.notifier.enabled = False
+    import file_manager
+    file_manager.USERS_FILE = users_file
+    import trigger_handler
+    from strategy_dispatch import watch_trigger
+    from metrics import registry
+
+    broker = FakeBroker()
+    session = ReplaySession(broker, synchronous=False)
+    triggers = TriggerStore()
+    # The same hand-off as websocket_handler: the feed callback only pushes onto the ring
+    ring = TickRing()
+    consumer = TickConsumer(ring, session.pipeline.process)
+    consumer.start()
+    broker.subscribe_callback = ring.push
+    decision_ns: List[int] = []
+    delivered_ns: List[int] = []
+    per_user_ns: List[int] = []
+    pending: List[object] = []
+    lock = threading.Lock()
+
+    def arm() -> None:
+        trigger_id = triggers.add(symbolname='BENCH', token=SIGNAL_TOKEN, option_type='CE',
+                                  High=100.5, Low=99.0, State='pending')
+        watch_trigger(session.tick_dispatcher, triggers, trigger_id, on_breakout)
+
+    def on_breakout(view: tuple, ltp: float) -> None:
+        sent = broker.signal_sent_ns
+        decided = time.perf_counter_ns()
+        decision_ns.append(decided - sent)
+        future = trigger_handler.trigger_b(view.option_type)
+        arm()
+        if future is None:
+            return
+        with lock:
+            pending.append(future)
+
+        def done(f) -> None:
+            delivered_ns.append(time.perf_counter_ns() - sent)
+            offset = decided - sent
+            # This event's own user -> seconds since submit
+            per_user_ns.extend(int(s * 1e9) + offset for s in (f.result() or {}).values())
+
+        future.add_done_callback(done)
+
+    file_manager.load_fanout_table('CE_Buy')  # Compile users.csv before timing starts
+    trigger_handler.dispatcher.start()
+    arm()
+    quiet = open(os.devnull, 'w') if args.quiet else None
+    with contextlib.redirect_stdout(quiet) if quiet else contextlib.nullcontext():
+        seconds = broker.run_feed(args.rate, args.duration, args.tokens, args.signal_every)
+        consumer.stop()  # Let the consumer drain the ring first
+        with lock:
+            futures = list(pending)
+        for future in futures:
+            with contextlib.suppress(Exception):
+                future.result(timeout=60)
+    trigger_handler.dispatcher.stop()
+    session.close()
+
+    return {
+        'version': git_version(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {k: v for k, v in vars(args).items() if k not in ('out', 'quiet')},
+        'throughput': {'ticks': broker.ticks_sent, 'ticks_per_sec': broker.ticks_sent / seconds,
+                       'events': len(delivered_ns), 'webhook_requests': sink.received},
+        'ingest': {'max_queue_depth': ring.max_depth, 'overwritten': ring.overwritten,
+                   'batches': consumer.batches,
+                   'batch_conflated': registry.counter('ticks_batch_conflated_total').value},
+        'stages': {
+            'tick_to_callback_return': summarize(broker.handler_ns),
+            'tick_to_decision': summarize(decision_ns),
+            'tick_to_user_webhook_done': summarize(per_user_ns),
+            'tick_to_all_webhooks_done': summarize(delivered_ns),
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tick-to-webhook latency benchmark.")
+    parser.add_argument('--users', type=int, default=100, help="Webhook subscribers in users.csv")
+    parser.add_argument('--rate', type=float, default=1000, help="Ticks per second from the fake broker")
+    parser.add_argument('--duration', type=float, default=10, help="Seconds to run the feed")
+    parser.add_argument('--tokens', type=int, default=100, help="Background tokens ticking")
+    parser.add_argument('--signal-every', type=int, default=500, help="Ticks between breakout signals")
+    parser.add_argument('--slow-every', type=int, default=0, help="Every Nth user is slow (0 = none)")
+    parser.add_argument('--slow-ms', type=float, default=500, help="Delay of slow users")
+    parser.add_argument('--fail-every', type=int, default=0, help="Every Nth user returns 500 (0 = none)")
+    parser.add_argument('--port', type=int, default=8765, help="Webhook sink port")
+    parser.add_argument('--out', default=os.path.join(ROOT, 'benchmarks', 'results.jsonl'),
+                        help="File the JSON result line is appended to")
+    parser.add_argument('--quiet', action='store_true', help="Suppress the strategy's prints during the run")
+    args = parser.parse_args()
+
+    result = run(args)
+    with open(args.out, 'a') as f:
+        f.write(json.dumps(result) + "\n")
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
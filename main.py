@@ -22,6 +22,10 @@ import sys
 
 from app.utils import load_users_config 
 from app.message import send_message 
+from app.metrics import start_metrics_server
+from app.startup import Startup
+from app.snapshot import SnapshotWriter
+from app.market_data import scan_triggers
 from app.glb import 
 
 
@@ -47,7 +51,6 @@ class APIClient:
         if cls._instance is None:
             cls._instance = super().__new__(cls)
             cls._instance.api = ShoonyaApiPy()
-            cls._instance.login()
         return cls._instance
 
     def login(self) -> None:
@@ -82,86 +85,20 @@ api_client = APIClient()
 
 
 
-api = ShoonyaApiPy()
-
-with open("config.yaml", "r") as file:
-    config = yaml.safe_load(file)
-
-uid = config['credentials']['uid']
-pwd = config['credentials']['pwd']
-token = config['credentials']['token']
-vc = config['credentials']['vc']
-app_key = config['credentials']['app_key']
-imei = config['credentials']['imei']
-
-ret = api.login(userid=uid, password=pwd, twoFA=pyotp.TOTP(token).now(), vendor_code=vc, api_secret=app_key, imei=imei)
-print(ret)
-
 send_message("GoldenSniper Algo Started")
-
-
-
-def event_handler_feed_update(tick_data):
-    """Handle feed updates more gracefully"""
-    try:
-        if 'lp' in tick_data and 'tk' in tick_data:
-            # Get timestamp, default to current time if 'ft' is missing
-            try:
-                timest = datetime.fromtimestamp(int(tick_data.get('ft', time.time()))).isoformat()
-            except (ValueError, TypeError):
-                timest = datetime.now().isoformat()
- # feedjson global issue-- needs review !!!!           
-            # Update feedJson with the tick data
-            feedJson[tick_data['tk']] = {
-                'ltp': float(tick_data['lp']),
-                'tt': timest
-            }
-    except Exception as e:
-        print(f"Error processing tick data: {str(e)}")
-
-def event_handler_order_update(tick_data):
-    print(f"Order update {tick_data}")
-
-fro app.glb import feed_opened
-
-def open_callback():
-    #global feed_opened, websocket_connected
-    glb.feed_opened = True
-    if not glb.websocket_connected:
-        glb.websocket_connected = True
-        print("Websocket connected")
-
-#Review
-# Replace the initial websocket setup section
-api.start_websocket(order_update_callback=event_handler_order_update,
-                   subscribe_callback=event_handler_feed_update,
-                   socket_open_callback=open_callback)
-
-
-# Wait for initial connection
-retry_count = 0
-while not glb.feed_opened and retry_count < 10:
-    time.sleep(1)
-    retry_count += 1
-
-if not glb.feed_opened:
-    print("Failed to establish websocket connection")
-    sys.exit(1)
-
-# Initial subscriptions - do these only once
-try:
-    api.subscribe('NSE|26000')
-    api.subscribe(result_array_CE)
-    api.subscribe(result_array_PE)
-    print("Initial subscriptions completed")
-except Exception as e:
-    print(f"Error in initial subscription: {e}")
-
-time.sleep(5)
+# Per-stage latency histograms and counters at http://127.0.0.1:9108/metrics
+start_metrics_server()
+
+# Login, symbol master and history warm-up run in parallel; the websocket opens as soon
+# as login is done and we go live once NIFTY and the strike window have ticked (no sleeps)
+startup_timings = Startup().run()
+# Warm-restart snapshot of positions, triggers, fired markers and last ticks every few seconds
+SnapshotWriter().start()
+# One vectorized trigger-candle scan over the whole window per closed 5m candle; new
+# triggers are armed for breakout entry, entries for target/SL exit (market_data.strategy)
+glb.indicator_engine.add_listener(scan_triggers)
 print(f"Feed JSON: {glb.feedJson}")
 
-# Start monitoring in a separate thread
-threading.Thread(target=monitor_positions, daemon=True).start()
 
 ce_strike=get_ce_pe_values(nearest_value,"CE")
 pe_strike=get_ce_pe_values(nearest_value,"PE")